@@ -33,12 +33,25 @@ Usage: ./TSAnalyseDirect.py INPUT_DIRECTORY COMMAND COMMAND_OPTIONS
 
 Common operations can be found in the examples section.
 
-Four COMMANDS are available: filter, compress, entropy and stv.
+Seven COMMANDS are available: compress, entropy, lle, spectral, ibs, rqa and stv.
 
 It is assumed that when using compress or entropy the files only
 contain the one column with the relevant information (hrf in our
 case).
 
+The rows of the compress, entropy, lle and rqa csv files are written as soon as
+each file is done, so an interrupted run keeps the results computed so far. Once
+every file is done the rows are sorted by file name, unless -nosort
+(--no-sort-results) is given. With -db DB_FILE (--results-db DB_FILE) the results
+are also kept in the SQLite file DB_FILE, and the files already there with the
+same parameters are not computed again.
+
+Besides the INPUT_DIRECTORY arguments, the inputs may be listed in a file with
+--manifest FILE (one path per line, so paths may hold spaces) or matched with
+--glob PATTERN ('**' matches any number of directories). Both are read lazily:
+the first inputs are processed while the rest are still being listed. With
+either option, INPUT_DIRECTORY arguments (if any) go right before COMMAND.
+
 compress: This command allows you to compress all the files in the
     given directory. The list of available compressors is
     dynamically generated based on their availability in the system,
@@ -83,6 +96,7 @@ entropy: This command allows you to calculate the entropy for all
     sampen              Sample Entropy
     apen                Approximate Entropy
     apenv2              A slightly different implementation of Approximate Entropy
+    cce                 Corrected Conditional Entropy (-d is the maximum pattern length)
 
     For a sampen and apen documentation please look at:
         pyeeg (http://code.google.com/p/pyeeg/downloads/list)
@@ -93,6 +107,69 @@ entropy: This command allows you to calculate the entropy for all
     ./TSAnalyseDirect.py INPUT_DIRECTORY entropy ENTROPY -h
 
 
+lle: This command allows you to calculate the largest Lyapunov exponent
+    (Rosenstein algorithm) for all files in a given directory.
+
+    OUTCOME: Calling this command will create a csv file using ';'
+    as a field delimiter. The embedding dimension, lag and mean period
+    are used to name the resulting file. Each file is represented by a
+    row with two columns, the name of the file and it's exponent.
+
+    COMMAND_OPTIONS for this command are:
+    -d DIMENSION, --dimension DIMENSION     Embedding dimension; default:[2]
+    -tau LAG, --lag LAG                     Embedding lag; default:[1]
+    -mp SAMPLES, --mean-period SAMPLES      Mean period in samples (Theiler window); default:[1]
+    -sf HERTZ, --sampling-frequency HERTZ   Sampling frequency; default:[4]
+    -ms STEPS, --max-steps STEPS            Divergence steps used in the fit; default:[all]
+
+
+spectral: This command allows you to calculate the SVD entropy and the
+    Fisher information of all files in a given directory. Both are
+    derived from the same singular spectrum of the embedding matrix.
+
+    OUTCOME: Calling this command will create a csv file using ';'
+    as a field delimiter. The embedding dimension and lag are used to
+    name the resulting file. Each file is represented by a row with
+    three columns, the name of the file, it's SVD entropy and it's
+    Fisher information.
+
+    COMMAND_OPTIONS for this command are:
+    -d DIMENSION, --dimension DIMENSION     Embedding dimension; default:[2]
+    -tau LAG, --lag LAG                     Embedding lag; default:[1]
+
+
+ibs: This command allows you to calculate the information based
+    similarity between every pair of files in a given directory.
+
+    OUTCOME: Calling this command will create a csv file using ';'
+    as a field delimiter. The word order is used to name the resulting
+    file. The file holds the (symmetric) similarity matrix: one row and
+    one column per file.
+
+    COMMAND_OPTIONS for this command are:
+    -n ORDER, --word-order ORDER            Number of symbols in each word; default:[8]
+
+
+rqa: This command allows you to calculate the recurrence quantification
+    analysis measures (recurrence rate, determinism and laminarity) of
+    all files in a given directory. Points recur when their Chebyshev
+    distance is within the tolerance, as in sampen/apen.
+
+    OUTCOME: Calling this command will create a csv file using ';'
+    as a field delimiter. The embedding dimension, lag and tolerance
+    are used to name the resulting file. Each file is represented by a
+    row with four columns, the name of the file, it's RR, DET and LAM.
+
+    COMMAND_OPTIONS for this command are:
+    -d DIMENSION, --dimension DIMENSION     Embedding dimension; default:[2]
+    -tau LAG, --lag LAG                     Embedding lag; default:[1]
+    -sdt TOLERANCE, --sd-tolerance TOLERANCE
+                                            Tolerance x standard deviation; default:[0.15]
+    -ut TOLERANCE, --unique-tolerance TOLERANCE
+                                            Tolerance used directly
+    -lmin LENGTH, --min-line LENGTH         Minimum line length for DET and LAM; default:[2]
+
+
 Examples :
 
   =>Compress
@@ -108,6 +185,22 @@ Examples :
     dimension 2 (reference values for the analysis of biological data)
     ./TSAnalyseDirect.py unittest_dataset entropy apen -t 0.2
 
+  =>LLE
+    Calculate the largest Lyapunov exponent with embedding dimension 3 and a mean period of 10 samples
+    ./TSAnalyseDirect.py unittest_dataset lle -d 3 -mp 10
+
+  =>Spectral
+    Calculate the SVD entropy and Fisher information with embedding dimension 10
+    ./TSAnalyseDirect.py unittest_dataset spectral -d 10
+
+  =>IBS
+    Calculate the information based similarity between every pair of files using 8-symbol words
+    ./TSAnalyseDirect.py unittest_dataset ibs -n 8
+
+  =>RQA
+    Calculate the RQA measures with embedding dimension 3 and tolerance 0.2 x standard deviation
+    ./TSAnalyseDirect.py unittest_dataset rqa -d 3 -sdt 0.2
+
   =>stv
     Compress using the gzip algorithm (maximum compression level will be used)
         ./TSAnalyseDirect.py unittest_dataset stv
@@ -122,6 +215,12 @@ import csv
 import argparse
 import tools.entropy
 import tools.compress
+import tools.lyapunov
+import tools.rqa
+import tools.results
+import tools.results_db
+import tools.similarity
+import tools.spectral_embedding
 import tools.stv_analysis as stv
 import tools.utility_functions as util
 
@@ -132,10 +231,13 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Computes compression/entropy/short-term variability "
                                                  "of a file(s) or dataset(s)")
-    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs="+",
+    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs=util.input_path_nargs(),
                         help="Path for a file(s) or directory containing the datasets to be used as input")
+    util.add_input_parser_options(parser)
     util.add_logger_parser_options(parser)
+    util.add_cache_parser_options(parser)
     util.add_csv_parser_options(parser)
+    tools.results.add_parser_options(parser)
     # tools.utility_functions.add_dataset_parser_options(parser)
 
     subparsers = parser.add_subparsers(help='Different commands/operations to execute on the datasets', dest="command")
@@ -148,6 +250,26 @@ if __name__ == "__main__":
     tools.entropy.add_parser_options(entropy)
     util.add_numbers_parser_options(entropy)
 
+    lle = subparsers.add_parser('lle', help='Calculate the largest Lyapunov exponent for all the files in the given '
+                                            'directory')
+    tools.lyapunov.add_parser_options(lle)
+    util.add_numbers_parser_options(lle)
+
+    spectral = subparsers.add_parser('spectral', help='Calculate the SVD entropy and Fisher information for all the '
+                                                      'files in the given directory')
+    tools.spectral_embedding.add_parser_options(spectral)
+    util.add_numbers_parser_options(spectral)
+
+    ibs = subparsers.add_parser('ibs', help='Calculate the information based similarity between every pair of files'
+                                            ' in the given directory')
+    tools.similarity.add_parser_options(ibs)
+    util.add_numbers_parser_options(ibs)
+
+    rqa = subparsers.add_parser('rqa', help='Calculate the recurrence quantification analysis measures for all the '
+                                            'files in the given directory')
+    tools.rqa.add_parser_options(rqa)
+    util.add_numbers_parser_options(rqa)
+
     # stv_module = subparsers.add_parser('stv', help='Perform Short-term Variability analysis of the files of a given '
     #                                                'directory with the following algorithms: %s'
     #                                                % stv.AVAILABLE_ALGORITHMS)
@@ -158,13 +280,16 @@ if __name__ == "__main__":
     options = vars(args)
     # parser definition ends
 
-    opts_to_protect = ["level", "dimension", "sd_tolerance", "unique_tolerance", "round_digits"]
+    opts_to_protect = ["level", "dimension", "sd_tolerance", "unique_tolerance", "round_digits", "levels",
+                       "lag", "mean_period", "sampling_frequency", "max_steps", "word_order", "min_line"]
     for option_key in opts_to_protect:
         if option_key in options.keys() and options[option_key] != 0:
            options[option_key] = None if not options[option_key] else abs(options[option_key])
 
     logger = util.initialize_logger(logger_name="tsanalyse", log_file=options["log_file"],
                                     log_level=options["log_level"], with_first_entry="TSAnalyseDirect")
+    util.set_series_cache_dir(options["cache_dir"])
+    results_db = tools.results_db.open_results_db(options["results_db"]) if options["results_db"] else None
 
     change_output_location = False
     specified_output = os.path.expanduser(options["output_path"]) if options["output_path"] is not None else None
@@ -184,10 +309,6 @@ if __name__ == "__main__":
     #         logger.info("Creating directory %s" % specified_output)
     #         os.makedirs(specified_output)
 
-    # here we protect the execution for the case of sending multiple files as a string - required by other interfaces
-    iterable_input_path = options['input_path'][0].split(" ") \
-        if len(options['input_path']) == 1 else options['input_path']
-
     # if the user specifies multiple files from different datasets (folders) we should create a tmp folder _
     # _ to hold all the files, and generate a name based on a timestamp (maybe add a parser flag)
     # _ default behaviour will group individual files into a temporary folder. (-i flag disables this)
@@ -200,12 +321,13 @@ if __name__ == "__main__":
     # temp_trial_dir = options["group_files_dir"]
     # isolate_files = options["isolate"]
 
-    for inputs in iterable_input_path:
+    # the inputs of a manifest or glob pattern are listed lazily, so the first ones are processed right away
+    for inputs in util.iter_input_paths(options['input_path'], options['manifest'], options['glob_pattern']):
         inputdir = inputs.strip()
         inputdir = util.remove_slash_from_path(inputdir)
         inputdir = os.path.expanduser(inputdir)  # to handle the case of paths as a string
 
-        if not os.path.isdir(inputdir):
+        if not util.is_dataset_dir(inputdir):
             if change_output_location:
                 single_run_on_specified_location = os.path.join(os.path.abspath(specified_output), "individual_runs")
                 if not os.path.exists(single_run_on_specified_location):
@@ -225,45 +347,152 @@ if __name__ == "__main__":
         if options['command'] == 'compress':
             compressor = options['compressor']
             level = tools.compress.set_level(options)
+            outfile = "%s_%s_lvl_%d" % (output_name, compressor, level)
+            if options['comp_rate']:
+                outfile += "_wCR"
+            outfile += ".csv"
+
+            header = ["Filename", "Original_Size", "Compressed_Size"]
+            if options['comp_rate']:
+                header.append("CRx100")
+            store = tools.results_db.results_store(results_db, inputdir, "compress", compressor, options)
+            results_file = tools.results.open_results(outfile, header, options["write_separator"],
+                                                      options["line_terminator"], store)
+
+            def write_compression_row(filename, cd):
+                logger.debug("Compression Data for file '{1}': {0}".format(cd, filename))
+                data_row = [filename, cd.original, cd.compressed]
+                if options['comp_rate']:
+                    data_row.append(cd.compression_rate)
+                tools.results.write_rows(results_file, [data_row])
+
             try:
-                resulting_dict = tools.compress.compress(inputdir, compressor, level, False, options['comp_rate'],
-                                                     options['round_digits'])
+                tools.compress.compress(inputdir, compressor, level, False, options['comp_rate'],
+                                        options['round_digits'], on_result=write_compression_row,
+                                        skip_files=tools.results_db.completed_files(store))
             except OSError as ose:
                 logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
             except IOError as ioe:
                 logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+            if tools.results.close_results(results_file, options["sort_results"]):
+                logger.info("Storing in: %s" % os.path.abspath(outfile))
             else:
-                outfile = "%s_%s_lvl_%d" % (output_name, compressor, level)
-                if options['comp_rate']:
-                    outfile += "_wCR"
-                outfile += ".csv"
+                logger.warning("Compression table is empty. Nothing to write to file")
 
-                if not tools.compress.is_compression_table_empty(resulting_dict):
-                    logger.debug("Compression table: {0}".format(resulting_dict))
+        elif options['command'] == 'entropy':
+            algorithm = options["algorithm"].lower()
+            try:
+                files_stds = tools.entropy.calculate_std(inputdir)
+            except OSError as ose:
+                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
+            except IOError as ioe:
+                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+            else:
+                tolerance_used = options["sd_tolerance"]
+                tolerances = dict((filename, files_stds[filename] * options["sd_tolerance"]) for filename in files_stds)
+                if options["unique_tolerance"]:
+                    logger.info("Tolerance does not include Standard Deviation")
+                    tolerances = dict(zip(files_stds.keys(), [options["unique_tolerance"]] * len(files_stds)))
+                    tolerance_used = options["unique_tolerance"]
+                else:
+                    logger.info("Tolerance includes Standard Deviation")
+                logger.debug("Tolerances: %s" % tolerances)
+                outfile = "%s_%s_dim_%d_tol_%.2f.csv" % (
+                    output_name, algorithm, options['dimension'], tolerance_used)
+                store = tools.results_db.results_store(results_db, inputdir, "entropy", algorithm, options)
+                results_file = tools.results.open_results(outfile, ["Filename", "Entropy"],
+                                                          options["write_separator"], options["line_terminator"], store)
+
+                def write_entropy_row(filename, entropyData):
+                    logger.debug("Entropy Data for file '{1}': {0}".format(entropyData, filename))
+                    tools.results.write_rows(results_file, [[filename, entropyData.entropy]])
+
+                try:
+                    tools.entropy.entropy(inputdir, algorithm, options['dimension'], tolerances,
+                                          options['round_digits'], on_result=write_entropy_row,
+                                          skip_files=tools.results_db.completed_files(store),
+                                          **tools.entropy.algorithm_options(algorithm, options))
+                except OSError as ose:
+                    logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
+                except IOError as ioe:
+                    logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+                except ValueError as voe:
+                    logger.critical("%s - %s" % (voe, util.remove_project_path_from_file(inputdir)))
+                if tools.results.close_results(results_file, options["sort_results"]):
+                    logger.info("Storing in: %s" % os.path.abspath(outfile))
+                else:
+                    logger.warning("Entropy table is empty. Nothing to write to file")
+
+        elif options['command'] == 'lle':
+            outfile = "%s_lle_dim_%d_lag_%d_period_%d.csv" % (output_name, options['dimension'], options['lag'],
+                                                              options['mean_period'])
+            store = tools.results_db.results_store(results_db, inputdir, "lle", None, options)
+            results_file = tools.results.open_results(outfile, ["Filename", "LLE"], options["write_separator"],
+                                                      options["line_terminator"], store)
+            try:
+                tools.lyapunov.lyapunov(inputdir, options['lag'], options['dimension'], options['mean_period'],
+                                        options['sampling_frequency'], options['max_steps'], options['round_digits'],
+                                        on_result=lambda filename, lyapunov_data: tools.results.write_rows(
+                                            results_file, [[filename, lyapunov_data.lle]]),
+                                        skip_files=tools.results_db.completed_files(store))
+            except OSError as ose:
+                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
+            except IOError as ioe:
+                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+            if tools.results.close_results(results_file, options["sort_results"]):
+                logger.info("Storing in: %s" % os.path.abspath(outfile))
+            else:
+                logger.warning("Lyapunov table is empty. Nothing to write to file")
+
+        elif options['command'] == 'spectral':
+            try:
+                resulting_dict = tools.spectral_embedding.spectral_embedding(inputdir, options['lag'],
+                                                                             options['dimension'],
+                                                                             options['round_digits'])
+            except OSError as ose:
+                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
+            except IOError as ioe:
+                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+            else:
+                outfile = "%s_spectral_dim_%d_lag_%d.csv" % (output_name, options['dimension'], options['lag'])
+
+                if not tools.spectral_embedding.is_spectral_table_empty(resulting_dict):
                     output_file = open(outfile, "w")
                     writer = csv.writer(output_file, delimiter=options["write_separator"],
                                         lineterminator=options["line_terminator"])
-                    header = ["Filename", "Original_Size", "Compressed_Size"]
-                    if options['comp_rate']:
-                        header.append("CRx100")
-
-                    writer.writerow(header)
-
+                    writer.writerow(["Filename", "SVD_Entropy", "Fisher_Info"])
+                    logger.debug("Spectral table: %s" % resulting_dict)
                     for filename in sorted(resulting_dict.keys()):
-                        cd = resulting_dict[filename]
-                        logger.debug("Compression Data for file '{1}': {0}".format(cd, filename))
-                        data_row = [filename, cd.original, cd.compressed]
-                        if options['comp_rate']:
-                            data_row.append(cd.compression_rate)
+                        spectral_data = resulting_dict[filename]
+                        writer.writerow([filename, spectral_data.svd_entropy, spectral_data.fisher_info])
+                    output_file.close()
+                    logger.info("Storing in: %s" % os.path.abspath(outfile))
+                else:
+                    logger.warning("Spectral table is empty. Nothing to write to file")
 
-                        writer.writerow(data_row)
+        elif options['command'] == 'ibs':
+            try:
+                names, ibs_table = tools.similarity.similarity(inputdir, options['word_order'], options['round_digits'])
+            except OSError as ose:
+                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
+            except IOError as ioe:
+                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
+            else:
+                outfile = "%s_ibs_n_%d.csv" % (output_name, options['word_order'])
+
+                if len(names) > 0:
+                    output_file = open(outfile, "w")
+                    writer = csv.writer(output_file, delimiter=options["write_separator"],
+                                        lineterminator=options["line_terminator"])
+                    writer.writerow(["Filename"] + names)
+                    for filename, ibs_row in zip(names, ibs_table):
+                        writer.writerow([filename] + list(ibs_row))
                     output_file.close()
                     logger.info("Storing in: %s" % os.path.abspath(outfile))
                 else:
-                    logger.warning("Compression table is empty. Nothing to write to file")
+                    logger.warning("Similarity table is empty. Nothing to write to file")
 
-        elif options['command'] == 'entropy':
-            algorithm = options["algorithm"].lower()
+        elif options['command'] == 'rqa':
             try:
                 files_stds = tools.entropy.calculate_std(inputdir)
             except OSError as ose:
@@ -280,35 +509,29 @@ if __name__ == "__main__":
                 else:
                     logger.info("Tolerance includes Standard Deviation")
                 logger.debug("Tolerances: %s" % tolerances)
+                outfile = "%s_rqa_dim_%d_lag_%d_tol_%.2f.csv" % (output_name, options['dimension'], options['lag'],
+                                                                 tolerance_used)
+                store = tools.results_db.results_store(results_db, inputdir, "rqa", None, options)
+                results_file = tools.results.open_results(outfile, ["Filename", "RR", "DET", "LAM"],
+                                                          options["write_separator"], options["line_terminator"], store)
+
+                def write_rqa_row(filename, rqa_data):
+                    logger.debug("RQA Data for file '{1}': {0}".format(rqa_data, filename))
+                    tools.results.write_rows(results_file, [[filename, rqa_data.recurrence_rate,
+                                                             rqa_data.determinism, rqa_data.laminarity]])
+
                 try:
-                    resulting_dict = tools.entropy.entropy(inputdir, algorithm, options['dimension'], tolerances,
-                                                           options['round_digits'])
+                    tools.rqa.rqa(inputdir, options['dimension'], options['lag'], tolerances, options['min_line'],
+                                  options['round_digits'], on_result=write_rqa_row,
+                                  skip_files=tools.results_db.completed_files(store))
                 except OSError as ose:
                     logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
                 except IOError as ioe:
                     logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
-                except ValueError as voe:
-                    logger.critical("%s - %s" % (voe, util.remove_project_path_from_file(inputdir)))
+                if tools.results.close_results(results_file, options["sort_results"]):
+                    logger.info("Storing in: %s" % os.path.abspath(outfile))
                 else:
-                    outfile = "%s_%s_dim_%d_tol_%.2f.csv" % (
-                        output_name, algorithm, options['dimension'], tolerance_used)
-
-                    if not tools.entropy.is_entropy_table_empty(resulting_dict):
-                        output_file = open(outfile, "w")
-                        writer = csv.writer(output_file, delimiter=options["write_separator"],
-                                            lineterminator=options["line_terminator"])
-                        writer.writerow(["Filename", "Entropy"])
-                        logger.debug("Entropy table: %s" % resulting_dict)
-                        for filename in sorted(resulting_dict.keys()):
-                            entropyData = resulting_dict[filename]
-
-                            logger.debug("Entropy Data for file '{1}': {0}".format(entropyData, filename))
-
-                            writer.writerow([filename, entropyData.entropy])
-                        output_file.close()
-                        logger.info("Storing in: %s" % os.path.abspath(outfile))
-                    else:
-                        logger.warning("Entropy table is empty. Nothing to write to file")
+                    logger.warning("RQA table is empty. Nothing to write to file")
 
         elif options['command'] == 'stv':
             try:
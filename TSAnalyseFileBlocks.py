@@ -29,6 +29,12 @@ we used.
 This interface takes a file or directory, breaks each file into blocks and compresses each of the
 generated blocks directories.
 
+The blocks are not written to disk: partitioning gives the rows of each file every block spans
+(the block index) and each block is analysed as a slice of the lines read to partition the file,
+so each file is read once. The block files are only written (into the file_blocks directory),
+from the same lines, with the --keep-blocks option. Files whose results are already stored
+(see --results-db) are not partitioned.
+
 
 Usage: ./TSAnalyseFileBlocks.py [BLOCK OPTIONS] INPUTFILE COMMAND [COMMAND OPTIONS]
 
@@ -42,10 +48,26 @@ To define how to create the blocks you can change BLOCK OPTIONS:
   -g SECONDS, --gap SECONDS
                         gap between sections (if using --full-file option)
   -ul, --use-lines      Partition using line count instead of time
-  -kb, --keep-blocks    After processing file blocks maintain the partitions
-                        generated
-
-There are two command available compress and entropy.
+  -sae, --start-at-end  Cut a single block from the end of each file: the last
+                        SECONDS (section) ending deferred-start SECONDS before
+                        the end, reading only the end of the file
+  -kb, --keep-blocks    Also write the blocks into files (in the file_blocks
+                        directory); the blocks are otherwise analysed without
+                        writing them
+  -nosort, --no-sort-results
+                        Leave the rows of each csv file in the order the blocks
+                        finish (each row is written as soon as its block is
+                        done) instead of sorting them by block number
+  -db DB_FILE, --results-db DB_FILE
+                        Also keep the results in the SQLite file DB_FILE; the
+                        files whose blocks are already there with the same
+                        parameters are not computed again
+  --manifest FILE       Also use the paths listed in FILE (one per line) as
+                        inputs; '-' reads them from the standard input
+  --glob PATTERN        Also use the paths matching PATTERN as inputs ('**'
+                        matches any number of directories)
+
+There are three commands available compress, entropy and rqa.
 
 compress: This command allows you to compress all the files in the
      given directory.  The list of available compressors is
@@ -94,10 +116,21 @@ entropy: This command allows you to calculate the entropy for all
      sampen              Sample Entropy
      apen                Approximate Entropy
      apenv2              A slightly different implementation of Aproximate Entropy
+     cce                 Corrected Conditional Entropy (-d is the maximum pattern length)
 
     For a particular function's documentation please look at:
              pyeeg (http://code.google.com/p/pyeeg/downloads/list)
 
+
+rqa: This command allows you to calculate the recurrence quantification
+     analysis measures (recurrence rate, determinism and laminarity) of
+     every block.
+
+     OUTCOME: Calling this command will create a csv file using ';'
+     as a field delimiter for each file in the _blocks directory. Each
+     block is represented by a row with four columns, the number of the
+     block, it's RR, DET and LAM.
+
 Examples:
 
 
@@ -126,17 +159,33 @@ Calculate each files entropy using the Sample entropy.
 
 ./TSAnalyseFileBlocks.py unittest_dataset/ -s 300 -g 60 entropy sampen
 
+Calculate the Sample entropy of the last hour of each file (only the end of each file is read).
+
+./TSAnalyseFileBlocks.py unittest_dataset/ -s 3600 -sae entropy sampen
+
+
+=>RQA
+
+Cut files into 10min blocks and calculate the RQA measures of each one with embedding dimension 3.
+
+./TSAnalyseFileBlocks.py unittest_dataset/ -s 600 rqa -d 3
+
 
 """
 
 import os
-import csv
 import shutil
+import tempfile
 import logging
 import argparse
 import tools.entropy
 import tools.compress
+import tools.rqa
+import tools.results
+import tools.results_db
+import tools.dataset
 import tools.partition
+import tools.block_views
 import tools.separate_blocks
 import tools.utility_functions as util
 
@@ -154,6 +203,54 @@ def remove_blocks_dir(blocks, corrupted=False):
     pass
 
 
+def file_block_index(filename, file_path, options, blocks_dir):
+    """
+    (str, str, dict, str) -> (list of str, list of BlockBounds)
+
+    The lines of a file of the dataset and the bounds of its blocks (see
+    partition.file_block_index), reading the file once; with the keep_blocks option its block
+    files are written into blocks_dir from these lines. A file that cannot be partitioned is
+    logged and has no blocks.
+    """
+    try:
+        file_lines, blocks = tools.partition.file_block_index(file_path,
+                                                              options['partition_start'],
+                                                              options['section'],
+                                                              options['gap'],
+                                                              options['start_at_end'],
+                                                              options['using_lines'])
+        if options["keep_blocks"] and blocks:
+            tools.partition.write_file_blocks(filename, file_lines, blocks_dir, blocks)
+    except OSError as ose:
+        logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(file_path)))
+    except IOError as ioe:
+        logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(file_path)))
+    except ValueError:
+        logger.critical("The file '%s' does not contain the necessary columns for the evaluation. "
+                        "Please make sure the file has two columns: "
+                        "the first with the timestamps and the second with the hrf values."
+                        % util.remove_project_path_from_file(file_path))
+    else:
+        return file_lines, blocks
+    if options["keep_blocks"]:
+        file_block_dir = os.path.join(blocks_dir, "%s_blocks"
+                                      % os.path.splitext(util.remove_compression_extension(filename))[0])
+        if os.path.isdir(file_block_dir):
+            remove_blocks_dir(file_block_dir, corrupted=True)
+    return [], []
+
+
+def signature_file(dataset_path, file_path):
+    """
+    (str, str) -> str
+
+    File whose size and modification time identify the results of file_path in the results
+    store (see results_db.file_signature): the dataset container file_path was unpacked from,
+    or file_path itself.
+    """
+    return dataset_path if tools.dataset.is_container(dataset_path) else file_path
+
+
 # TODO: add another parameter (sampling_frequency) in order to partition by seconds
 
 if __name__ == "__main__":
@@ -161,13 +258,16 @@ if __name__ == "__main__":
         os.mkdir(util.RUN_ISOLATED_FILES_PATH)
 
     parser = argparse.ArgumentParser(description="Analysis of the file's blocks")
-    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs="+",
+    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs=util.input_path_nargs(),
                         help="Path for a file or directory containing the datasets to be used as input")
+    util.add_input_parser_options(parser)
 
     util.add_logger_parser_options(parser)
+    util.add_cache_parser_options(parser)
     tools.partition.add_parser_options(parser, full_file_option=False, file_blocks_usage=True)
     #    tools.separate_blocks.add_parser_options(parser)
     util.add_csv_parser_options(parser)
+    tools.results.add_parser_options(parser)
 
     subparsers = parser.add_subparsers(help='Different commands to be run on directory', dest="command")
 
@@ -179,21 +279,27 @@ if __name__ == "__main__":
     tools.entropy.add_parser_options(entropy)
     util.add_numbers_parser_options(entropy)
 
+    rqa = subparsers.add_parser('rqa', help='calculate the recurrence quantification analysis measures for all the '
+                                            'files in the given directory')
+    tools.rqa.add_parser_options(rqa)
+    util.add_numbers_parser_options(rqa)
+
     args = parser.parse_args()
     options = vars(args)
 
     logger = util.initialize_logger(logger_name="tsanalyse", log_file=options["log_file"],
                                     log_level=options["log_level"], with_first_entry="TSAnalyseFileBlocks")
+    util.set_series_cache_dir(options["cache_dir"])
+    results_db = tools.results_db.open_results_db(options["results_db"]) if options["results_db"] else None
 
     # lets protect the execution by forcing absolute values
     opts_to_protect = ["partition_start", "section", "gap",
-                       "dimension", "sd_tolerance", "unique_tolerance", "round_digits"]
+                       "dimension", "sd_tolerance", "unique_tolerance", "round_digits", "levels", "lag", "min_line"]
     for option_key in opts_to_protect:
         if option_key in options.keys() and options[option_key] != 0:
             options[option_key] = None if not options[option_key] else abs(options[option_key])
 
     # THESE OPTIONS ARE DISABLED FOR NOW
-    options['start_at_end'] = False
     options['decompress'] = None
 
     change_output_location = False
@@ -218,225 +324,257 @@ if __name__ == "__main__":
     #         logger.info("Creating directory %s" % specified_output)
     #         os.makedirs(specified_output)
 
-    if not os.path.exists(util.FILE_BLOCKS_STORAGE_PATH):
+    if options["keep_blocks"] and not os.path.exists(util.FILE_BLOCKS_STORAGE_PATH):
         logger.warning("Output directory for file blocks does not exist.")
         logger.info("Creating '%s'..." % util.FILE_BLOCKS_STORAGE_PATH)
         os.mkdir(util.FILE_BLOCKS_STORAGE_PATH)
 
-    iterable_input_path = options['input_path'][0].split(" ") if len(options['input_path']) == 1 else options['input_path']
-
-    for inputs in iterable_input_path:
+    # the inputs of a manifest or glob pattern are listed lazily, so the first ones are processed right away
+    for inputs in util.iter_input_paths(options['input_path'], options['manifest'], options['glob_pattern']):
         inputdir = inputs.strip()
         inputdir = util.remove_slash_from_path(inputdir)
         inputdir = os.path.expanduser(inputdir)  # to handle the case of paths as a string
 
-        if not os.path.isdir(inputdir):
-            output_location = os.path.join(block_analysis_storage, "individual_runs")
-        else:
-            output_location = os.path.join(block_analysis_storage, os.path.basename(inputdir))
-
-        if not os.path.exists(output_location):
-            if not change_output_location:  # we just want to display this message if we use the default path
-                logger.warning("Output directory for block analysis does not exist.")
-            logger.info("Creating '%s'..." % output_location)
-            os.makedirs(output_location)
-
-        file_blocks_suffix = "sec_%d_gap_%d" % (options['section'], options['gap'])
-        dataset_suffix_name = "%s_parts_%s" % (util.get_dataset_name_from_path(inputdir), file_blocks_suffix)
-
-        blocks_dir = os.path.join(util.FILE_BLOCKS_STORAGE_PATH, dataset_suffix_name)
+        # the results of the series of a container are stored for the container (see signature_file)
+        dataset_path = inputdir
+        unpacked_dir = None
+        if tools.dataset.is_container(inputdir):
+            # partitioning needs the timestamps of each line, so the series are written back as text
+            unpacked_dir = tempfile.mkdtemp()
+            inputdir = os.path.join(unpacked_dir, util.remove_file_extension(os.path.basename(dataset_path)))
+            logger.info("Unpacking dataset container into '%s'" % inputdir)
 
-        if not os.path.exists(blocks_dir):
-            logger.info("Creating %s..." % util.remove_project_path_from_file(blocks_dir))
-            os.mkdir(blocks_dir)
-
-        logger.info("Starting partition procedures")
-        logger.info("File partitions will be stored in '%s'" % util.remove_project_path_from_file(blocks_dir))
-
-        block_minutes = {}
-        logger.info("Partitioning file in %d seconds intervals with %d seconds gaps" % (options['section'],
-                                                                                        options['gap']))
-
-        # note: Mara probably used the gap to jump from the initial entry and not the last ??
-        if options['gap'] == 0:
-            options['gap'] = options['section']
         try:
-            block_minutes = tools.partition.partition(inputdir,
-                                                      blocks_dir,
-                                                      options['partition_start'],
-                                                      options['section'],
-                                                      options['gap'],
-                                                      options['start_at_end'],
-                                                      True,  # always use the full file to create partitions
-                                                      options['using_lines'])
-
-        # WARNING: catching these error here will terminate all subsequent computations, even if among the files, some are valid
-        except OSError as ose:
-            logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(inputdir)))
-            remove_blocks_dir(blocks_dir, corrupted=True)
-        except IOError as ioe:
-            logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(inputdir)))
-            remove_blocks_dir(blocks_dir, corrupted=True)
-        except ValueError:
-            logger.critical("The file '%s' does not contain the necessary columns for the evaluation. "
-                            "Please make sure the file has two columns: "
-                            "the first with the timestamps and the second with the hrf values."
-                            % util.remove_project_path_from_file(inputdir))
-            remove_blocks_dir(blocks_dir, corrupted=True)
-        else:
-            logger.info("Partitioning complete")
-
-            if not tools.partition.is_block_time_table_empty(block_minutes):
-
-                if options['command'] == 'compress':
-                    compressed = {}
-                    options['level'] = tools.compress.set_level(options)
-                    for filename in block_minutes:
-                        if len(block_minutes[filename]) > 0:
-                            bfile = os.path.splitext(filename)[0]
-                            logger.info("Compression started for %s" % os.path.join(blocks_dir, "%s_blocks" % filename))
+            if unpacked_dir is not None:
+                tools.dataset.unpack_dataset(dataset_path, inputdir)
+
+            if not os.path.isdir(inputdir):
+                output_location = os.path.join(block_analysis_storage, "individual_runs")
+            else:
+                output_location = os.path.join(block_analysis_storage, os.path.basename(inputdir))
+
+            if not os.path.exists(output_location):
+                if not change_output_location:  # we just want to display this message if we use the default path
+                    logger.warning("Output directory for block analysis does not exist.")
+                logger.info("Creating '%s'..." % output_location)
+                os.makedirs(output_location)
+
+            file_blocks_suffix = "sec_%d_gap_%d" % (options['section'], options['gap'])
+            if options['start_at_end']:
+                # a single block, cut from the end of each file
+                file_blocks_suffix += "_end"
+            dataset_suffix_name = "%s_parts_%s" % (util.get_dataset_name_from_path(inputdir), file_blocks_suffix)
+
+            blocks_dir = os.path.join(util.FILE_BLOCKS_STORAGE_PATH, dataset_suffix_name)
+
+            logger.info("Starting partition procedures")
+            logger.info("Partitioning files in %d seconds intervals with %d seconds gaps" % (options['section'],
+                                                                                             options['gap']))
+
+            # note: Mara probably used the gap to jump from the initial entry and not the last ??
+            if options['gap'] == 0:
+                options['gap'] = options['section']
+
+            if options["keep_blocks"]:
+                if not os.path.exists(blocks_dir):
+                    logger.info("Creating %s..." % util.remove_project_path_from_file(blocks_dir))
+                    os.mkdir(blocks_dir)
+                logger.info("File partitions will be stored in '%s'" % util.remove_project_path_from_file(blocks_dir))
+
+            # each file is partitioned when its turn comes, unless its results are already stored, and its blocks
+            # are analysed (and written) from the lines read to partition it
+            dataset_files = tools.partition.dataset_files(inputdir)
+
+            if options['command'] == 'compress':
+                stored_results = False
+                options['level'] = tools.compress.set_level(options)
+                for filename, file_path in dataset_files:
+                    bfile = os.path.splitext(util.remove_compression_extension(filename))[0]
+                    if options['decompress']:
+                        fboutsuffix = "%s_%s_decompress_%s" % (os.path.basename(bfile),
+                                                               file_blocks_suffix,
+                                                               options['compressor'])
+                    else:
+                        fboutsuffix = "%s_%s_%s_lvl_%s" % (os.path.basename(bfile),
+                                                           file_blocks_suffix,
+                                                           options['compressor'],
+                                                           options['level'])
+                    if options['comp_rate']:
+                        fboutsuffix += "_wCR"
+
+                    fboutsuffix += ".csv"
+
+                    fboutname = os.path.join(output_location, fboutsuffix)
+                    header = ["Block", "Original Size", "Compressed Size"]
+                    if options['comp_rate']:
+                        header.append("CRx100")
+                    if options['decompress']:
+                        header.append("Decompression Time")
+                    store = tools.results_db.results_store(results_db, dataset_path,
+                                                           "blocks_compress", options['compressor'], options,
+                                                           filename=bfile,
+                                                           file_path=signature_file(dataset_path, file_path))
+                    results_file = tools.results.open_results(fboutname, header, options["write_separator"],
+                                                              options["line_terminator"], store)
+
+                    def write_compression_row(block_number, block_results):
+                        logger.debug("Compression Data for block '{1}': {0}".format(block_results,
+                                                                                    block_number))
+                        row_data = [block_number, block_results.original, block_results.compressed]
+                        if options['comp_rate']:
+                            row_data.append(block_results.compression_rate)
+                        if options['decompress']:
+                            row_data.append(block_results.time)
+                        tools.results.write_rows(results_file, [row_data])
+
+                    if store is not None and tools.results_db.is_completed(store):
+                        logger.info("Results of '%s' already stored. Skipping ..." % bfile)
+                    else:
+                        file_lines, blocks = file_block_index(filename, file_path, options, blocks_dir)
+                        if len(blocks) > 0:
+                            logger.info("Compression started for the blocks of %s" % filename)
                             try:
-                                compressed[bfile] = tools.compress.compress(os.path.join(blocks_dir, "%s_blocks" % bfile),
-                                                                            options['compressor'], options['level'],
-                                                                            options['decompress'], options['comp_rate'],
-                                                                            options["round_digits"])
+                                tools.block_views.blocks_compression(file_path, blocks,
+                                                                     options['compressor'], options['level'],
+                                                                     options['decompress'], options['comp_rate'],
+                                                                     options["round_digits"],
+                                                                     on_result=write_compression_row,
+                                                                     file_lines=file_lines)
                             except OSError as ose:
-                                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(blocks_dir)))
-                                remove_blocks_dir(blocks_dir, corrupted=True)
+                                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(file_path)))
                             except IOError as ioe:
-                                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(blocks_dir)))
-                                remove_blocks_dir(blocks_dir, corrupted=True)
+                                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(file_path)))
                             else:
                                 logger.info("Compression complete")
                         else:
                             logger.warning("No timestamps to partition file '{0}'. Skipping ..."
                                            .format(util.remove_project_path_from_file(filename)))
-                            logger.debug("List of timestamps: {0}".format(block_minutes[filename]))
-
-                    # we will log the compression table by key for better debugging
-                    if not tools.compress.is_compression_table_empty(compressed):
-
-                        for filename in compressed:
-
-                            if options['decompress']:
-                                fboutsuffix = "%s_%s_decompress_%s" % (os.path.basename(filename),
-                                                                       file_blocks_suffix,
-                                                                       options['compressor'])
-                            else:
-                                fboutsuffix = "%s_%s_%s_lvl_%s" % (os.path.basename(filename),
-                                                                   file_blocks_suffix,
-                                                                   options['compressor'],
-                                                                   options['level'])
-                            if options['comp_rate']:
-                                fboutsuffix += "_wCR"
-
-                            fboutsuffix += ".csv"
-
-                            fboutname = os.path.join(output_location, fboutsuffix)
-
-                            file_to_write = open(fboutname, "w")
-                            writer = csv.writer(file_to_write, delimiter=options["write_separator"],
-                                                lineterminator=options["line_terminator"])
-                            header = ["Block", "Original Size", "Compressed Size"]
-                            if options['comp_rate']:
-                                header.append("CRx100")
-                            if options['decompress']:
-                                header.append("Decompression Time")
-                            writer.writerow(header)
-
-                            for blocknum in range(1, len(compressed[filename]) + 1):
-                                block_results = compressed[filename]['%s_%d' % (filename, blocknum)]
-                                logger.debug("Compression Data for block '{1}': {0}".format(block_results,
-                                                                                            '%s_%d' % (filename, blocknum)))
-                                row_data = [blocknum, block_results.original, block_results.compressed]
-                                if options['comp_rate']:
-                                    row_data.append(block_results.compression_rate)
-                                if options['decompress']:
-                                    row_data.append(block_results.time)
-                                writer.writerow(row_data)
-
-                            file_to_write.close()
-                            logger.info("Storing into: %s" % os.path.abspath(fboutname))
+                    if tools.results.close_results(results_file, options["sort_results"], numeric_key=True):
+                        stored_results = True
+                        logger.info("Storing into: %s" % os.path.abspath(fboutname))
+
+                if not stored_results:
+                    logger.warning("Compression table is empty. Nothing to write to file")
+
+            elif options['command'] == 'entropy':
+                algorithm = options['algorithm'].lower()
+                tolerance_to_use = options["sd_tolerance"]
+                if options["unique_tolerance"]:
+                    tolerance_to_use = options["unique_tolerance"]
+                    logger.info("Tolerance does not include Standard Deviation")
+                else:
+                    logger.info("Tolerance includes Standard Deviation")
+                stored_results = False
+                for filename, file_path in dataset_files:
+                    bfile = os.path.splitext(util.remove_compression_extension(filename))[0]
+
+                    fboutsuffix = "%s_%s_%s_dim_%d_tol_%.2f.csv" % (os.path.basename(bfile),
+                                                                    file_blocks_suffix, algorithm,
+                                                                    options['dimension'], tolerance_to_use)
+                    fboutname = os.path.join(output_location, fboutsuffix)
+                    store = tools.results_db.results_store(results_db, dataset_path,
+                                                           "blocks_entropy", algorithm, options, filename=bfile,
+                                                           file_path=signature_file(dataset_path, file_path))
+                    results_file = tools.results.open_results(fboutname, ["Block", "Entropy"],
+                                                              options["write_separator"],
+                                                              options["line_terminator"], store)
+
+                    def write_entropy_row(block_number, block_results):
+                        logger.debug("Entropy Data for block '{1}': {0}".format(block_results,
+                                                                                block_number))
+                        tools.results.write_rows(results_file, [[block_number, block_results.entropy]])
+
+                    if store is not None and tools.results_db.is_completed(store):
+                        logger.info("Results of '%s' already stored. Skipping ..." % bfile)
                     else:
-                        logger.debug("Compression table: {0}".format(compressed))
-                        logger.warning("Compression table is empty. Nothing to write to file")
-
-                elif options['command'] == 'entropy':
-                    algorithm = options['algorithm'].lower()
-                    tolerance_to_use = options["sd_tolerance"]
-                    entropy = {}
-                    for filename in block_minutes:
-                        if len(block_minutes[filename]) > 0:
-                            bfile = os.path.splitext(filename)[0]
-                            logger.info("Entropy calculations started for %s"
-                                        % util.remove_project_path_from_file(os.path.join(blocks_dir, "%s_blocks" % bfile)))
+                        file_lines, blocks = file_block_index(filename, file_path, options, blocks_dir)
+                        if len(blocks) > 0:
+                            logger.info("Entropy calculations started for the blocks of %s" % filename)
                             try:
-                                files_stds = tools.entropy.calculate_std(os.path.join(blocks_dir, "%s_blocks" % bfile))
+                                tools.block_views.blocks_entropy(file_path, blocks, algorithm,
+                                                                 options['dimension'], tolerance_to_use,
+                                                                 not options["unique_tolerance"],
+                                                                 options["round_digits"],
+                                                                 on_result=write_entropy_row,
+                                                                 file_lines=file_lines,
+                                                                 **tools.entropy.algorithm_options(algorithm,
+                                                                                                   options))
                             except OSError as ose:
-                                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(blocks_dir)))
-                                remove_blocks_dir(blocks_dir, corrupted=True)
+                                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(file_path)))
                             except IOError as ioe:
-                                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(blocks_dir)))
-                                remove_blocks_dir(blocks_dir, corrupted=True)
+                                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(file_path)))
                             else:
-                                tolerances = dict((filename, files_stds[filename] * options["sd_tolerance"]) for filename in files_stds)
-                                if options["unique_tolerance"]:
-                                    tolerance_to_use = options["unique_tolerance"]
-                                    logger.info("Tolerance does not include Standard Deviation")
-                                    tolerances = dict(zip(files_stds.keys(),[options["unique_tolerance"]] * len(files_stds)))
-                                else:
-                                    logger.info("Tolerance includes Standard Deviation")
-
-                                try:
-                                    entropy[bfile] = tools.entropy.entropy(os.path.join(blocks_dir, "%s_blocks" % bfile),
-                                                                           algorithm, options['dimension'],
-                                                                           tolerances, options["round_digits"])
-                                except OSError as ose:
-                                    logger.critical("%s - %s"
-                                                    % (ose[1], util.remove_project_path_from_file(blocks_dir)))
-                                except IOError as ioe:
-                                    logger.critical("%s - %s"
-                                                    % (ioe[1], util.remove_project_path_from_file(blocks_dir)))
-                                else:
-                                    logger.info("Entropy calculations complete")
-
+                                logger.info("Entropy calculations complete")
                         else:
                             logger.warning("No timestamps to partition file '{0}'. Skipping ..."
                                            .format(util.remove_project_path_from_file(filename)))
-                            logger.debug("List of timestamps: {0}".format(block_minutes[filename]))
-
-                    if not tools.entropy.is_entropy_table_empty(entropy):
-                        for filename in entropy:
-                            fboutsuffix = "%s_%s_%s_dim_%d_tol_%.2f.csv" % (os.path.basename(filename), file_blocks_suffix,
-                                                                            algorithm, options['dimension'],
-                                                                            tolerance_to_use)
-                            fboutname = os.path.join(output_location, fboutsuffix)
-
-                            file_to_write = open(fboutname, "w")
-                            writer = csv.writer(file_to_write, delimiter=options["write_separator"],
-                                                lineterminator=options["line_terminator"])
-
-                            header = ["Block", "Entropy"]
-                            writer.writerow(header)
-                            for blocknum in range(1, len(entropy[filename]) + 1):
-                                block_results = entropy[filename]['%s_%d' % (filename, blocknum)]
-                                logger.debug("Entropy Data for block '{1}': {0}".format(block_results,
-                                                                                        '%s_%d' % (filename, blocknum)))
-
-                                row_data = [blocknum, block_results.entropy]
-                                writer.writerow(row_data)
-
-                            file_to_write.close()
-                            logger.info("Storing into: %s" % os.path.abspath(fboutname))
+                    if tools.results.close_results(results_file, options["sort_results"], numeric_key=True):
+                        stored_results = True
+                        logger.info("Storing into: %s" % os.path.abspath(fboutname))
+
+                if not stored_results:
+                    logger.warning("Entropy table is empty. Nothing to write to file")
+
+            elif options['command'] == 'rqa':
+                tolerance_to_use = options["sd_tolerance"]
+                if options["unique_tolerance"]:
+                    tolerance_to_use = options["unique_tolerance"]
+                    logger.info("Tolerance does not include Standard Deviation")
+                else:
+                    logger.info("Tolerance includes Standard Deviation")
+                stored_results = False
+                for filename, file_path in dataset_files:
+                    bfile = os.path.splitext(util.remove_compression_extension(filename))[0]
+
+                    fboutsuffix = "%s_%s_rqa_dim_%d_lag_%d_tol_%.2f.csv" % (os.path.basename(bfile),
+                                                                            file_blocks_suffix,
+                                                                            options['dimension'],
+                                                                            options['lag'], tolerance_to_use)
+                    fboutname = os.path.join(output_location, fboutsuffix)
+                    store = tools.results_db.results_store(results_db, dataset_path,
+                                                           "blocks_rqa", None, options, filename=bfile,
+                                                           file_path=signature_file(dataset_path, file_path))
+                    results_file = tools.results.open_results(fboutname, ["Block", "RR", "DET", "LAM"],
+                                                              options["write_separator"],
+                                                              options["line_terminator"], store)
+
+                    def write_rqa_row(block_number, block_results):
+                        logger.debug("RQA Data for block '{1}': {0}".format(block_results, block_number))
+                        tools.results.write_rows(results_file, [[block_number,
+                                                                 block_results.recurrence_rate,
+                                                                 block_results.determinism,
+                                                                 block_results.laminarity]])
+
+                    if store is not None and tools.results_db.is_completed(store):
+                        logger.info("Results of '%s' already stored. Skipping ..." % bfile)
                     else:
-                        logger.debug("Entropy table: {0}".format(entropy))
-                        logger.warning("Entropy table is empty. Nothing to write to file")
+                        file_lines, blocks = file_block_index(filename, file_path, options, blocks_dir)
+                        if len(blocks) > 0:
+                            logger.info("RQA calculations started for the blocks of %s" % filename)
+                            try:
+                                tools.block_views.blocks_rqa(file_path, blocks, options['dimension'],
+                                                             options['lag'], tolerance_to_use,
+                                                             not options["unique_tolerance"], options['min_line'],
+                                                             options["round_digits"], on_result=write_rqa_row,
+                                                             file_lines=file_lines)
+                            except OSError as ose:
+                                logger.critical("%s - %s" % (ose[1], util.remove_project_path_from_file(file_path)))
+                            except IOError as ioe:
+                                logger.critical("%s - %s" % (ioe[1], util.remove_project_path_from_file(file_path)))
+                            else:
+                                logger.info("RQA calculations complete")
+                        else:
+                            logger.warning("No timestamps to partition file '{0}'. Skipping ..."
+                                           .format(util.remove_project_path_from_file(filename)))
+                    if tools.results.close_results(results_file, options["sort_results"], numeric_key=True):
+                        stored_results = True
+                        logger.info("Storing into: %s" % os.path.abspath(fboutname))
 
-            else:
-                logger.debug("Partition timestamps table:{0}".format(block_minutes))
-                logger.warning("Table containing the timestamps for partitioning is empty. Nothing to do.")
+                if not stored_results:
+                    logger.warning("RQA table is empty. Nothing to write to file")
 
-        if not options["keep_blocks"]:
-            remove_blocks_dir(blocks_dir)
+        finally:
+            if unpacked_dir is not None:
+                shutil.rmtree(unpacked_dir, ignore_errors=True)
 
     logger.info("Done")
@@ -40,8 +40,40 @@ OPTIONS to apply when creating the scales:
                         number in the series by MUL ORDER, -1 disables this
                         option; Default:[-1]
   -rint, --round-to-int Round the scales values to int.
-  -ks, --keep-scales    After multiscale processing maintain the generated
-                        scales
+  -j JOBS, --jobs JOBS  Number of processes used to compute the scales; every
+                        (file, scale) is a task of its own and the most
+                        expensive ones are run first. Default:[1]
+  -ks, --keep-scales    Also write the scales to disk (they are otherwise only
+                        built in memory) and keep them after multiscale
+                        processing, for inspection. Scales written by a
+                        previous run are reused if they were built from the
+                        same inputs and parameters
+  -nosort, --no-sort-results
+                        Leave the rows of the csv file in the order the files
+                        finish (each row is written as soon as every scale of
+                        its file is done) instead of sorting them by file name
+  -db DB_FILE, --results-db DB_FILE
+                        Also keep the results in the SQLite file DB_FILE; the
+                        files already there with the same parameters are not
+                        computed again
+  --manifest FILE       Also use the paths listed in FILE (one per line) as
+                        inputs; '-' reads them from the standard input
+  --glob PATTERN        Also use the paths matching PATTERN as inputs ('**'
+                        matches any number of directories)
+
+OPTIONS to compute every scale of every block of the files (block x scale grid):
+  -bs SECONDS, --block-section SECONDS
+                        Cut each file into blocks of SECONDS (lines with -bl)
+                        and compute every scale of every block, in a single
+                        pass, into one table with a row per file, block and
+                        scale (no block or scale is written to disk)
+  -bg SECONDS, --block-gap SECONDS
+                        Time between the starts of two consecutive blocks (0
+                        for consecutive blocks). Default:[0]
+  -bds SECONDS, --block-deferred-start SECONDS
+                        Time between the start of the file and the start of
+                        the first block. Default:[0]
+  -bl, --block-lines    Measure the blocks in lines instead of time
 
 The two available commands are compress and entropy.
 
@@ -90,6 +122,18 @@ entropy: This command allows you to calculate the entropy for all
      sampen              Sample Entropy
      apen                Approximate Entropy
      apenv2              A slightly different implementation of Approximate Entropy
+     cce                 Corrected Conditional Entropy (-d is the maximum pattern length)
+
+
+    The multiscale entropy variant is chosen with -mse (entropy option):
+
+     mse                 Classic multiscale entropy [default]
+     cmse                Composite multiscale entropy: the mean of the entropies
+                         of the SCALE coarse-grained series starting at each of
+                         the first SCALE points
+     rcmse               Refined composite multiscale entropy (sampen only): the
+                         sample entropy of the match counts of those series added
+                         up, defined for much shorter series at high scales
 
 
     For a sampen and apen documentation please look at:
@@ -106,6 +150,16 @@ Multiscale entropy for all the files starting at scale 1(original files)
  and ending in scale 20
     ./TSAnalyseMultiScale.py unittest_dataset_filtered entropy sampen
 
+Refined composite multiscale entropy, better suited to short recordings
+    ./TSAnalyseMultiScale.py unittest_dataset_filtered entropy -a sampen -mse rcmse
+
+Multiscale entropy of each 10 minute block of the files (columns Filename, Block, Scale and Entropy)
+    ./TSAnalyseMultiScale.py unittest_dataset -bs 600 entropy -a sampen
+
+Multiscale entropy along with the slopes of the entropy curve of each file
+(Slope_1:2 ... Slope_1:20, written to <RESULTS>_slopes.csv)
+    ./TSAnalyseMultiScale.py unittest_dataset_filtered entropy -a sampen -slopes
+
 Multiscale compression with rounded results for scale, since the scales are constructed
 by averaging a given number of point we are bound to have floats, this options
 rounds those numbers to an integer.
@@ -117,7 +171,6 @@ point is multiplied by 10 and rounded. The final dataset also contains the compr
 """
 
 import os
-import csv
 import shutil
 import logging
 import argparse
@@ -126,10 +179,15 @@ import functools
 import tools.entropy
 import tools.compress
 import tools.multiscale
+import tools.block_grid
+import tools.results
+import tools.results_db
 import tools.utility_functions as util
 
 
 def remove_scales_dir(scales, corrupted=False):
+    if not os.path.exists(scales):
+        return
     message = "Cleaning up corrupted scales' directory (%s)..." % scales if corrupted \
         else "Cleaning up scales' directory (%s) ..." % scales
     logger.info(message)
@@ -141,17 +199,82 @@ def remove_scales_dir(scales, corrupted=False):
     pass
 
 
+def block_grid_analysis(input_dir, output_name, options):
+    """
+    Block x scale grid of a dataset (see tools.block_grid), written to a single long format csv file.
+    """
+    scales_name = "start_%d_end_%d_step_%d" % (options["scale_start"], options["scale_stop"], options["scale_step"])
+    if options["command"] == "compress":
+        options["level"] = tools.compress.set_level(options)
+        outfile = "%s_multiscale_%s_%s_%s_lvl_%s" % (output_name, tools.block_grid.grid_suffix(options), scales_name,
+                                                      options["compressor"], options["level"])
+        if options['round']:
+            outfile += "_int"
+        if options['mul_order'] != -1:
+            outfile += "_%d" % (options["mul_order"])
+        if options['comp_rate']:
+            outfile += "_wCR"
+        header = ["Filename", "Block", "Scale", "Original", "Compressed"]
+        if options['comp_rate']:
+            header.append("CRx100")
+        if options['decompress']:
+            header.append("Decompression")
+    else:
+        algorithm = options['algorithm'].lower()
+        if options["mse_variant"] == "rcmse" and algorithm != "sampen":
+            logger.error("Refined composite multiscale entropy is only defined for sampen (not %s)" % algorithm)
+            return
+        tolerance_used = options["unique_tolerance"] or options["sd_tolerance"]
+        outfile = "%s_multiscale_%s_%s_%s_dim_%d_tol_%.2f" % (output_name, tools.block_grid.grid_suffix(options),
+                                                              scales_name, algorithm, options["dimension"],
+                                                              tolerance_used)
+        if options["mse_variant"] != "mse":
+            outfile += "_%s" % options["mse_variant"]
+        header = ["Filename", "Block", "Scale", "Entropy"]
+    outfile += ".csv"
+
+    # the results store keeps a row per file (and block): the grid is only written to the csv file
+    results_file = tools.results.open_results(outfile, header, options["write_separator"], options["line_terminator"])
+    write_grid_rows = lambda filename, rows: tools.results.write_rows(results_file, [[filename] + row for row in rows])
+    try:
+        if options["command"] == "compress":
+            tools.block_grid.grid_compression(input_dir, options["block_section"], options["block_gap"],
+                                              options["scale_start"], options["scale_stop"] + 1,
+                                              options["scale_step"], options["compressor"], options["level"],
+                                              options["decompress"], options["comp_rate"], options["round_digits"],
+                                              options["mul_order"], options["round"], options["block_start"],
+                                              options["block_lines"], on_result=write_grid_rows)
+        else:
+            tools.block_grid.grid_entropy(input_dir, options["block_section"], options["block_gap"],
+                                          options["scale_start"], options["scale_stop"] + 1, options["scale_step"],
+                                          algorithm, options["dimension"], tolerance_used,
+                                          not options["unique_tolerance"], options["round_digits"],
+                                          options["mul_order"], options["round"], options["block_start"],
+                                          options["block_lines"], options["mse_variant"], on_result=write_grid_rows,
+                                          **tools.entropy.algorithm_options(algorithm, options))
+    except (OSError, IOError) as err:
+        logger.critical("%s - %s" % (err[1], input_dir))
+    if tools.results.close_results(results_file, options["sort_results"]):
+        logger.info("Storing in: %s" % os.path.abspath(outfile))
+    else:
+        logger.warning("Block x scale table is empty. Nothing to write to file")
+
+
 if __name__ == "__main__":
 
     if not os.path.exists(util.RUN_ISOLATED_FILES_PATH):
         os.mkdir(util.RUN_ISOLATED_FILES_PATH)
 
     parser = argparse.ArgumentParser(description="Computes multiscale compression/entropy of a dataset")
-    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs="+",
+    parser.add_argument("input_path", metavar="INPUT PATH", action="store", nargs=util.input_path_nargs(),
                         help="Path for a file(s) or directory containing the dataset(s) to be used as input")
+    util.add_input_parser_options(parser)
     tools.multiscale.add_parser_options(parser)
+    tools.block_grid.add_parser_options(parser)
     util.add_csv_parser_options(parser)
+    tools.results.add_parser_options(parser)
     util.add_logger_parser_options(parser)
+    util.add_cache_parser_options(parser)
 
     subparsers = parser.add_subparsers(help='Different commands/operations to execute on the data sets', dest="command")
 
@@ -161,13 +284,14 @@ if __name__ == "__main__":
 
     entropy = subparsers.add_parser('entropy', help='Calculate multiscale entropy')
     tools.entropy.add_parser_options(entropy)
+    tools.multiscale.add_entropy_parser_options(entropy)
     util.add_numbers_parser_options(entropy)
 
     args = parser.parse_args()
     options = vars(args)
 
-    opts_to_protect = ["scale_start", "scale_stop", "scale_step", "mul_order",
-                       "dimension", "sd_tolerance", "unique_tolerance", "round_digits"]
+    opts_to_protect = ["scale_start", "scale_stop", "scale_step", "mul_order", "block_section", "block_gap",
+                       "block_start", "dimension", "sd_tolerance", "unique_tolerance", "round_digits", "levels"]
     for option_key in opts_to_protect:
         if option_key in options.keys() and options[option_key] != 0:
             options[option_key] = None if not options[option_key] else abs(options[option_key])
@@ -176,6 +300,8 @@ if __name__ == "__main__":
 
     logger = util.initialize_logger(logger_name="tsanalyse", log_file=options["log_file"],
                                     log_level=options["log_level"], with_first_entry="TSAnalyseMultiScale")
+    util.set_series_cache_dir(options["cache_dir"])
+    results_db = tools.results_db.open_results_db(options["results_db"]) if options["results_db"] else None
 
     change_output_location = False
     specified_output = os.path.expanduser(options["output_path"]) if options["output_path"] is not None else None
@@ -194,15 +320,13 @@ if __name__ == "__main__":
     #         logger.info("Creating directory %s" % specified_output)
     #         os.makedirs(specified_output)
 
-    # here we protect the execution for the case of sending multiple files as a string - required by other interfaces
-    iterable_input_path = options['input_path'][0].split(" ") if len(options['input_path']) == 1 else options['input_path']
-
-    for inputs in iterable_input_path:
+    # the inputs of a manifest or glob pattern are listed lazily, so the first ones are processed right away
+    for inputs in util.iter_input_paths(options['input_path'], options['manifest'], options['glob_pattern']):
         input_dir = inputs.strip()
         input_dir = util.remove_slash_from_path(input_dir)
         input_dir = os.path.expanduser(input_dir)  # to handle the case of paths as a string
 
-        scales_dir = '%s_Scales' % (input_dir if os.path.isdir(input_dir)
+        scales_dir = '%s_Scales' % (input_dir if util.is_dataset_dir(input_dir)
                                     else os.path.join(util.RUN_ISOLATED_FILES_PATH,
                                                       os.path.basename(util.remove_file_extension(input_dir))))
 
@@ -218,11 +342,14 @@ if __name__ == "__main__":
                            % options["scale_step"])
             options["scale_step"] = 1
 
-        logger.info("Creating Scales directory")
-
         try:
-            tools.multiscale.create_scales(input_dir, scales_dir, options["scale_start"], options["scale_stop"] + 1,
-                                           options["scale_step"], options['mul_order'], options['round'])
+            # the scales are built in memory by the multiscale functions; they are only written for inspection
+            if options["keep_scales"]:
+                logger.info("Creating Scales directory")
+                tools.multiscale.create_scales(input_dir, scales_dir, options["scale_start"],
+                                               options["scale_stop"] + 1, options["scale_step"], options['mul_order'],
+                                               options['round'])
+                logger.info("Scales Directory created")
         except OSError as ose:
             logger.critical("%s - %s" % (ose[1], input_dir))
             remove_scales_dir(scales_dir, corrupted=True)
@@ -233,9 +360,7 @@ if __name__ == "__main__":
             logger.critical("%s. Did you forget to filter the file?" % error)
             remove_scales_dir(scales_dir, corrupted=True)
         else:
-            logger.info("Scales Directory created")
-
-            if not os.path.isdir(input_dir):
+            if not util.is_dataset_dir(input_dir):
                 if change_output_location:
                     single_run_on_specified_location = os.path.join(os.path.abspath(specified_output), "individual_runs")
                     if not os.path.exists(single_run_on_specified_location):
@@ -252,7 +377,13 @@ if __name__ == "__main__":
                 else:
                     output_name = input_dir
 
-            if options["command"] == "compress":
+            if options["block_section"]:
+                if options["results_db"]:
+                    logger.warning("The block x scale grid is not kept in the results file %s"
+                                   % options["results_db"])
+                block_grid_analysis(input_dir, output_name, options)
+
+            elif options["command"] == "compress":
                 options["level"] = tools.compress.set_level(options)
                 if options['decompress']:
                     outfile = "%s_multiscale_start_%d_end_%d_step_%d_decompress_%s_lvl_%s" % (
@@ -270,66 +401,64 @@ if __name__ == "__main__":
                     outfile += "_wCR"
                 outfile += ".csv"
 
+                if (not options['decompress']) and (not options['comp_rate']):
+                    header = ["Filename"] + list(functools.reduce(
+                        operator.add, [("Scale_%d_Original" % s, "Scale_%d_Compressed" % s)
+                                       for s in range(options["scale_start"],
+                                                      options["scale_stop"] + 1,
+                                                      options["scale_step"])]))
+                elif options['decompress'] and (not options['comp_rate']):
+                    header = ["Filename"] + list(
+                        functools.reduce(
+                            operator.add, [("Scale_%d_Original" % s, "Scale_%d_Compressed" % s, "Scale_%d_Decompression" % s)
+                                           for s in range(options["scale_start"],
+                                                          options["scale_stop"] + 1,
+                                                          options["scale_step"])]))
+
+                elif (not options['decompress']) and options['comp_rate']:
+                    header = ["Filename"] + list(functools.reduce(
+                        operator.add, [("Scale_%d_Original" % s,"Scale_%d_Compressed" % s, "Scale_%d_CRx100" % s)
+                                       for s in range(options["scale_start"],
+                                                      options["scale_stop"] + 1,
+                                                      options["scale_step"])]))
+                else:
+                    header = ["Filename"] + list(
+                        functools.reduce(
+                            operator.add, [("Scale_%d_Original" % s,
+                                            "Scale_%d_Compressed" % s,
+                                            "Scale_%d_CRx100" % s,
+                                            "Scale_%d_Decompression" % s)
+                                           for s in range(options["scale_start"],
+                                                          options["scale_stop"] + 1,
+                                                          options["scale_step"])]))
+                store = tools.results_db.results_store(results_db, input_dir,
+                                                       "multiscale_compress", options["compressor"], options)
+                results_file = tools.results.open_results(outfile, header, options["write_separator"],
+                                                          options["line_terminator"], store)
+
+                def write_compression_row(filename, compression_row):
+                    if len(compression_row) > 0:
+                        tools.results.write_rows(results_file, [[filename] + compression_row])
+
                 try:
-                    compression_table = tools.multiscale.multiscale_compression(input_dir, scales_dir, options["scale_start"],
-                                                                            options["scale_stop"] + 1, options["scale_step"],
-                                                                            options["compressor"], options["level"],
-                                                                            options["decompress"], options["comp_rate"],
-                                                                            options['round_digits'])
+                    tools.multiscale.multiscale_compression(input_dir, options["scale_start"],
+                                                            options["scale_stop"] + 1, options["scale_step"],
+                                                            options["compressor"], options["level"],
+                                                            options["decompress"], options["comp_rate"],
+                                                            options['round_digits'], options['mul_order'],
+                                                            options['round'], on_result=write_compression_row,
+                                                            skip_files=tools.results_db.completed_files(store),
+                                                            jobs=max(1, options["jobs"]))
                 except OSError as ose:
                     logger.critical("%s - %s" % (ose[1], input_dir))
                     remove_scales_dir(scales_dir, corrupted=True)
                 except IOError as ioe:
                     logger.critical("%s - %s" % (ioe[1], input_dir))
                     remove_scales_dir(scales_dir, corrupted=True)
+                if tools.results.close_results(results_file, options["sort_results"]):
+                    logger.info("Storing in: %s" % os.path.abspath(outfile))
                 else:
-                    if not tools.compress.is_compression_table_empty(compression_table):
-
-                        output_file = open(outfile, "w")
-                        writer = csv.writer(output_file, delimiter=options["write_separator"], lineterminator=options["line_terminator"])
-
-                        if (not options['decompress']) and (not options['comp_rate']):
-                            header = ["Filename"] + list(functools.reduce(
-                                operator.add, [("Scale_%d_Original" % s, "Scale_%d_Compressed" % s)
-                                               for s in range(options["scale_start"],
-                                                              options["scale_stop"] + 1,
-                                                              options["scale_step"])]))
-                        elif options['decompress'] and (not options['comp_rate']):
-                            header = ["Filename"] + list(
-                                functools.reduce(
-                                    operator.add, [("Scale_%d_Original" % s, "Scale_%d_Compressed" % s, "Scale_%d_Decompression" % s)
-                                                   for s in range(options["scale_start"],
-                                                                  options["scale_stop"] + 1,
-                                                                  options["scale_step"])]))
-
-                        elif (not options['decompress']) and options['comp_rate']:
-                            header = ["Filename"] + list(functools.reduce(
-                                operator.add, [("Scale_%d_Original" % s,"Scale_%d_Compressed" % s, "Scale_%d_CRx100" % s)
-                                               for s in range(options["scale_start"],
-                                                              options["scale_stop"] + 1,
-                                                              options["scale_step"])]))
-                        else:
-                            header = ["Filename"] + list(
-                                functools.reduce(
-                                    operator.add, [("Scale_%d_Original" % s,
-                                                    "Scale_%d_Compressed" % s,
-                                                    "Scale_%d_CRx100" % s,
-                                                    "Scale_%d_Decompression" % s)
-                                                   for s in range(options["scale_start"],
-                                                                  options["scale_stop"] + 1,
-                                                                  options["scale_step"])]))
-
-                        writer.writerow(header)
-                        for filename in sorted(compression_table.keys()):
-
-                            if len(compression_table[filename]) > 0:
-                                writer.writerow([filename] + compression_table[filename])
-
-                        output_file.close()
-                        logger.info("Storing in: %s" % os.path.abspath(outfile))
-
-                    else:
-                        logger.warning("Compression table is empty. Nothing to write to file")
+                    logger.warning("Compression table is empty. Nothing to write to file")
 
             elif options["command"] == "entropy":
                 tolerance_used = options["sd_tolerance"]
@@ -339,54 +468,58 @@ if __name__ == "__main__":
                     use_sd_tolerance = False
 
                 algorithm = options['algorithm'].lower()
-                if algorithm == 'apen' or algorithm == 'apenv2' or algorithm == "sampen":
-                    outfile = "%s_multiscale_start_%d_end_%d_step_%d_%s_dim_%d_tol_%.2f.csv" % (output_name,
-                                                                                                options["scale_start"],
-                                                                                                options["scale_stop"],
-                                                                                                options["scale_step"],
-                                                                                                algorithm,
-                                                                                                options["dimension"],
-                                                                                                tolerance_used)
-                    entropy_table = {}
-
+                if options["mse_variant"] == "rcmse" and algorithm != "sampen":
+                    logger.error("Refined composite multiscale entropy is only defined for sampen (not %s)"
+                                 % algorithm)
+                elif algorithm in tools.entropy.AVAILABLE_ALGORITHMS:
+                    outfile = "%s_multiscale_start_%d_end_%d_step_%d_%s_dim_%d_tol_%.2f" % (output_name,
+                                                                                            options["scale_start"],
+                                                                                            options["scale_stop"],
+                                                                                            options["scale_step"],
+                                                                                            algorithm,
+                                                                                            options["dimension"],
+                                                                                            tolerance_used)
+                    if options["mse_variant"] != "mse":
+                        outfile += "_%s" % options["mse_variant"]
+                    outfile += ".csv"
+                    header = ["Filename"] + ["Scale_%d_Entropy" % s for s in
+                                             range(options["scale_start"], options["scale_stop"] + 1,
+                                                   options["scale_step"])]
+                    store = tools.results_db.results_store(results_db, input_dir,
+                                                           "multiscale_entropy", algorithm, options)
+                    results_file = tools.results.open_results(outfile, header, options["write_separator"],
+                                                              options["line_terminator"], store)
                     try:
-                        entropy_table = tools.multiscale.multiscale_entropy(input_dir, scales_dir,
-                                                                            options["scale_start"],
-                                                                            options["scale_stop"] + 1,
-                                                                            options["scale_step"], algorithm,
-                                                                            options["dimension"], tolerance_used,
-                                                                            use_sd_tolerance, options["round_digits"])
+                        tools.multiscale.multiscale_entropy(input_dir, options["scale_start"],
+                                                            options["scale_stop"] + 1, options["scale_step"], algorithm,
+                                                            options["dimension"], tolerance_used, use_sd_tolerance,
+                                                            options["round_digits"], options['mul_order'],
+                                                            options['round'],
+                                                            on_result=lambda filename, entropy_row:
+                                                            tools.results.write_rows(results_file,
+                                                                                     [[filename] + entropy_row]),
+                                                            skip_files=tools.results_db.completed_files(store),
+                                                            mse_variant=options["mse_variant"],
+                                                            jobs=max(1, options["jobs"]),
+                                                            **tools.entropy.algorithm_options(algorithm, options))
                     except OSError as ose:
                         logger.critical("%s - %s" % (ose[1], input_dir))
                         remove_scales_dir(scales_dir, corrupted=True)
                     except IOError as ioe:
                         logger.critical("%s - %s" % (ioe[1], input_dir))
                         remove_scales_dir(scales_dir, corrupted=True)
+                    if tools.results.close_results(results_file, options["sort_results"]):
+                        logger.info("Storing in: %s" % os.path.abspath(outfile))
+                        if options["with_slopes"]:
+                            slopes_file = tools.multiscale.entropy_slopes(
+                                outfile, range(options["scale_start"], options["scale_stop"] + 1,
+                                               options["scale_step"]),
+                                options["write_separator"], options["line_terminator"], options["round_digits"])
+                            logger.info("Storing slopes in: %s" % os.path.abspath(slopes_file))
                     else:
-                        if not tools.entropy.is_entropy_table_empty(entropy_table):
-                            output_file = open(outfile, "w")
-                            writer = csv.writer(output_file, delimiter=options["write_separator"],
-                                                lineterminator=options["line_terminator"])
-
-                            header = ["Filename"] + ["Scale_%d_Entropy" % s for s in
-                                                     range(options["scale_start"], options["scale_stop"] + 1,
-                                                           options["scale_step"])]
-                            writer.writerow(header)
-                            for filename in sorted(entropy_table.keys()):
-
-                                if len(entropy_table[filename]) > 0:
-                                    writer.writerow([filename] + entropy_table[filename])
-
-                            output_file.close()
-                            logger.info("Storing in: %s" % os.path.abspath(outfile))
-                        else:
-                            logger.warning("Entropy table is empty. Nothing to write to file")
+                        logger.warning("Entropy table is empty. Nothing to write to file")
 
                 else:
                     logger.error("Multiscale not implemented for %s" % algorithm)
-                    remove_scales_dir(scales_dir)
-
-            if not options["keep_scales"]:
-                remove_scales_dir(scales_dir)
 
     logger.info("Done")
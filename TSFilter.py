@@ -40,8 +40,28 @@ TSFilter is a command line interface that allows you to apply filter
 
        -rint, --round-to-int    Round the hrf values to int
 
-       -col HRF-COLUMN, --column HRF-COLUMN
-                                Column in the dataset to extract hrf from; [default:1]
+       -col HRF-COLUMN [HRF-COLUMN ...], --column HRF-COLUMN [HRF-COLUMN ...]
+                                Column(s) in the dataset to extract hrf from. With
+                                several columns, each one is written to its own
+                                output ('_col<COLUMN>' is appended to the output
+                                directory, or to the file name), and the input is
+                                read only once; [default:1]
+
+       -clims COLUMN LOWER UPPER, --channel-cutoff-limits COLUMN LOWER UPPER
+                                Cutoff limits of a single column, overriding -lims
+                                for that column. May be repeated, once per column.
+
+       -j JOBS, --jobs JOBS     Number of processes used to filter the files of a
+                                directory; [default:1]
+
+       -pack, --pack-dataset    Also pack the filtered directory into a single
+                                dataset container (<dataset>_filtered.tsds)
+
+       --manifest FILE          Also filter the paths listed in FILE (one per line);
+                                '-' reads them from the standard input
+
+       --glob PATTERN           Also filter the paths matching PATTERN ('**' matches
+                                any number of directories)
 
 Examples:
 
@@ -54,6 +74,13 @@ Examples:
        Retrieve the hrf from the second column of the input file
      ./TSFilter.py unittest_dataset filter -col 2
 
+       Retrieve the fetal (column 1) and maternal (column 3) heart rate and the uterine
+       contractions (column 4) in a single pass, each with its own limits
+     ./TSFilter.py unittest_dataset filter -col 1 3 4 -lims 50 250 -clims 4 0 127
+
+       Retrieve the hrf and pack the filtered files into unittest_dataset_filtered.tsds
+     ./TSFilter.py unittest_dataset -pack
+
 
 """
 
@@ -63,6 +90,7 @@ import os
 import logging
 import argparse
 import tools.filter
+import tools.dataset
 import tools.entropy
 import tools.compress
 import tools.utility_functions as util
@@ -94,12 +122,29 @@ def clean_procedures(inputdir, options):
                                           os.path.basename(inputdir) + filtered_suffix)
         filtered_suffix = None
 
-    if not os.path.isdir(outputdir_path):
-        logger.info("Creating directory %s" % outputdir_path)
-        os.makedirs(outputdir_path)
-    tools.filter.ds_filter(inputdir, outputdir_path, keep_time=options['keep_time'],
-                           cutoff_limits=options['limits'], round_to_int=options["round_to_int"],
-                           hrf_col=abs(options["column"]), suffix=filtered_suffix)
+    columns = []
+    for column in map(abs, options["column"]):
+        if column not in columns:
+            columns.append(column)
+    limits = tools.filter.channel_cutoff_limits(columns, options["limits"], options["channel_limits"])
+    channels = []
+    for column in columns:
+        channel_dir = outputdir_path
+        if len(columns) > 1 and os.path.isdir(inputdir):
+            channel_dir = "%s_col%d" % (outputdir_path, column)
+        if not os.path.isdir(channel_dir):
+            logger.info("Creating directory %s" % channel_dir)
+            os.makedirs(channel_dir)
+        channels.append((column, channel_dir, limits[column]))
+    tools.filter.ds_filter_channels(inputdir, channels, keep_time=options['keep_time'],
+                                    round_to_int=options["round_to_int"], suffix=filtered_suffix,
+                                    jobs=max(1, options["jobs"]))
+    if options["pack_dataset"] and os.path.isdir(inputdir):
+        for _, channel_dir, _ in channels:
+            container_file = channel_dir + tools.dataset.CONTAINER_EXTENSION
+            logger.info("Packing filtered dataset into '%s'" % container_file)
+            tools.dataset.pack_dataset(channel_dir, container_file, keep_time=options['keep_time'],
+                                       value_format="%d" if options["round_to_int"] else "%.3f")
     logger.info("Finished filter procedures")
     return
 
@@ -112,10 +157,12 @@ if __name__ == "__main__":
 
     # TODO: validate the input inside each module (to avoid unnecessary computation terminating in errors)
     parser = argparse.ArgumentParser(description="Filter all the files in the given directory")
-    parser.add_argument("input_path", metavar="INPUT_PATH", nargs="+", action="store",
+    parser.add_argument("input_path", metavar="INPUT_PATH", nargs=util.input_path_nargs(), action="store",
                         help="Path for a file(s) or directory containing the datasets to be used as input")
+    util.add_input_parser_options(parser)
     util.add_logger_parser_options(parser)
     tools.filter.add_parser_options(parser)
+    tools.dataset.add_parser_options(parser)
     util.add_csv_parser_options(parser)
     args = parser.parse_args()
     options = vars(args)
@@ -125,10 +172,8 @@ if __name__ == "__main__":
 
     options["limits"] = None if not options["limits"] else map(lambda x: abs(x), options["limits"])
 
-    # here we protect the execution for the case of sending multiple files as a string - required by other interfaces
-    iterable_input_path = options['input_path'][0].split(" ") if len(options['input_path']) == 1 else options['input_path']
-
-    for inputs in iterable_input_path:
+    # the inputs of a manifest or glob pattern are listed lazily, so the first ones are processed right away
+    for inputs in util.iter_input_paths(options['input_path'], options['manifest'], options['glob_pattern']):
         inputdir = inputs.strip()
         inputdir = util.remove_slash_from_path(inputdir)
         inputdir = os.path.expanduser(inputdir)  # to handle the case of paths as a string
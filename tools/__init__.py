@@ -25,10 +25,14 @@ filter -- Remove unnecessary data from files
 
 compression -- Compression algorithms deployment 
 
+dataset -- Single file, memory mapped dataset container (.tsds) with an index of its series
+
 distance -- Calculate the distance between two files
 
 entropy -- Application of pyeeg and other tool to data to determine entropy
 
+lyapunov -- Largest Lyapunov exponent (Rosenstein) with a neighbour search linear in memory
+
 multiscale -- construction and calls for multiscale.
 
 partition -- File partition -- partition a file in blocks or cut of a chunk of the file using either minutes or lines.
@@ -37,6 +41,18 @@ pyeeg -- an entropy library made available by Forrest S. Bao, Xin Liu and Christ
         "PyEEG: An Open Source Python Module for EEG/MEG Feature Extraction,"
         Computational Intelligence and Neuroscience, March, 2011
 
+similarity -- Information based similarity between every pair of files of a dataset
+
+spectral_embedding -- SVD entropy and Fisher information from a shared singular spectrum of the embedding matrix
+
+rqa -- Recurrence quantification analysis with bit-packed recurrence matrices
+
+catalog -- Per-dataset catalog of series statistics (points, mean, std, signal loss) computed once
+
+results -- Streaming writer of the interfaces' csv result files, with an optional final sort-merge
+
+results_db -- Optional SQLite store of the results, indexed by run parameters, for incremental runs
+
 separate_blocks -- Using some metric define upper and lower limits and
                 mark block that are above upper limits or below lower limits.
 
@@ -0,0 +1,278 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the block x scale grid: the multiscale compression or
+entropy of every block of every file of a dataset (e.g. the multiscale entropy
+of each 10 minute segment), in a single pass.
+
+It gives the results of cutting the files into blocks (TSAnalyseFileBlocks)
+and running the multiscale analysis on each blocks directory, without writing
+a block or a scale to disk: each file is read once, its blocks are slices of
+its values (see partition.file_blocks) and every scale of a block is built in
+memory at once (see multiscale.coarse_grain).
+
+The multiscale sample entropy of the blocks is computed in batch: for each
+scale, the match counts of the scales of all the blocks of a file are counted
+in one call (see entropy.sampen_match_counts), each block with its own
+tolerance. The other algorithms and variants, and the compressors, are run on
+each (block, scale) in turn.
+
+The results of a file are the rows [BLOCK, SCALE, VALUES...] of each of its
+blocks and scales (a long format table); the values of a (block, scale) are
+those of the multiscale module. As in the multiscale module, the rows of a
+block stop at the first scale too short for the entropy algorithm.
+
+MODULE DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: grid_compression(input_name, section, gap, start, stop, step, compressor, level, decompress,
+                              with_compression_rate, round_digits, mul_order, round_to_int, starting_point,
+                              by_lines, on_result)
+             grid_entropy(input_name, section, gap, start, stop, step, entropy_function, dimension, tolerance,
+                          use_sd_tolerance, round_digits, mul_order, round_to_int, starting_point, by_lines,
+                          mse_variant, on_result, **algorithm_options)
+"""
+
+import numpy
+import logging
+
+try:
+    import partition
+    import multiscale
+    from entropy import sampen_match_counts, sampen_from_counts
+    from block_views import line_values, block_series
+except ImportError:
+    import tools.partition as partition
+    import tools.multiscale as multiscale
+    from tools.entropy import sampen_match_counts, sampen_from_counts
+    from tools.block_views import line_values, block_series
+
+module_logger = logging.getLogger('tsanalyse.block_grid')
+
+
+# ENTRY POINT FUNCTIONS
+def grid_compression(input_name, section, gap, start, stop, step, compressor, level, decompress=False,
+                     with_compression_rate=False, round_digits=None, mul_order=-1, round_to_int=False,
+                     starting_point=0, by_lines=False, on_result=None):
+    """
+    (str, float, float, int, int, int, str, int, bool, bool, int, int, bool, float, bool, function)
+     -> dict of str: list of lists
+
+    Multiscale compression of every block of every file of a dataset.
+
+    :param input_name: string containing the name of the dataset to read
+    :param section: size of each block, in seconds (in lines if by_lines is set)
+    :param gap: distance between the starts of two consecutive blocks (see partition.partition)
+    :param start: starting scale
+    :param stop: ending scale
+    :param step: step between scales
+    :param compressor: compressor to use
+    :param level: level of compression
+    :param decompress: flag to enable the output of the decompression time
+    :param with_compression_rate: flag to enable the calculation of the compression rate
+    :param round_digits: number of decimal digits to use when rounding floats/doubles
+    :param mul_order: multiplication order to apply to the time series (-1 disables it)
+    :param round_to_int: flag to round the scales to integer
+    :param starting_point: start of the first block
+    :param by_lines: flag to measure the blocks in lines instead of time
+    :param on_result: function called with (filename, rows of the file) as soon as every block of a file is done
+    :return dictionary of 'string:list of [block, scale, original, compressed, ...]'
+    """
+    module_logger.info("Computing block x scale compression for %s" % input_name)
+    scales = range(start, stop, step)
+    grid_table = {}
+    for filename, blocks in dataset_blocks(input_name, section, gap, starting_point, by_lines):
+        grid_table[filename] = []
+        for number, series in blocks:
+            for scale, scaled in zip(scales, multiscale.coarse_grain(series, scales, mul_order, round_to_int)):
+                grid_table[filename].append([number, scale] + multiscale.scale_compression(
+                    scaled, compressor, level, decompress, with_compression_rate, round_digits, round_to_int))
+        if on_result is not None and len(grid_table[filename]) > 0:
+            on_result(filename, grid_table[filename])
+    module_logger.info("Finished computing block x scale compression")
+    return grid_table
+
+
+def grid_entropy(input_name, section, gap, start, stop, step, entropy_function, dimension, tolerance,
+                 use_sd_tolerance=True, round_digits=None, mul_order=-1, round_to_int=False, starting_point=0,
+                 by_lines=False, mse_variant="mse", on_result=None, **algorithm_options):
+    """
+    (str, float, float, int, int, int, str, int, float, bool, int, int, bool, float, bool, str, function)
+     -> dict of str: list of lists
+
+    Multiscale entropy of every block of every file of a dataset. The tolerance of a block is
+    taken from its first scale, as the tolerance of a file in multiscale.multiscale_entropy.
+
+    :param input_name: string containing the name of the dataset to read
+    :param section: size of each block, in seconds (in lines if by_lines is set)
+    :param gap: distance between the starts of two consecutive blocks (see partition.partition)
+    :param start: integer containing the starting scale
+    :param stop: integer containing the ending scale
+    :param step: integer containing the step between scales
+    :param entropy_function: string containing the entropy algorithm to use
+    :param dimension: integer containing the matrix dimension
+    :param tolerance: float/double containing the tolerance to use
+    :param use_sd_tolerance: boolean flag to decide whether or not to multiply the tolerance by the standard deviation
+    :param round_digits: integer containing the numbers of digits to round to
+    :param mul_order: multiplication order to apply to the time series (-1 disables it)
+    :param round_to_int: flag to round the scales to integer
+    :param starting_point: start of the first block
+    :param by_lines: flag to measure the blocks in lines instead of time
+    :param mse_variant: string containing the multiscale entropy variant (mse, cmse or rcmse)
+    :param on_result: function called with (filename, rows of the file) as soon as every block of a file is done
+    :param algorithm_options: options specific to the entropy algorithm (see entropy.entropy)
+    :return dictionary of 'string:list of [block, scale, entropy]'
+    """
+    module_logger.info("Computing block x scale entropy for %s" % input_name)
+    scales = range(start, stop, step)
+    grid_table = {}
+    for filename, blocks in dataset_blocks(input_name, section, gap, starting_point, by_lines):
+        scaled_blocks = [multiscale.coarse_grain(series, scales, mul_order, round_to_int) for _, series in blocks]
+        tolerances = [multiscale.tolerance_of_file(series, start, tolerance, use_sd_tolerance, mul_order,
+                                                   round_to_int) for _, series in blocks]
+        if entropy_function == "sampen" and mse_variant == "mse":
+            entropies = batch_sampen(scaled_blocks, dimension, tolerances, round_digits, round_to_int)
+        else:
+            entropies = [[None] * len(scales) for _ in blocks]
+
+        grid_table[filename] = []
+        for position, (number, series) in enumerate(blocks):
+            for column, scale in enumerate(scales):
+                entropy_value = entropies[position][column]
+                if entropy_value is None:
+                    entropy_value = multiscale.scale_entropy(series, scale, scaled_blocks[position][column],
+                                                             entropy_function, dimension, tolerances[position],
+                                                             round_digits, mul_order, round_to_int, mse_variant,
+                                                             algorithm_options, "%s (block %d)" % (filename, number))
+                if entropy_value is None:
+                    break
+                grid_table[filename].append([number, scale, entropy_value])
+        if on_result is not None and len(grid_table[filename]) > 0:
+            on_result(filename, grid_table[filename])
+    module_logger.info("Finished computing block x scale entropy")
+    return grid_table
+
+
+# IMPLEMENTATION
+def dataset_blocks(input_name, section, gap, starting_point=0, by_lines=False):
+    """
+    (str, float, float, float, bool) -> iterator of (str, list of (int, array))
+
+    The number and values of the blocks of each file of a dataset, in the order of the files. The
+    values of a block are a slice of the values of its file, which is read once. Files that cannot
+    be partitioned are logged and left out. A gap of 0 makes the blocks consecutive.
+    """
+    # as in TSAnalyseFileBlocks, the gap is the distance between the starts of two blocks
+    gap = gap or section
+    for filename, file_path in multiscale.dataset_files(input_name):
+        try:
+            lines, bounds = partition.file_blocks(file_path, starting_point, section, gap, False, by_lines)
+        except (ValueError, IndexError) as error:
+            module_logger.critical("%s - file '%s' cannot be partitioned. Skipping file..." % (error, filename))
+            continue
+        values = line_values(lines)
+        blocks = []
+        for block in bounds:
+            # partition writes no file for an empty block
+            if block.start >= block.end:
+                continue
+            try:
+                blocks.append((block.number, block_series(values[block.start:block.end])))
+            except ValueError as error:
+                module_logger.critical("%s (file '%s', block %d). Skipping block..." % (error, filename, block.number))
+        yield filename, blocks
+
+
+def batch_sampen(scaled_blocks, dimension, tolerances, round_digits=None, round_to_int=False):
+    """
+    (list of lists of arrays, int, list of floats, int, bool) -> list of lists
+
+    Sample entropy of every scale of every block, counting the matches of the same scale of all the
+    blocks at once. The (block, scale) whose sample entropy pyeeg does not obtain from the match
+    counts alone (a series too short or a count of 0) are left as None, to be computed on their own.
+    """
+    entropies = [[None] * len(scaled) for scaled in scaled_blocks]
+    num_scales = len(scaled_blocks[0]) if scaled_blocks else 0
+    for column in range(num_scales):
+        series_list = [multiscale.scale_values(scaled[column], round_to_int) for scaled in scaled_blocks]
+        positions = [position for position, series in enumerate(series_list) if len(series) > dimension + 1]
+        if not positions:
+            continue
+        m_counts, m1_counts = sampen_match_counts([series_list[position] for position in positions], dimension,
+                                                  [tolerances[position] for position in positions])
+        for position, m_count, m1_count in zip(positions, m_counts, m1_counts):
+            if m_count > 0 and m1_count > 0:
+                samp_ent = sampen_from_counts(m_count, m1_count)
+                entropies[position][column] = round(samp_ent, round_digits) if round_digits else samp_ent
+    return entropies
+
+
+# AUXILIARY FUNCTIONS
+def grid_suffix(options):
+    """
+    (dict) -> str
+
+    Part of the name of the result files of a block x scale grid, from its block options.
+    """
+    return "blocks_sec_%d_gap_%d" % (options["block_section"], options["block_gap"])
+
+
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry functions in this module
+
+    """
+    parser.add_argument("-bs",
+                        "--block-section",
+                        dest="block_section",
+                        metavar="SECONDS",
+                        action="store",
+                        type=float,
+                        default=None,
+                        help="Cut each file into blocks of SECONDS (lines with -bl) and compute every scale of "
+                             "every block, in a single pass, into one table with a row per file, block and scale.")
+    parser.add_argument("-bg",
+                        "--block-gap",
+                        dest="block_gap",
+                        metavar="SECONDS",
+                        action="store",
+                        type=float,
+                        default=0,
+                        help="Time between the starts of two consecutive blocks (0 for consecutive blocks). "
+                             "default:[%(default)s]")
+    parser.add_argument("-bds",
+                        "--block-deferred-start",
+                        dest="block_start",
+                        metavar="SECONDS",
+                        action="store",
+                        type=float,
+                        default=0,
+                        help="Time between the start of the file and the start of the first block. "
+                             "default:[%(default)s]")
+    parser.add_argument("-bl",
+                        "--block-lines",
+                        dest="block_lines",
+                        action="store_true",
+                        default=False,
+                        help="Measure the blocks in lines instead of time.")
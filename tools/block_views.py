@@ -0,0 +1,226 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the analysis of the blocks of a file from its block
+index (see partition.block_index), without writing the blocks to disk: the file
+is read once (only its end, for a block cut from the end of the file, see
+partition.blocks_lines), the values of each block are a view (slice) of the
+values read and the text the compressors are given is built from the lines the
+block spans (see partition.block_text). The lines partition.file_block_index
+read to find the blocks can be given (file_lines), so the file is not read again.
+
+The results of each block are those the compress, entropy and rqa modules give
+for the block file partition writes for it. As in TSAnalyseFileBlocks, the
+tolerance of a block is tolerance x its standard deviation, unless
+use_sd_tolerance is False. Blocks that cannot be analysed are logged and left
+out.
+
+MODULE DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: blocks_compression(input_name, blocks, compressor, level, decompress, with_compression_rate,
+                                round_digits, on_result, file_lines)
+             blocks_entropy(input_name, blocks, entropy_type, dimension, tolerance, use_sd_tolerance,
+                            round_digits, on_result, file_lines, **algorithm_options)
+             blocks_rqa(input_name, blocks, dimension, tau, tolerance, use_sd_tolerance, min_line, round_digits,
+                        on_result, file_lines)
+"""
+
+import numpy
+import logging
+
+try:
+    import partition
+    import compress
+    import entropy
+    import rqa
+    import utility_functions as util
+except ImportError:
+    import tools.partition as partition
+    import tools.compress as compress
+    import tools.entropy as entropy
+    import tools.rqa as rqa
+    import tools.utility_functions as util
+
+module_logger = logging.getLogger('tsanalyse.block_views')
+
+
+# ENTRY POINT FUNCTIONS
+def blocks_compression(input_name, blocks, compressor, level, decompress=False, with_compression_rate=False,
+                       round_digits=None, on_result=None, file_lines=None):
+    """
+    (str, list of BlockBounds, str, int, bool, bool, int, function, list of str) -> dict of int: CompressionData
+
+    Compress every block of the file input_name.
+
+    :param input_name: string containing the name of the file
+    :param blocks: bounds of the blocks of the file (see partition.block_index)
+    :param compressor: string containing the name of the compressor to use
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to determine whether to output the decompression time or not
+    :param with_compression_rate: boolean flag to determine whether to compute the compression rate or not
+    :param round_digits: integer containing the number of digits to use when rounding floats/doubles
+    :param on_result: function called with (block number, CompressionData) as soon as each block is done
+    :param file_lines: lines of the file the blocks are sliced from (see partition.file_block_index), read if None
+    :return dictionary of 'int:CompressionData'
+    """
+    module_logger.info("Using %s to compress the blocks of file '%s'"
+                       % (compressor, util.remove_project_path_from_file(input_name)))
+    lines = partition.blocks_lines(input_name, blocks) if file_lines is None else file_lines
+    compressed = {}
+    for block in blocks:
+        compression_data = compress.compress_text(partition.block_text(lines, block.start, block.end), compressor,
+                                                  level, decompress, with_compression_rate, round_digits)
+        compressed[block.number] = compression_data
+        if on_result is not None:
+            on_result(block.number, compression_data)
+    return compressed
+
+
+def blocks_entropy(input_name, blocks, entropy_type, dimension, tolerance, use_sd_tolerance=True, round_digits=None,
+                   on_result=None, file_lines=None, **algorithm_options):
+    """
+    (str, list of BlockBounds, str, int, float, bool, int, function, list of str) -> dict of int: EntropyData
+
+    Calculate the desired entropy of every block of the file input_name.
+
+    :param input_name: string containing the name of the file
+    :param blocks: bounds of the blocks of the file (see partition.block_index)
+    :param entropy_type: string containing the entropy algorithm to use
+    :param dimension: integer containing the matrix dimension
+    :param tolerance: float containing the tolerance to use
+    :param use_sd_tolerance: boolean flag to decide whether or not to multiply the tolerance by the standard deviation
+    :param round_digits: integer containing the numbers of digits to round to
+    :param on_result: function called with (block number, EntropyData) as soon as each block is done
+    :param file_lines: lines of the file the blocks are sliced from (see partition.file_block_index), read if None
+    :param algorithm_options: options specific to the entropy algorithm (see entropy.entropy)
+    :return dictionary of 'int:EntropyData'
+    """
+    entropies = {}
+    for number, series in block_views(input_name, blocks, file_lines):
+        try:
+            entropy_data = entropy.entropy_of_series(series, entropy_type, dimension,
+                                                     block_tolerance(series, tolerance, use_sd_tolerance),
+                                                     round_digits, **algorithm_options)
+        except (ValueError, IndexError) as error:
+            module_logger.critical("%s (block %d). Skipping block..." % (error, number))
+            continue
+        entropies[number] = entropy_data
+        if on_result is not None:
+            on_result(number, entropy_data)
+    return entropies
+
+
+def blocks_rqa(input_name, blocks, dimension, tau, tolerance, use_sd_tolerance=True, min_line=2, round_digits=None,
+               on_result=None, file_lines=None):
+    """
+    (str, list of BlockBounds, int, int, float, bool, int, int, function, list of str) -> dict of int: RQAData
+
+    Calculate the RQA measures of every block of the file input_name.
+
+    :param input_name: string containing the name of the file
+    :param blocks: bounds of the blocks of the file (see partition.block_index)
+    :param dimension: integer containing the embedding dimension
+    :param tau: integer containing the embedding lag
+    :param tolerance: float containing the tolerance to use
+    :param use_sd_tolerance: boolean flag to decide whether or not to multiply the tolerance by the standard deviation
+    :param min_line: integer containing the minimum length of diagonal and vertical lines
+    :param round_digits: integer containing the number of digits to round to
+    :param on_result: function called with (block number, RQAData) as soon as each block is done
+    :param file_lines: lines of the file the blocks are sliced from (see partition.file_block_index), read if None
+    :return dictionary of 'int:RQAData'
+    """
+    rqa_dict = {}
+    for number, series in block_views(input_name, blocks, file_lines):
+        try:
+            rqa_data = rqa.rqa_series(series, dimension, tau, block_tolerance(series, tolerance, use_sd_tolerance),
+                                      min_line, round_digits, "Block %d" % number)
+        except ValueError as voe:
+            module_logger.critical("%s. Skipping block..." % voe)
+            continue
+        rqa_dict[number] = rqa_data
+        if on_result is not None:
+            on_result(number, rqa_data)
+    return rqa_dict
+
+
+# IMPLEMENTATION
+def block_views(input_name, blocks, file_lines=None):
+    """
+    (str, list of BlockBounds, list of str) -> list of (int, array)
+
+    The number and values of each block of a file: the values of a block are a slice of the
+    values of the lines of the file (file_lines, or read once if None). Blocks with values that
+    are not numbers are logged and left out.
+    """
+    if file_lines is None:
+        module_logger.info("Reading the blocks of file '%s'" % util.remove_project_path_from_file(input_name))
+        file_lines = partition.blocks_lines(input_name, blocks)
+    values = line_values(file_lines)
+    views = []
+    for block in blocks:
+        try:
+            views.append((block.number, block_series(values[block.start:block.end])))
+        except ValueError as voe:
+            module_logger.critical("%s (file '%s', block %d). Skipping block..."
+                                   % (voe, util.remove_project_path_from_file(input_name), block.number))
+    return views
+
+
+def block_tolerance(series, tolerance, use_sd_tolerance):
+    """
+    (array, float, bool) -> float
+
+    Tolerance of a block: tolerance x its standard deviation, or tolerance itself.
+    """
+    if use_sd_tolerance:
+        return float(numpy.std(series)) * tolerance
+    return tolerance
+
+
+def line_values(lines):
+    """
+    (list of str) -> array
+
+    Values of the last column of the lines of a file (nan where it is not a number).
+    """
+    values = numpy.empty(len(lines))
+    for position, line in enumerate(lines):
+        try:
+            values[position] = float(line.split()[-1])
+        except (ValueError, IndexError):
+            values[position] = numpy.nan
+    return values
+
+
+def block_series(values):
+    """
+    (array) -> array
+
+    The series of a block, as utility_functions.load_series reads the file partition writes for
+    it: its leading lines that are not numbers (headers) are left out and any other raises a
+    ValueError.
+    """
+    numeric = ~numpy.isnan(values)
+    first = int(numpy.argmax(numeric)) if numeric.any() else len(values)
+    if not numeric[first:].all():
+        raise ValueError("Block has non numeric values")
+    return values[first:]
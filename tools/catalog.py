@@ -0,0 +1,187 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the dataset catalog: the basic statistics of every
+series of a dataset (number of points, mean, standard deviation and signal loss
+ratio), computed from a single read of each series and kept alongside the
+dataset, so the tolerances, cost estimates and empty file checks of later runs
+do not read the series again.
+
+The catalog of a directory is the hidden file CATALOG_NAME inside it (hidden
+files are not part of the dataset, see utility_functions.listdir_no_hidden);
+the catalog of a dataset container is the file '<CONTAINER>CATALOG_EXTENSION'
+next to it. Each entry is keyed on the modification time and size of its file
+(of the container, for a series inside one), so only the series that changed
+since the catalog was written are read again. A catalog that cannot be written
+is only logged.
+
+The signal loss ratio is the fraction of the values outside the cutoff limits
+of the filter module (constants.DEFAULT_CUTOFF_LIMITS); it is 0 for filtered
+series.
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: dataset_catalog(input_name, cutoff_limits)
+"""
+
+import os
+import json
+import numpy
+import logging
+import tempfile
+from collections import namedtuple
+
+try:
+    import utility_functions as util
+    import constants
+    import dataset
+except ImportError:
+    import tools.utility_functions as util
+    import tools.constants as constants
+    import tools.dataset as dataset
+
+module_logger = logging.getLogger('tsanalyse.catalog')
+
+CATALOG_NAME = ".tsa_catalog.json"
+CATALOG_EXTENSION = ".catalog.json"
+CATALOG_VERSION = 1
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for dataset_catalog; it contains the
+number of points of a series, its mean, standard deviation and signal loss ratio (mean and
+standard deviation are nan for an empty series)"""
+SeriesStats = namedtuple('SeriesStats', 'points mean std loss_ratio')
+
+
+# ENTRY POINT FUNCTION
+def dataset_catalog(input_name, cutoff_limits=constants.DEFAULT_CUTOFF_LIMITS):
+    """
+    (str, list) -> dict of str: SeriesStats
+
+    Statistics of every series of the dataset (directory or container) named input_name,
+    read from its catalog. The series missing from the catalog, or changed since it was
+    written, are read once and the catalog is updated. Series that cannot be read are
+    logged and left out.
+
+    :param input_name: string containing the name of the dataset
+    :param cutoff_limits: the limits outside which a value counts as signal loss
+    :return dictionary of 'string:SeriesStats'
+    """
+    filelist = util.listdir_no_hidden(input_name)
+    catalog_file = catalog_path(input_name)
+    stored_entries = read_catalog(catalog_file, cutoff_limits)
+
+    entries = {}
+    for filename in filelist:
+        file_path = os.path.join(input_name, filename)
+        signature = file_signature(file_path)
+        entry = stored_entries.get(filename)
+        if entry is None or entry["signature"] != signature:
+            try:
+                stats = series_stats(file_path, cutoff_limits)
+            except ValueError as voe:
+                module_logger.critical("%s. Skipping file..." % voe)
+                continue
+            entry = {"signature": signature, "stats": list(stats)}
+        entries[filename] = entry
+
+    if entries != stored_entries:
+        write_catalog(catalog_file, cutoff_limits, entries)
+    return dict((filename, SeriesStats(*entries[filename]["stats"])) for filename in entries)
+
+
+# IMPLEMENTATION
+def series_stats(filename, cutoff_limits=constants.DEFAULT_CUTOFF_LIMITS):
+    """
+    (str, list) -> SeriesStats
+
+    Statistics of the series in the last column of a file, from a single read of the file.
+    """
+    if util.is_empty_file(filename):
+        return SeriesStats(0, float("nan"), float("nan"), 0.0)
+
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    data = util.load_series(filename, col_index=-1)
+    if len(data) == 0:
+        return SeriesStats(0, float("nan"), float("nan"), 0.0)
+    module_logger.debug("Computing statistics of file '%s'" % util.remove_project_path_from_file(filename))
+    lost = numpy.count_nonzero(numpy.logical_or(data < min(cutoff_limits), data > max(cutoff_limits)))
+    return SeriesStats(len(data), float(numpy.mean(data)), float(numpy.std(data)), float(lost) / len(data))
+
+
+def catalog_path(input_name):
+    """
+    (str) -> str
+
+    Name of the catalog of a directory or dataset container.
+    """
+    if dataset.is_container(input_name):
+        return input_name + CATALOG_EXTENSION
+    return os.path.join(input_name, CATALOG_NAME)
+
+
+def file_signature(file_path):
+    """
+    (str) -> list
+
+    Modification time and size of a file (of its container, for a series inside one).
+    """
+    container_file, name = dataset.split_entry_path(file_path)
+    stat = os.stat(file_path if container_file is None else container_file)
+    return [repr(stat.st_mtime), stat.st_size]
+
+
+def read_catalog(catalog_file, cutoff_limits):
+    """
+    (str, list) -> dict
+
+    Entries of a catalog file; none if it does not exist, cannot be read or was written with
+    other cutoff limits (or by another version of this module).
+    """
+    try:
+        with open(catalog_file, "r") as fdin:
+            contents = json.load(fdin)
+    except (IOError, OSError, ValueError):
+        return {}
+    if contents.get("version") != CATALOG_VERSION or contents.get("cutoff_limits") != list(cutoff_limits):
+        return {}
+    return contents.get("files", {})
+
+
+def write_catalog(catalog_file, cutoff_limits, entries):
+    """
+    (str, list, dict) -> NoneType
+
+    Atomically write a catalog file. A catalog that cannot be written is only logged.
+    """
+    contents = {"version": CATALOG_VERSION, "cutoff_limits": list(cutoff_limits), "files": entries}
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(catalog_file)),
+                                       prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "w") as fdout:
+            # NaN is written as the (non standard) JSON NaN, which json reads back
+            json.dump(contents, fdout, sort_keys=True)
+        os.rename(tmp_name, catalog_file)
+    except (OSError, IOError) as err:
+        module_logger.warning("Unable to write dataset catalog '%s': %s" % (catalog_file, err))
+    else:
+        module_logger.debug("Dataset catalog stored in '%s'" % catalog_file)
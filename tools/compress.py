@@ -38,7 +38,9 @@ MODULE EXTERNAL DEPENDENCIES:
                       the system path if you would like to use them. - performed automatically in Linux
 
 
-ENTRY POINT: compress(input_name, compression_algorithm, level, decompress, with_compression_rate, digits_to_round)
+ENTRY POINT: compress(input_name, compression_algorithm, level, decompress, with_compression_rate, digits_to_round,
+             on_result, skip_files)
+             compress_text(text, compression_algorithm, level, decompress, with_compression_rate, digits_to_round)
 
 """
 
@@ -51,6 +53,7 @@ import time
 import brotli
 import timeit
 import logging
+import tempfile
 import subprocess
 from collections import namedtuple
 from shutil import rmtree
@@ -60,6 +63,11 @@ try:
 except ImportError:
     import tools.utility_functions as util
 
+try:
+    import dataset
+except ImportError:
+    import tools.dataset as dataset
+
 try:
     import lzma
 
@@ -91,7 +99,7 @@ util.setup_environment()
 
 # ENTRY POINT FUNCTION
 def compress(input_name, compression_algorithm, level, decompress=False,
-             with_compression_rate=False, digits_to_round=None):
+             with_compression_rate=False, digits_to_round=None, on_result=None, skip_files=None):
     """
     Given a file or directory named input_name, apply the desired
     compression algorithm to all the files. Optionally a timing on
@@ -106,6 +114,8 @@ def compress(input_name, compression_algorithm, level, decompress=False,
     :param decompress: boolean flag to determine whether to output the decompression time or not
     :param with_compression_rate: boolean flag to determine whether to compute the compression rate or not
     :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :param on_result: function called with (filename, CompressionData) as soon as each file is compressed
+    :param skip_files: names of the files not to compress (e.g. those whose results are already stored)
     :return dictionary of 'string : CompressionData' with:
         the original size, compressed size, compression rate*, decompression time*
 
@@ -117,10 +127,17 @@ def compress(input_name, compression_algorithm, level, decompress=False,
     compressed = {}
     method_to_call = getattr(sys.modules[__name__], compression_algorithm.lower() + '_compress')
 
-    if level > AVAILABLE_COMPRESSORS[compression_algorithm][1]:
-        level = AVAILABLE_COMPRESSORS[compression_algorithm][1]
-    elif level < AVAILABLE_COMPRESSORS[compression_algorithm][0]:
-        level = AVAILABLE_COMPRESSORS[compression_algorithm][0]
+    level = compression_level(compression_algorithm, level)
+
+    if dataset.is_container(input_name):
+        # the compressors read text files, so the series of a container are written back as text
+        unpacked_dir = tempfile.mkdtemp()
+        try:
+            dataset.unpack_dataset(input_name, unpacked_dir)
+            return compress(unpacked_dir, compression_algorithm, level, decompress, with_compression_rate,
+                            digits_to_round, on_result, skip_files)
+        finally:
+            rmtree(unpacked_dir, ignore_errors=True)
 
     if os.path.isdir(input_name):
         module_logger.info("Using %s to compress files in directory '%s'"
@@ -128,22 +145,73 @@ def compress(input_name, compression_algorithm, level, decompress=False,
         filelist = util.listdir_no_hidden(input_name)
         for filename in filelist:
             filename = filename.strip()  # removes the trailing \n
+            if skip_files and filename in skip_files:
+                continue
             compression_data = method_to_call(os.path.join(input_name, filename), level,
                                               decompress, with_compression_rate, digits_to_round)
             compressed[filename] = compression_data
+            if on_result is not None:
+                on_result(filename, compression_data)
     else:
         module_logger.info("Using %s to compress file '%s'"
                            % (compression_algorithm, util.remove_project_path_from_file(input_name)))
         entry_name = os.path.basename(input_name.strip())
+        if skip_files and entry_name in skip_files:
+            return compressed
         compression_data = method_to_call(input_name.strip(), level, decompress, with_compression_rate, digits_to_round)
         compressed[entry_name] = compression_data
+        if on_result is not None:
+            on_result(entry_name, compression_data)
 
     # we will move this log to the interfaces to avoid "spam" when debugging multiscale
     # module_logger.debug("Compression data: {0}".format(compressed))
     return compressed
 
 
+def compress_text(text, compression_algorithm, level, decompress=False, with_compression_rate=False,
+                  digits_to_round=None):
+    """
+    Apply the desired compression algorithm to a text held in memory (e.g. a coarse-grained
+    series of the multiscale module), with the same results compress gives for a file holding
+    that text. The python compressors (gzip, lzma, bzip2, brotli) compress the text directly;
+    the external tools are given a temporary file.
+
+    :param text: string containing the text to compress
+    :param compression_algorithm: string containing the name of the compressor to use
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to determine whether to output the decompression time or not
+    :param with_compression_rate: boolean flag to determine whether to compute the compression rate or not
+    :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :return CompressionData
+    """
+    level = compression_level(compression_algorithm, abs(level))
+    digits_to_round = None if not digits_to_round else abs(digits_to_round)
+
+    text_method = getattr(sys.modules[__name__], compression_algorithm.lower() + '_compress_text', None)
+    if text_method is not None:
+        return text_method(text, level, decompress, with_compression_rate, digits_to_round)
+
+    fd, text_file = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as fdout:
+            fdout.write(text)
+        method_to_call = getattr(sys.modules[__name__], compression_algorithm.lower() + '_compress')
+        return method_to_call(text_file, level, decompress, with_compression_rate, digits_to_round)
+    finally:
+        os.remove(text_file)
+
+
 # IMPLEMENTATION
+def compression_level(compression_algorithm, level):
+    """
+    (str, int) -> int
+
+    The level, set to the compressor's maximum or minimum if it is not valid.
+    """
+    min_level, max_level = AVAILABLE_COMPRESSORS[compression_algorithm]
+    return min(max(level, min_level), max_level)
+
+
 def gzip_compress(inputfile, level, decompress, compute_compression_rate=None, digits_to_round=None):
     """
     Compresses one file using the python implementation of zlib.
@@ -162,10 +230,27 @@ def gzip_compress(inputfile, level, decompress, compute_compression_rate=None, d
     :return  CompressionData
     """
 
-    original_size = int(os.stat(inputfile).st_size)
     with open(inputfile, "rU") as fdorig:
         origlines = fdorig.read()
-    origtext = memoryview(bytearray(origlines, "utf8"))
+    return gzip_compress_text(origlines, level, decompress, compute_compression_rate, digits_to_round,
+                               original_size=int(os.stat(inputfile).st_size))
+
+
+def gzip_compress_text(text, level, decompress, compute_compression_rate=None, digits_to_round=None,
+                      original_size=None):
+    """
+    Compresses a text held in memory using the python implementation of zlib (see gzip_compress).
+
+    :param text: string containing the text to compress
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to obtain the decompression time
+    :param compute_compression_rate: boolean flag to enable computing the compression rate
+    :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :param original_size: integer containing the size reported as the original one (default: length of text)
+    :return  CompressionData
+    """
+    original_size = len(text) if original_size is None else original_size
+    origtext = memoryview(bytearray(text, "utf8"))
     compressedtext = memoryview(zlib.compress(origtext.tobytes(), int(level)))
     compressed_size = len(compressedtext)
     compression_rate = None
@@ -245,10 +330,27 @@ def lzma_compress(input_file, level, decompress, compute_compression_rate=None,
     :return  CompressionData
      """
 
-    original_size = int(os.stat(input_file).st_size)
     with open(input_file, "rU") as fdorig:
         origlines = fdorig.read()
-    origtext = memoryview(bytearray(origlines, "utf8"))
+    return lzma_compress_text(origlines, level, decompress, compute_compression_rate, digits_to_round,
+                               original_size=int(os.stat(input_file).st_size))
+
+
+def lzma_compress_text(text, level, decompress, compute_compression_rate=None, digits_to_round=None,
+                      original_size=None):
+    """
+    Compresses a text held in memory using the python implementation of lzma (see lzma_compress).
+
+    :param text: string containing the text to compress
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to obtain the decompression time
+    :param compute_compression_rate: boolean flag to enable computing the compression rate
+    :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :param original_size: integer containing the size reported as the original one (default: length of text)
+    :return  CompressionData
+    """
+    original_size = len(text) if original_size is None else original_size
+    origtext = memoryview(bytearray(text, "utf8"))
     compressedtext = memoryview(lzma.compress(origtext.tobytes()))
     compressed_size = len(compressedtext)
     compression_rate = None
@@ -276,10 +378,27 @@ def bzip2_compress(input_file, level, decompress, compute_compression_rate=None,
     :return  CompressionData
     """
 
-    original_size = int(os.stat(input_file).st_size)
     with open(input_file, "rU") as fdorig:
         origlines = fdorig.read()
-    origtext = memoryview(bytearray(origlines, "utf8"))
+    return bzip2_compress_text(origlines, level, decompress, compute_compression_rate, digits_to_round,
+                                original_size=int(os.stat(input_file).st_size))
+
+
+def bzip2_compress_text(text, level, decompress, compute_compression_rate=None, digits_to_round=None,
+                       original_size=None):
+    """
+    Compresses a text held in memory using the python implementation of bzip2 (see bzip2_compress).
+
+    :param text: string containing the text to compress
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to obtain the decompression time
+    :param compute_compression_rate: boolean flag to enable computing the compression rate
+    :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :param original_size: integer containing the size reported as the original one (default: length of text)
+    :return  CompressionData
+    """
+    original_size = len(text) if original_size is None else original_size
+    origtext = memoryview(bytearray(text, "utf8"))
     compressedtext = memoryview(bz2.compress(origtext.tobytes(), level))
     compressed_size = len(compressedtext)
     compression_rate = None
@@ -388,10 +507,27 @@ def brotli_compress(input_file, level, decompress, compute_compression_rate=None
     :return  CompressionData
     """
 
-    original_size = int(os.stat(input_file).st_size)
     with open(input_file, "rU") as fdorig:
         origlines = fdorig.read()
-    origtext = memoryview(bytearray(origlines, "utf8"))
+    return brotli_compress_text(origlines, level, decompress, compute_compression_rate, digits_to_round,
+                                 original_size=int(os.stat(input_file).st_size))
+
+
+def brotli_compress_text(text, level, decompress, compute_compression_rate=None, digits_to_round=None,
+                        original_size=None):
+    """
+    Compresses a text held in memory using the brotli algorithm by google (see brotli_compress).
+
+    :param text: string containing the text to compress
+    :param level: integer containing the level of compression to use
+    :param decompress: boolean flag to obtain the decompression time
+    :param compute_compression_rate: boolean flag to enable computing the compression rate
+    :param digits_to_round: integer containing the number of digits to use when rounding floats/doubles
+    :param original_size: integer containing the size reported as the original one (default: length of text)
+    :return  CompressionData
+    """
+    original_size = len(text) if original_size is None else original_size
+    origtext = memoryview(bytearray(text, "utf8"))
     compressedtext = memoryview(brotli.compress(origtext.tobytes(), quality=int(level)))
     compressed_size = len(compressedtext)
     compression_rate = None
@@ -43,6 +43,8 @@ RUN_ISOLATED_FILES_PATH = os.path.join(TSA_HOME, "individual_runs")
 BLOCK_ANALYSIS_OUTPUT_PATH = os.path.join(TSA_HOME, "block_analysis")
 FILE_BLOCKS_STORAGE_PATH = os.path.join(TSA_HOME, "file_blocks")
 STV_ANALYSIS_STORAGE_PATH = os.path.join(TSA_HOME, "stv_analysis")
+# directory of the parsed series cache (.npy sidecars); the cache is disabled when None
+SERIES_CACHE_PATH = os.environ.get("TSA_CACHE_DIR")
 
 DEFAULT_LOG_LEVEL = "INFO"
 DEFAULT_CUTOFF_LIMITS = [50,250]
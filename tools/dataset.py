@@ -0,0 +1,279 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the dataset container: a single file (.tsds) holding
+every series of a dataset back to back, so a dataset of thousands of small
+files can be listed, opened and read at the cost of one file.
+
+Layout of a container:
+
+    MAGIC (8 bytes) | index size (8 bytes, little endian) | index (JSON) |
+    padding up to a multiple of 8 bytes | data
+
+The index holds the dtype of the data, the format used to write the values as
+text and, for every series, its name, offset and length (in elements, relative
+to the start of the data) and whether its timestamps are stored. Timestamps
+are stored right after the series values (same length).
+
+The timestamps are stored as numbers, along with the format ('%d' or
+'%.<DECIMALS>f') that writes each of them back as the text it was read from
+(time_format), so unpacking writes the lines of the series as they were. A
+series whose timestamps have no such format (e.g. a varying number of decimals),
+or a container of an older version, has its timestamps written as the shortest
+text of the same number (repr): the times, and so the blocks partition cuts, are
+the same, but the text (and the compressed size of the file) may differ.
+
+The data is read through a memory map, so every series is a zero-copy slice
+of the container. A series inside a container is addressed by the virtual
+path 'CONTAINER/NAME' (e.g. 'unittest_dataset.tsds/adulterado.txt'), which
+utility_functions.load_series, listdir_no_hidden and is_empty_file accept.
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: pack_dataset(input_name, container_file, keep_time, value_format)
+             unpack_dataset(container_file, dest_dir)
+"""
+
+import os
+import json
+import numpy
+import struct
+import logging
+from collections import OrderedDict
+
+module_logger = logging.getLogger('tsanalyse.dataset')
+
+CONTAINER_EXTENSION = ".tsds"
+CONTAINER_MAGIC = b"TSDS0001"
+CONTAINER_DTYPE = "<f8"
+
+# indexes and memory maps of the containers already opened, keyed by (path, modification time)
+OPEN_CONTAINERS = {}
+
+
+# ENTRY POINT FUNCTIONS
+def pack_dataset(input_name, container_file, keep_time=False, value_format="%.3f"):
+    """
+    (str, str, bool, str) -> NoneType
+
+    Pack the file, or every file of the directory, named input_name into the container
+    container_file. The last column of each file is stored and, if keep_time is set and
+    the file has more than one column, the first column is stored as its timestamps.
+
+    :param input_name: name of the dataset to read
+    :param container_file: name of the container to write
+    :param keep_time: flag to also store the timestamps
+    :param value_format: format used to write the values back as text (see entry_lines)
+    """
+    try:
+        import utility_functions as util
+    except ImportError:
+        import tools.utility_functions as util
+
+    if os.path.isdir(input_name):
+        file_paths = [(filename, os.path.join(input_name, filename))
+                      for filename in sorted(util.listdir_no_hidden(input_name))]
+    else:
+        file_paths = [(os.path.basename(input_name), input_name)]
+
+    entries = []
+    arrays = []
+    offset = 0
+    for filename, file_path in file_paths:
+        try:
+            values = util.load_series(file_path, col_index=-1)
+        except ValueError as voe:
+            module_logger.critical("%s. Skipping file..." % voe)
+            continue
+        timestamps = None
+        entry = {"name": filename, "offset": offset, "length": len(values), "has_timestamps": False}
+        skip_lines, num_columns = util.sniff_series_layout(file_path)
+        if keep_time and num_columns > 1:
+            time_texts = util.parse_series_lines(file_path, skip_lines, col_index=0, dtype=str)
+            timestamps = time_texts.astype(CONTAINER_DTYPE)
+            entry["has_timestamps"] = True
+            entry["time_format"] = text_format(time_texts, timestamps)
+
+        entries.append(entry)
+        arrays.append(values)
+        offset += len(values)
+        if timestamps is not None:
+            arrays.append(timestamps)
+            offset += len(timestamps)
+
+    index = json.dumps({"dtype": CONTAINER_DTYPE, "value_format": value_format, "entries": entries})
+    index = index.encode("utf-8")
+    header_size = len(CONTAINER_MAGIC) + 8 + len(index)
+    padding = (-header_size) % 8
+
+    tmp_file = container_file + ".tmp"
+    with open(tmp_file, "wb") as fdout:
+        fdout.write(CONTAINER_MAGIC)
+        fdout.write(struct.pack("<Q", len(index)))
+        fdout.write(index)
+        fdout.write(b"\0" * padding)
+        for array in arrays:
+            numpy.asarray(array, dtype=CONTAINER_DTYPE).tofile(fdout)
+    os.rename(tmp_file, container_file)
+    module_logger.info("Packed %d series into '%s'" % (len(entries), container_file))
+
+
+def unpack_dataset(container_file, dest_dir):
+    """
+    (str, str) -> NoneType
+
+    Write every series of a container as a text file of dest_dir, the way it was filtered
+    (timestamps, if stored, in the first column).
+    """
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    for name in list_entries(container_file):
+        with open(os.path.join(dest_dir, name), "w") as fdout:
+            fdout.writelines(entry_lines(container_file, name))
+
+
+# IMPLEMENTATION
+def is_container(path):
+    """
+    (str) -> bool
+
+    True if path is a container file.
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as fdin:
+        return fdin.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+def split_entry_path(path):
+    """
+    (str) -> (str, str)
+
+    Split the virtual path of a series into its container and its name; (None, None) if path
+    is not inside a container.
+    """
+    container_file, name = os.path.split(path)
+    if container_file and not os.path.exists(path) and is_container(container_file):
+        return container_file, name
+    return None, None
+
+
+def open_container(container_file):
+    """
+    (str) -> (OrderedDict, numpy.memmap)
+
+    Index (name: entry) and memory mapped data of a container. Both are kept open while the
+    container is unchanged.
+    """
+    key = (os.path.abspath(container_file), os.path.getmtime(container_file))
+    if key not in OPEN_CONTAINERS:
+        with open(container_file, "rb") as fdin:
+            if fdin.read(len(CONTAINER_MAGIC)) != CONTAINER_MAGIC:
+                raise ValueError("File %s is not a dataset container" % container_file)
+            index_size = struct.unpack("<Q", fdin.read(8))[0]
+            index = json.loads(fdin.read(index_size).decode("utf-8"))
+        header_size = len(CONTAINER_MAGIC) + 8 + index_size
+        data_offset = header_size + (-header_size) % 8
+        entries = OrderedDict((entry["name"], entry) for entry in index["entries"])
+        for entry in entries.values():
+            entry["value_format"] = index["value_format"]
+        if os.path.getsize(container_file) > data_offset:
+            data = numpy.memmap(container_file, dtype=index["dtype"], mode="r", offset=data_offset)
+        else:
+            data = numpy.array([], dtype=index["dtype"])
+        OPEN_CONTAINERS[key] = (entries, data)
+    return OPEN_CONTAINERS[key]
+
+
+def list_entries(container_file):
+    """
+    (str) -> list of str
+
+    Names of the series of a container, in the order they are stored.
+    """
+    return list(open_container(container_file)[0].keys())
+
+
+def read_entry(container_file, name, timestamps=False):
+    """
+    (str, str, bool) -> numpy.ndarray
+
+    Zero-copy (memory mapped, read only) values of the series name, or its timestamps.
+    """
+    entries, data = open_container(container_file)
+    try:
+        entry = entries[name]
+    except KeyError:
+        raise ValueError("Series %s does not exist in %s" % (name, container_file))
+    start = entry["offset"]
+    if timestamps:
+        if not entry["has_timestamps"]:
+            raise ValueError("Series %s of %s has no timestamps" % (name, container_file))
+        start += entry["length"]
+    return data[start:start + entry["length"]]
+
+
+def entry_lines(container_file, name):
+    """
+    (str, str) -> list of str
+
+    Text lines of the series name, formatted as TSFilter writes them.
+    """
+    entry = open_container(container_file)[0][name]
+    values = read_entry(container_file, name)
+    if entry["has_timestamps"]:
+        time_format = entry.get("time_format")
+        times = read_entry(container_file, name, timestamps=True)
+        time_texts = numpy.char.mod(time_format, times) if time_format else map(repr, times.tolist())
+        return ["%s %s\n" % (time, entry["value_format"] % value) for time, value in zip(time_texts, values)]
+    line_format = entry["value_format"] + "\n"
+    return [line_format % value for value in values]
+
+
+# AUXILIARY FUNCTIONS
+def text_format(texts, values):
+    """
+    (numpy.ndarray, numpy.ndarray) -> str
+
+    The format ('%d' or '%.<DECIMALS>f', from the first text) that writes each of the values
+    back as the text it was read from, None if there is no such format.
+    """
+    if not len(texts):
+        return None
+    point, decimals = texts[0].partition(".")[1:]
+    value_format = "%%.%df" % len(decimals) if point else "%d"
+    if (numpy.char.mod(value_format, values) == texts).all():
+        return value_format
+    return None
+
+
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument('-pack', '--pack-dataset', dest="pack_dataset", action="store_true", default=False,
+                        help="Also pack the filtered files into a single dataset container (" +
+                             CONTAINER_EXTENSION + ") that every interface accepts as INPUT_PATH.")
@@ -25,12 +25,18 @@ after some testing these seem to be the only ones that have significant results
 for our specific purposes. Some of the functions are calls to the pyeeg 
 implementation.
 
+The corrected conditional entropy (cce) of Porta et al. is also available. For
+this algorithm the dimension is the maximum pattern length (Lmax) and the
+tolerance is not used; the series is quantized into CCE_LEVELS levels.
+
 
 MODULE EXTERNAL DEPENDENCIES:
 pyeeg(http://code.google.com/p/pyeeg/downloads/list),
 numpy(http://numpy.scipy.org/),
 
 ENTRY POINT: entropy(input_name,function,dimension,tolerances)
+             entropy_of_series(series,function,dimension,tolerance)
+             composite_entropy_of_series(series_list,function,dimension,tolerance,refined)
              calculate_std(input_name)
 """
 
@@ -47,10 +53,18 @@ except ImportError:
 
 try:
     import utility_functions as util
+    from catalog import dataset_catalog
 except Exception:
     import tools.utility_functions as util
+    from tools.catalog import dataset_catalog
+
+AVAILABLE_ALGORITHMS = ["sampen", "apen", "apenv2", "cce"]
+
+# default number of quantization levels (xi) used by cce
+CCE_LEVELS = 6
 
-AVAILABLE_ALGORITHMS = ["sampen", "apen", "apenv2"]
+# number of template pairs compared at once by sampen_match_counts
+MATCH_TILE_PAIRS = 2 ** 22
 
 module_logger = logging.getLogger('tsanalyse.entropy')
 
@@ -61,7 +75,8 @@ EntropyData = namedtuple('EntropyData', 'points entropy')
 
 
 # ENTRY POINT FUNCTION
-def entropy(input_name, entropy_type, dimension, tolerances, round_digits=None):
+def entropy(input_name, entropy_type, dimension, tolerances, round_digits=None, on_result=None, skip_files=None,
+            **algorithm_options):
     """
     (str, str, int, float) -> EntropyData
     
@@ -71,17 +86,22 @@ def entropy(input_name, entropy_type, dimension, tolerances, round_digits=None):
     NOTE: This functions last two parameters are specific for the entropy 
     calculating algorithms we are using (both apen and sampen use the dimension
     and tolerance parameters.
+    Any algorithm specific option (e.g. the levels of cce) is passed along in algorithm_options.
+    If on_result is set it is called with (filename, EntropyData) as soon as each file is done.
+    The files named in skip_files (e.g. those whose results are already stored) are not computed.
     """
 
     method_to_call = getattr(sys.modules[__name__], entropy_type)
     entropy_dict = {}
 
-    if os.path.isdir(input_name):
+    if util.is_dataset_dir(input_name):
         filelist = util.listdir_no_hidden(input_name)
         for filename in filelist:
+            if skip_files and filename.strip() in skip_files:
+                continue
             try:
                 entropy_data = method_to_call(os.path.join(input_name, filename.strip()), dimension,
-                                              tolerances[filename], round_digits)
+                                              tolerances[filename], round_digits, **algorithm_options)
             except KeyError as ke:
                 module_logger.error("Key %s does not exist in tolerances' list. Skipping file..." % ke)
             except ValueError as voe:
@@ -90,45 +110,108 @@ def entropy(input_name, entropy_type, dimension, tolerances, round_digits=None):
                 module_logger.critical("%s - The file does not conform to the requisites: one column with the hrf vales. Skipping ..." % ixe)
             else:
                 entropy_dict[filename.strip()] = entropy_data
+                if on_result is not None:
+                    on_result(filename.strip(), entropy_data)
     else:
         filename = os.path.basename(input_name)
+        if skip_files and filename in skip_files:
+            return entropy_dict
         try:
             tolerances = tolerances[list(tolerances.keys())[0]]
         except IndexError as ixe:
             module_logger.error("%s on Tolerance's list." % ixe)
         else:
             try:
-                entropy_data = method_to_call(input_name.strip(), dimension, tolerances, round_digits)
+                entropy_data = method_to_call(input_name.strip(), dimension, tolerances, round_digits,
+                                              **algorithm_options)
             except ValueError as voe:
                 module_logger.critical("%s. Skipping file..." % voe)
             except IndexError as ixe:
                 module_logger.critical("%s. Skipping file..." % ixe)
             else:
                 entropy_dict[filename] = entropy_data
+                if on_result is not None:
+                    on_result(filename, entropy_data)
     # we will move this log to the interfaces to avoid "spam" when debugging multiscale
     # module_logger.debug("Entropy dictionary: {0}".format(entropy_dict))
     return entropy_dict
 
 
+def entropy_of_series(series, entropy_type, dimension, tolerance, round_digits=None, **algorithm_options):
+    """
+    (array, str, int, float, int) -> EntropyData
+
+    Calculate the desired entropy of a series held in memory (e.g. a coarse-grained series of
+    the multiscale module), with the same results entropy gives for a file holding the series.
+    An empty series raises a ValueError.
+    """
+    if len(series) == 0:
+        raise ValueError("Series is empty")
+    method_to_call = getattr(sys.modules[__name__], entropy_type + "_series")
+    return method_to_call(series, dimension, tolerance, round_digits, **algorithm_options)
+
+
+def composite_entropy_of_series(series_list, entropy_type, dimension, tolerance, round_digits=None, refined=False,
+                                **algorithm_options):
+    """
+    (list of arrays, str, int, float, int, bool) -> EntropyData
+
+    Composite entropy of the series of series_list (the coarse-grained series of every offset
+    of a scale, see multiscale.offset_scales): the mean of the entropy of each series or, if
+    refined is set, the refined composite sample entropy.
+
+    The sample entropy of every series is computed from the match counts of sampen_match_counts,
+    in a single call for all of them. The refined composite sample entropy adds up the counts of
+    every series before taking the logarithm, so it is defined as long as any of the series has
+    matches of length dimension + 1. Undefined sample entropies are nan.
+
+    BIBLIOGRAPHICAL REFERENCE:
+    Wu SD, Wu CW, Lin SG, Lee KY, Peng CK: Analysis of complex time series using refined
+    composite multiscale entropy. Physics Letters A 2014, 378: 1369-1374
+    """
+    if refined and entropy_type != "sampen":
+        raise ValueError("Refined composite entropy is only defined for sampen")
+    series_list = [numpy.asarray(series, dtype=numpy.float64) for series in series_list]
+    if sum(len(series) for series in series_list) == 0:
+        raise ValueError("Series is empty")
+
+    if entropy_type == "sampen":
+        m_counts, m1_counts = sampen_match_counts(series_list, dimension, tolerance)
+        if refined:
+            comp_ent = sampen_from_counts(m_counts.sum(), m1_counts.sum())
+        else:
+            comp_ent = numpy.mean([sampen_from_counts(m, m1) for m, m1 in zip(m_counts, m1_counts)])
+    else:
+        comp_ent = numpy.mean([entropy_of_series(series, entropy_type, dimension, tolerance,
+                                                 **algorithm_options).entropy for series in series_list])
+    module_logger.debug("entropy: %s" % comp_ent)
+
+    if round_digits:
+        comp_ent = round(comp_ent, round_digits)
+    return EntropyData(sum(len(series) for series in series_list), comp_ent)
+
+
 def calculate_std(input_name):
     """
     (str) -> dict of str : float
 
     Function to calculate the standard deviation for the values in a file/directory.
     Returns a dictionary that associate filenames to their respective std.
+
+    The standard deviations of a directory (or dataset container) are read from its
+    catalog (see the catalog module), so its files are only read when they change.
     
     """
     files_std = {}
-    if os.path.isdir(input_name):
-        filelist = util.listdir_no_hidden(input_name)
-        for filename in filelist:
-            # debug
-            # print("calculate_file_st input: %s" % os.path.join(input_name, filename))
-            try:
-                files_std[filename] = calculate_file_std(os.path.join(input_name, filename))
-            except ValueError as voe:
-                module_logger.error("%s" % voe)
+    if util.is_dataset_dir(input_name):
+        files_stats = dataset_catalog(input_name)
+        for filename in files_stats:
+            if files_stats[filename].points == 0:
+                module_logger.error("File '%s' is empty. Unable to compute standard deviation."
+                                    % os.path.join(input_name, filename))
                 module_logger.warning("Skipping file %s..." % filename)
+            else:
+                files_std[filename] = files_stats[filename].std
     else:
         try:
             files_std[input_name] = calculate_file_std(input_name)
@@ -155,10 +238,8 @@ def calculate_file_std(filename):
     #     file_data = fdin.readlines()
     # file_data = list(map(float, file_data))
 
-    # -1 to read the last available column
-    file_data = util.readlines_with_col_index(filename, col_index=-1, as_type=float)
-    # lets force a type cast to float so the error can be caught outside
-    file_data = map(float, file_data)
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
     # print(file_data)
 
     module_logger.info("Computing std for file '%s'" % util.remove_project_path_from_file(filename))
@@ -181,13 +262,20 @@ def sampen(filename, dimension, tolerance, round_digits=None):
     # file_data = numpy.array(map(float, file_data))  # so file_data has attribute 'size' (due to pyeeg samp_entropy impl.)
     #
 
-    # -1 to read the last available column
-    file_data = util.readlines_with_col_index(filename, col_index=-1, as_type=float)
-    # lets force a type cast to float so the error can be caught outside
-    file_data = numpy.array(map(float, file_data))
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
 
     module_logger.info("Computing sample entropy for file '%s'" % util.remove_project_path_from_file(filename))
+    return sampen_series(file_data, dimension, tolerance, round_digits)
 
+
+def sampen_series(series, dimension, tolerance, round_digits=None):
+    """
+    (array, int, float, int) -> EntropyData
+
+    Sample entropy of a series held in memory (see sampen).
+    """
+    file_data = numpy.asarray(series, dtype=numpy.float64)
     try:
         samp_ent = samp_entropy(file_data, dimension, tolerance)
     except MemoryError:
@@ -203,6 +291,70 @@ def sampen(filename, dimension, tolerance, round_digits=None):
     return EntropyData(len(file_data), samp_ent)
 
 
+def sampen_match_counts(series_list, dimension, tolerance, tile_pairs=MATCH_TILE_PAIRS):
+    """
+    (list of arrays, int, float or list of floats, int) -> (array, array)
+
+    Number of matching (ordered) pairs of templates of length dimension and dimension + 1 of
+    every series of series_list, counted as pyeeg's samp_entropy counts them: the N - m + 1
+    templates of length m and the first N - m of length m + 1 of a series of N points, two
+    templates matching if no pair of their points is further apart than tolerance (a template
+    is not matched with itself). The sample entropy of a series is log(m matches / m + 1 matches).
+    tolerance is either used for every series or a list with the tolerance of each series.
+
+    ALGORITHM: The series are stacked in a single array (the shorter ones padded with nan, which
+    never match) and the template pairs of all of them are compared at once, tile_pairs at a time,
+    so no series needs its own pass or its N x N distance matrix.
+    """
+    length = max(len(series) for series in series_list)
+    batch = numpy.full((len(series_list), length), numpy.nan)
+    for position, series in enumerate(series_list):
+        batch[position, :len(series)] = series
+
+    m_counts = numpy.zeros(len(series_list), dtype=numpy.int64)
+    m1_counts = numpy.zeros(len(series_list), dtype=numpy.int64)
+    num_templates = length - dimension + 1
+    if num_templates < 1:
+        return m_counts, m1_counts
+
+    embedded = numpy.lib.stride_tricks.as_strided(
+        batch, shape=(batch.shape[0], num_templates, dimension),
+        strides=(batch.strides[0], batch.itemsize, batch.itemsize))
+    next_points = batch[:, dimension:]
+    tolerance = numpy.broadcast_to(numpy.asarray(tolerance, dtype=numpy.float64), (len(series_list),))[:, None, None]
+    tile_rows = max(1, tile_pairs // (len(series_list) * num_templates))
+    with numpy.errstate(invalid='ignore'):
+        for tile_start in range(0, num_templates, tile_rows):
+            tile_end = min(tile_start + tile_rows, num_templates)
+            matches = numpy.ones((batch.shape[0], tile_end - tile_start, num_templates), dtype=bool)
+            for k in range(dimension):
+                matches &= numpy.abs(embedded[:, tile_start:tile_end, k][:, :, None] -
+                                     embedded[:, None, :, k]) <= tolerance
+            rows = numpy.arange(tile_start, tile_end)
+            matches[:, rows - tile_start, rows] = False
+            m_counts += matches.sum(axis=(1, 2))
+
+            # the templates of length m + 1 are the first N - m templates, extended by their next point
+            extended_end = min(tile_end, num_templates - 1)
+            if extended_end > tile_start:
+                extended = numpy.abs(next_points[:, tile_start:extended_end][:, :, None] -
+                                     next_points[:, None, :]) <= tolerance
+                extended &= matches[:, :extended_end - tile_start, :num_templates - 1]
+                m1_counts += extended.sum(axis=(1, 2))
+    return m_counts, m1_counts
+
+
+def sampen_from_counts(m_count, m1_count):
+    """
+    (int, int) -> float
+
+    Sample entropy from the match counts of sampen_match_counts (nan if either count is 0).
+    """
+    if m_count == 0 or m1_count == 0:
+        return numpy.nan
+    return numpy.log(float(m_count) / m1_count)
+
+
 # TODO: later evaluate this method for computational performance vs the one we have
 def sampenv2(U, m, r):
     # wikipedia implementation
@@ -237,12 +389,20 @@ def apen(filename, dimension, tolerance, round_digits=None):
     # # file_data = list(map(float, file_data))
     # file_data = numpy.array(map(float, file_data))  # so file_data has attribute 'size' (due to pyeeg samp_entropy impl.)
 
-    # -1 to read the last available column
-    file_data = util.readlines_with_col_index(filename, col_index=-1, as_type=float)
-    # lets force a type cast to float so the error can be caught outside
-    file_data = numpy.array(map(float, file_data))
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
 
     module_logger.info("Computing approximate entropy for file '%s'" % util.remove_project_path_from_file(filename))
+    return apen_series(file_data, dimension, tolerance, round_digits)
+
+
+def apen_series(series, dimension, tolerance, round_digits=None):
+    """
+    (array, int, float, int) -> EntropyData
+
+    Approximate entropy of a series held in memory (see apen).
+    """
+    file_data = numpy.asarray(series, dtype=numpy.float64)
     try:
         ap_ent = ap_entropy(file_data, dimension, tolerance)
     except MemoryError:
@@ -317,12 +477,19 @@ def apenv2(filename, dimension, tolerance, round_digits=None):
     if util.is_empty_file(filename):
         raise ValueError("File {0} is empty".format(filename))
 
-    # -1 to read the last available column
-    file_data = util.readlines_with_col_index(filename, col_index=-1, as_type=float)
-    # lets force a type cast to float so the error can be caught outside
-    file_data = list(map(float, file_data))
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
     module_logger.info("Computing approximate entropy (V2) for file '%s'" % util.remove_project_path_from_file(filename))
+    return apenv2_series(file_data, dimension, tolerance, round_digits)
+
 
+def apenv2_series(series, dimension, tolerance, round_digits=None):
+    """
+    (array, int, float, int) -> EntropyData
+
+    Approximate entropy (V2) of a series held in memory (see apenv2).
+    """
+    file_data = numpy.asarray(series, dtype=numpy.float64).tolist()
     data_len = len(file_data)
 
     try:
@@ -375,6 +542,106 @@ def apenv2(filename, dimension, tolerance, round_digits=None):
     return EntropyData(len(file_data), ap_en)
 
 
+def cce(filename, dimension, tolerance=None, round_digits=None, levels=CCE_LEVELS):
+    """
+    (str, int, float, int, int) -> EntropyData
+
+    Given a filename, calculate the corrected conditional entropy, using patterns
+    up to length dimension (Lmax). The tolerance is not used by this algorithm.
+
+    BIBLIOGRAPHICAL REFERENCE:
+    Porta A, Baselli G, Liberati D, Montano N, Cogliati C, Gnecchi-Ruscone T,
+    Malliani A, Cerutti S: Measuring regularity by means of a corrected
+    conditional entropy in sympathetic outflow. Biol Cybern 1998, 78: 71-78
+    """
+    if util.is_empty_file(filename):
+        raise ValueError("File %s is empty" % filename)
+
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
+
+    module_logger.info("Computing corrected conditional entropy for file '%s'"
+                       % util.remove_project_path_from_file(filename))
+    if len(file_data) < dimension:
+        raise ValueError("File %s has less points than the maximum pattern length" % filename)
+    return cce_series(file_data, dimension, tolerance, round_digits, levels)
+
+
+def cce_series(series, dimension, tolerance=None, round_digits=None, levels=CCE_LEVELS):
+    """
+    (array, int, float, int, int) -> EntropyData
+
+    Corrected conditional entropy of a series held in memory (see cce).
+    """
+    file_data = numpy.asarray(series, dtype=numpy.float64)
+    if len(file_data) < dimension:
+        raise ValueError("Series has less points than the maximum pattern length")
+
+    cond_ent = corrected_conditional_entropy(file_data, dimension, levels)
+    module_logger.debug("entropy: %s" % cond_ent)
+
+    if round_digits:
+        cond_ent = round(cond_ent, round_digits)
+
+    return EntropyData(len(file_data), cond_ent)
+
+
+def corrected_conditional_entropy(x, max_length, levels=CCE_LEVELS):
+    """
+    (array, int, int) -> float
+
+    Corrected conditional entropy of the series x: the minimum over L = 1..max_length of
+
+        CCE(L) = SE(L) - SE(L - 1) + perc(L) * SE(1)
+
+    where SE(L) is the Shannon entropy of the patterns of length L and perc(L) the
+    fraction of those patterns that occur only once.
+
+    ALGORITHM: x is quantized into levels uniform bins. The code of each pattern of
+    length L is obtained from the code of the pattern of length L - 1 starting at the
+    same point, code_L = code_(L-1) * levels + symbol, and the patterns are counted with
+    numpy.bincount. The counted codes are then relabeled densely (0 .. distinct - 1), so
+    the codes never exceed len(x) * levels and every length costs O(N).
+    """
+    symbols = quantize(x, levels)
+    num_points = len(symbols)
+    codes = symbols
+    shannon_previous = 0.0
+    shannon_first = None
+    corrected = []
+    for length in range(1, max_length + 1):
+        if length > 1:
+            codes = codes[:num_points - length + 1] * levels + symbols[length - 1:]
+        counts = numpy.bincount(codes)
+        present = counts > 0
+        counts = counts[present]
+        # dense relabeling so the next codes stay small
+        codes = (numpy.cumsum(present) - 1)[codes]
+
+        probabilities = counts / float(len(codes))
+        shannon = -numpy.sum(probabilities * numpy.log(probabilities))
+        if shannon_first is None:
+            shannon_first = shannon
+        unique_fraction = numpy.count_nonzero(counts == 1) / float(len(codes))
+        corrected.append(shannon - shannon_previous + unique_fraction * shannon_first)
+        shannon_previous = shannon
+    return min(corrected)
+
+
+def quantize(x, levels):
+    """
+    (array, int) -> array of int
+
+    Map the values of x into levels uniform bins between its minimum and maximum (0 .. levels - 1).
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    amplitude = x.max() - x.min()
+    if amplitude == 0:
+        return numpy.zeros(len(x), dtype=numpy.int64)
+    symbols = numpy.floor((x - x.min()) / amplitude * levels).astype(numpy.int64)
+    return numpy.minimum(symbols, levels - 1)
+
+
 # def fast_apen(filename,args):
 #    """Try the implementation described in this article 
 #    http://www.sciencedirect.com/science/article/pii/S0169260710002956"""
@@ -395,6 +662,18 @@ def is_entropy_table_empty(entropy_table):
     return all(map(lambda x: len(entropy_table[x]) < 1, entropy_table))
 
 
+def algorithm_options(algorithm, options):
+    """
+    (str, dict) -> dict
+
+    The options of the parsed arguments that are specific to the given algorithm,
+    to be passed along to entropy.
+    """
+    if algorithm == "cce":
+        return {"levels": options["levels"]}
+    return {}
+
+
 def add_parser_options(parser):
     """
     (argparse.ArgumentParser) -> NoneType
@@ -418,4 +697,6 @@ def add_parser_options(parser):
                              " when calculating sample entropy.",
                         default=None)
     parser.add_argument('-d', '--dimension', dest="dimension", type=int, action="store", metavar="DIMENSION",
-                        help="Matrix Dimension. [default:%(default)s]", default=2)
+                        help="Matrix Dimension (maximum pattern length for cce). [default:%(default)s]", default=2)
+    parser.add_argument('-xi', '--levels', dest="levels", type=int, action="store", metavar="LEVELS",
+                        help="Number of quantization levels used by cce. [default:%(default)s]", default=CCE_LEVELS)
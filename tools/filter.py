@@ -35,12 +35,30 @@ Optionally a limit may be applied to eliminate signal loss, we consider the
 signal to be lost if hrf is below 50 or above 250. If a particular line is
 considered as signal lost it is omitted from the resulting file.
 
-ENTRY POINT: clean(input_name,dest_dir, keep_time=False, cutoff_limits=[50,250])
+Files are read CHUNK_LINES lines at a time into numpy arrays (pandas C parser)
+and the rescale, rounding and cutoff are applied to the whole chunk. Files that
+do not have a regular layout (ragged lines, non numeric values after the header)
+are filtered line by line. The files of a directory may be filtered by several
+processes (jobs). Several channels (columns) of a file may be filtered from a
+single read, each into its own output with its own cutoff limits
+(ds_filter_channels). Inputs compressed with gzip, bzip2 or xz are decompressed while
+they are read (see utility_functions.open_text).
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/),
+pandas(http://pandas.pydata.org/)
+
+ENTRY POINT: ds_filter(input_name, dest_dir, keep_time=False, cutoff_limits=[50,250], round_to_int, hrf_col, suffix,
+                       jobs)
+             ds_filter_channels(input_name, channels, keep_time, round_to_int, suffix, jobs)
 """
 
 import os
+import numpy
+import pandas
 import shutil
 import logging
+import multiprocessing
 import utility_functions as util
 import constants
 
@@ -48,10 +66,13 @@ module_logger = logging.getLogger('tsanalyse.filter')
 
 CUTOFF_LIMITS = constants.DEFAULT_CUTOFF_LIMITS
 
+# number of lines parsed and filtered at once
+CHUNK_LINES = 100000
+
 
 # ENTRY POINT FUNCTIONS
 def ds_filter(input_name, dest_dir, keep_time=False, cutoff_limits=CUTOFF_LIMITS,
-              round_to_int=False, hrf_col=1, suffix=None):
+              round_to_int=False, hrf_col=1, suffix=None, jobs=1):
     """
     (str,str,bool,bool,bool) -> Nonetype
 
@@ -67,41 +88,236 @@ def ds_filter(input_name, dest_dir, keep_time=False, cutoff_limits=CUTOFF_LIMITS
     :param hrf_col: column to parse the hrf values
     :param suffix: suffix to add to the destination file name. Used when user specifies the output location but
                     runs individual files.
+    :param jobs: number of processes used to filter the files of a directory
+
+    """
+    ds_filter_channels(input_name, [(hrf_col, dest_dir, cutoff_limits)], keep_time=keep_time,
+                       round_to_int=round_to_int, suffix=suffix, jobs=jobs)
+
+
+def ds_filter_channels(input_name, channels, keep_time=False, round_to_int=False, suffix=None, jobs=1):
+    """
+    (str, list of (int, str, list), bool, bool, str, int) -> Nonetype
+
+    Cleans several channels (columns) of the file or every file from a directory named input_name,
+    reading and parsing each file only once. channels holds, for each channel, its column, its
+    output directory and its cutoff limits.
+
+    :param input_name: name of the dataset to read
+    :param channels: list of (hrf_col, dest_dir, cutoff_limits), one per channel
+    :param keep_time: flag to keep the time column of the original dataset
+    :param round_to_int: flag to round the time series to integer
+    :param suffix: suffix to add to the destination file name. Used when user specifies the output location but
+                    runs individual files. With more than one channel, '_col<COLUMN>' is also added.
+    :param jobs: number of processes used to filter the files of a directory
 
     """
     module_logger.debug("The input name received: %s" % input_name)
     module_logger.debug("Suffix: %s" % suffix)
     if os.path.isdir(input_name):
-        filelist = util.listdir_no_hidden(input_name)
-        for filename in filelist:
-            clean_file(os.path.join(input_name, filename.strip()),
-                       os.path.join(dest_dir, filename.strip()),
-                       keep_time, cutoff_limits, round_to_int=round_to_int, hrf_col=hrf_col)
+        # compressed inputs are written uncompressed, without the compression extension
+        # the jobs are generated while the directory is read, so the first files are filtered right away
+        file_jobs = ((os.path.join(input_name, filename.strip()),
+                      [(hrf_col, os.path.join(dest_dir, util.remove_compression_extension(filename.strip())),
+                        cutoff_limits) for hrf_col, dest_dir, cutoff_limits in channels],
+                      keep_time, round_to_int) for filename in util.iter_dir_no_hidden(input_name))
+        if jobs > 1:
+            module_logger.info("Filtering files with %d processes" % jobs)
+            pool = multiprocessing.Pool(jobs)
+            try:
+                for _ in pool.imap_unordered(clean_file_job, file_jobs):
+                    pass
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for file_job in file_jobs:
+                clean_file_job(file_job)
     else:
-        filename = os.path.basename(input_name)
-        dest_file = filename
-        module_logger.debug("dest filename: %s" % dest_file)
-        if suffix:
-            # we de-construct and re-construct the filename with the suffix (filtered / filtered_wtime)
-            dest_file_list = filename.split(".")
-            dest_file_list.insert(1, suffix)
-            module_logger.debug("destination file list: %s" % dest_file_list)
-            dest_file = "%s.%s" % ("".join(dest_file_list[:-1]), dest_file_list[-1])
-            module_logger.debug("destination file after split and insert: %s" % dest_file)
-            print(dest_file)
-        dest_filename = os.path.join(dest_dir, dest_file)
-        clean_file(input_name, dest_filename,
-                   keep_time, cutoff_limits, round_to_int=round_to_int, hrf_col=hrf_col)
+        filename = util.remove_compression_extension(os.path.basename(input_name))
+        dest_channels = []
+        for hrf_col, dest_dir, cutoff_limits in channels:
+            channel_suffix = suffix
+            if len(channels) > 1:
+                channel_suffix = "%s_col%d" % (suffix or "", hrf_col)
+            dest_file = filename
+            if channel_suffix:
+                # we de-construct and re-construct the filename with the suffix (filtered / filtered_wtime)
+                dest_file_list = filename.split(".")
+                dest_file_list.insert(1, channel_suffix)
+                module_logger.debug("destination file list: %s" % dest_file_list)
+                dest_file = "%s.%s" % ("".join(dest_file_list[:-1]), dest_file_list[-1])
+                module_logger.debug("destination file after split and insert: %s" % dest_file)
+                print(dest_file)
+            module_logger.debug("dest filename: %s" % dest_file)
+            dest_channels.append((hrf_col, os.path.join(dest_dir, dest_file), cutoff_limits))
+        clean_file_channels(input_name, dest_channels, keep_time, round_to_int=round_to_int)
 
 
 # IMPLEMENTATION
-def clean_file(input_file, dest_file, keep_time, cutoff_limits, round_to_int=False, hrf_col=1):
+def clean_file_job(file_job):
+    """
+    (tuple) -> NoneType
+
+    clean_file_channels with its arguments packed in a tuple (input_file, channels, keep_time,
+    round_to_int), to be mapped by a process pool.
+    """
+    clean_file_channels(*file_job)
+
+
+def clean_file(input_file, dest_file, keep_time, cutoff_limits, round_to_int=False, hrf_col=1,
+               chunk_lines=CHUNK_LINES):
     """
 
     (str, str, bool, bool) -> NoneType
 
     Clean operation of a single file.
 
+    :param input_file: file to read
+    :param dest_file: output file
+    :param keep_time: flag to keep the time column of the original dataset
+    :param cutoff_limits: the cutoff limits to apply to the hrf
+    :param round_to_int: flag to round the time series to integer
+    :param hrf_col: column to parse the hrf values
+    :param chunk_lines: number of lines filtered at once
+
+    """
+    clean_file_channels(input_file, [(hrf_col, dest_file, cutoff_limits)], keep_time, round_to_int, chunk_lines)
+
+
+def clean_file_channels(input_file, channels, keep_time, round_to_int=False, chunk_lines=CHUNK_LINES):
+    """
+
+    (str, list of (int, str, list), bool, bool, int) -> NoneType
+
+    Clean operation of several channels of a single file, each written to its own output file.
+
+    The leading lines whose first column is not a number are taken as the header and skipped,
+    the remaining lines are read chunk_lines at a time (every channel column in the same read)
+    and each channel is filtered by filter_chunk. If the file does not have the same number of
+    numeric columns in every line each channel is filtered by clean_file_by_line instead.
+
+    :param input_file: file to read
+    :param channels: list of (hrf_col, dest_file, cutoff_limits), one per channel
+    :param keep_time: flag to keep the time column of the original dataset
+    :param round_to_int: flag to round the time series to integer
+    :param chunk_lines: number of lines filtered at once
+
+    """
+    try:
+        file_size = os.path.getsize(input_file)
+    except OSError as error:
+        module_logger.critical("%s. Skipping..." % error[1])
+        return
+    if file_size <= 0:
+        module_logger.warning("File '%s' is empty. Skipping ..." % util.remove_project_path_from_file(input_file))
+        return
+
+    header_lines, num_columns = sniff_header(input_file)
+    if num_columns is None:
+        module_logger.warning("File '%s' has no data. Skipping ..." % util.remove_project_path_from_file(input_file))
+        return
+    if num_columns < 2:
+        module_logger.warning("Index out of range. The dataset should contain at least two columns. Skipping ...")
+        return
+    checked_channels = []
+    for hrf_col, dest_file, cutoff_limits in channels:
+        if hrf_col >= num_columns:
+            module_logger.warning("Index out of range. Falling back to column 1")
+            hrf_col = 1
+        checked_channels.append((hrf_col, dest_file, cutoff_limits))
+
+    module_logger.info("processing file: %s" % input_file)
+    fdouts = []
+    try:
+        for _, dest_file, _ in checked_channels:
+            fdouts.append(open(dest_file, "w"))
+        # the timestamps are kept as text, to be written exactly as they were read
+        with util.open_text(input_file) as fdin:
+            reader = pandas.read_csv(fdin, delim_whitespace=True, header=None, skiprows=header_lines,
+                                     usecols=sorted(set([0, 1] + [hrf_col for hrf_col, _, _ in checked_channels])),
+                                     dtype={0: str if keep_time else numpy.float64},
+                                     chunksize=chunk_lines, engine="c", float_precision="high")
+            for chunk in reader:
+                if chunk.isnull().values.any() or \
+                        (keep_time and pandas.to_numeric(chunk[0], errors="coerce").isnull().values.any()):
+                    raise ValueError("Missing or non numeric values")
+                for fdout, (hrf_col, _, cutoff_limits) in zip(fdouts, checked_channels):
+                    filter_chunk(fdout, chunk[0].values, chunk[hrf_col].values, keep_time, cutoff_limits,
+                                 round_to_int)
+    except (ValueError, pandas.errors.ParserError) as error:
+        module_logger.debug("%s. Filtering file '%s' line by line" % (error, input_file))
+        for fdout in fdouts:
+            fdout.close()
+        for hrf_col, dest_file, cutoff_limits in channels:
+            clean_file_by_line(input_file, dest_file, keep_time, cutoff_limits, round_to_int, hrf_col)
+    else:
+        for fdout in fdouts:
+            fdout.close()
+            module_logger.info("Storing file in: %s" % os.path.abspath(fdout.name))
+
+
+def filter_chunk(fdout, times, hrf, keep_time, cutoff_limits, round_to_int=False):
+    """
+    (file, array of str, array, bool, list, bool) -> NoneType
+
+    Filter a chunk of a file and write it to fdout with a single write call: hrf values of
+    1000 or more are divided by 1000 (rounded to 3 decimal places), values are optionally
+    rounded to integer and the lines outside the cutoff limits are dropped.
+    """
+    hrf = numpy.array(hrf, dtype=numpy.float64)
+    rescale = hrf >= 1000
+    hrf[rescale] = round_half_away(hrf[rescale]) / 1000
+    if round_to_int:
+        hrf = round_half_away(hrf)
+    if cutoff_limits:
+        keep = numpy.logical_and(min(cutoff_limits) <= hrf, hrf <= max(cutoff_limits))
+        hrf = hrf[keep]
+        times = times[keep]
+
+    # formatting the python floats of tolist is several times faster than numpy.savetxt
+    line_format = "%d\n" if round_to_int else "%.3f\n"
+    if keep_time:
+        fdout.write("".join(map(("%s " + line_format).__mod__, zip(times, hrf.tolist()))))
+    else:
+        fdout.write("".join(map(line_format.__mod__, hrf.tolist())))
+
+
+def round_half_away(values):
+    """
+    (array) -> array
+
+    Round to integer with ties away from zero, as python's round (numpy.round rounds ties to even).
+    """
+    return numpy.where(values >= 0, numpy.floor(values + 0.5), numpy.ceil(values - 0.5))
+
+
+def sniff_header(input_file):
+    """
+    (str) -> (int, int)
+
+    Number of header lines (leading lines whose first column is not a number) and number of
+    columns of the first data line of a file (None if the file has no data).
+    """
+    with util.open_text(input_file) as fdin:
+        for line_number, line in enumerate(fdin):
+            data = line.split()
+            try:
+                float(data[0])
+            except (ValueError, IndexError):
+                continue
+            return line_number, len(data)
+    return 0, None
+
+
+def clean_file_by_line(input_file, dest_file, keep_time, cutoff_limits, round_to_int=False, hrf_col=1):
+    """
+
+    (str, str, bool, bool) -> NoneType
+
+    Clean operation of a single file, one line at a time. Used for the files clean_file
+    cannot parse in chunks.
+
     :param input_file: file to read
     :param dest_file: output file
     :param keep_time: flag to keep the time column of the original dataset
@@ -125,7 +341,7 @@ def clean_file(input_file, dest_file, keep_time, cutoff_limits, round_to_int=Fal
             module_logger.warning("File '%s' is empty. Skipping ..." % util.remove_project_path_from_file(input_file))
             return
         line_number = 0
-        with open(input_file, "rU") as fdin:
+        with util.open_text(input_file) as fdin:
             with open(dest_file, "w") as fdout:
                 module_logger.info("processing file: %s" % input_file)
                 for line in fdin:
@@ -196,6 +412,19 @@ def clean_file(input_file, dest_file, keep_time, cutoff_limits, round_to_int=Fal
 
 
 # AUXILIARY FUNCTIONS
+def channel_cutoff_limits(columns, cutoff_limits=None, channel_limits=None):
+    """
+    (list of int, list, list of [int, int, int]) -> dict of int: list
+
+    Cutoff limits of each column: cutoff_limits, unless the column is listed in channel_limits
+    as [COLUMN, LOWER, UPPER].
+    """
+    limits = dict((column, cutoff_limits) for column in columns)
+    for column, lower, upper in channel_limits or []:
+        limits[column] = [lower, upper]
+    return limits
+
+
 def add_parser_options(parser):
     """
     (argparse.ArgumentParser) -> NoneType
@@ -211,9 +440,12 @@ def add_parser_options(parser):
                         dest="column",
                         metavar="COLUMN",
                         action="store",
-                        default=1,
+                        nargs="+",
+                        default=[1],
                         type=int,
-                        help="Column in the dataset to extract hrf from; [default: %(default)s]")
+                        help="Column(s) in the dataset to extract hrf from. With several columns each one is "
+                             "written to its own output (suffix '_col<COLUMN>'), reading the input only once; "
+                             "[default: %(default)s]")
     parser.add_argument("-kt",
                         "--keep-time",
                         dest="keep_time",
@@ -228,10 +460,28 @@ def add_parser_options(parser):
                         metavar=('LOWER', 'UPPER'),
                         default=None,
                         help='When filtering apply limit cutoffs, i.e., LOWER <= hrf <= UPPER.')
+    parser.add_argument('-clims',
+                        '--channel-cutoff-limits',
+                        dest="channel_limits",
+                        nargs=3,
+                        type=int,
+                        action="append",
+                        metavar=('COLUMN', 'LOWER', 'UPPER'),
+                        default=None,
+                        help='Cutoff limits of a single column, overriding -lims for that column. '
+                             'May be repeated, once per column.')
     parser.add_argument("-rint",
                         "--round-to-int",
                         dest="round_to_int",
                         action="store_true",
                         # default=False,
                         help="Round hrf values to integer")
+    parser.add_argument("-j",
+                        "--jobs",
+                        dest="jobs",
+                        metavar="JOBS",
+                        action="store",
+                        default=1,
+                        type=int,
+                        help="Number of processes used to filter the files of a directory; [default: %(default)s]")
 
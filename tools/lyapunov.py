@@ -0,0 +1,297 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the calculation of the largest Lyapunov exponent (LLE)
+using the Rosenstein algorithm, as in pyeeg's LLE, without building the N x N
+distance matrices.
+
+pyeeg.LLE tiles the embedding matrix into an M x M x D tensor, so its memory
+grows cubically with the length of the series. Here the nearest neighbour of
+each embedded point (outside the Theiler window defined by the mean period) is
+found with a k-d tree, or with a blocked search when the window is too wide for
+the tree query to pay off, and the divergence of each pair of neighbours is
+tracked with vectorized gathers. Memory is linear in the length of the series.
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/),
+scipy(https://www.scipy.org/) - optional, enables the k-d tree neighbour search
+
+ENTRY POINT: lyapunov(input_name, tau, dimension, mean_period, sampling_frequency, max_steps, round_digits,
+             on_result, skip_files)
+"""
+
+import os
+import numpy
+import logging
+from collections import namedtuple
+
+try:
+    from tools.pyeeg import embed_seq
+except ImportError:
+    from pyeeg import embed_seq
+
+try:
+    import utility_functions as util
+except ImportError:
+    import tools.utility_functions as util
+
+try:
+    from scipy.spatial import cKDTree
+
+    kdtree_available = True
+except ImportError:
+    kdtree_available = False
+
+module_logger = logging.getLogger('tsanalyse.lyapunov')
+
+# number of rows of the distance matrix evaluated at once by the blocked neighbour search
+SEARCH_BLOCK_SIZE = 512
+
+# the k-d tree is queried for 2 * mean_period + 2 neighbours; above this value the blocked search is used instead
+MAX_KDTREE_NEIGHBOURS = 64
+
+# k-d tree distances closer than this (relative) difference to the nearest one are taken as ties
+TIE_TOLERANCE = 1e-9
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for lyapunov; it
+contains the number of points in the file, and the file's largest Lyapunov exponent"""
+LyapunovData = namedtuple('LyapunovData', 'points lle')
+
+
+# ENTRY POINT FUNCTION
+def lyapunov(input_name, tau, dimension, mean_period, sampling_frequency, max_steps=None, round_digits=None,
+             on_result=None, skip_files=None):
+    """
+    (str, int, int, int, float, int, int) -> dict of str: LyapunovData
+
+    Given a file or directory named input_name, calculate the largest Lyapunov
+    exponent of all the files.
+
+    :param input_name: string containing the name of the dataset to read
+    :param tau: integer containing the embedding lag
+    :param dimension: integer containing the embedding dimension
+    :param mean_period: integer containing the mean period (in samples) used as Theiler window
+    :param sampling_frequency: float containing the sampling frequency of the series
+    :param max_steps: integer containing the number of divergence steps to track (None tracks all of them)
+    :param round_digits: integer containing the number of digits to round to
+    :param on_result: function called with (filename, LyapunovData) as soon as each file is done
+    :param skip_files: names of the files not to compute (e.g. those whose results are already stored)
+    :return dictionary of 'string:LyapunovData'
+    """
+    lyapunov_dict = {}
+
+    if util.is_dataset_dir(input_name):
+        filelist = util.listdir_no_hidden(input_name)
+        for filename in filelist:
+            if skip_files and filename.strip() in skip_files:
+                continue
+            try:
+                lyapunov_data = lyapunov_file(os.path.join(input_name, filename.strip()), tau, dimension,
+                                              mean_period, sampling_frequency, max_steps, round_digits)
+            except ValueError as voe:
+                module_logger.critical("%s. Skipping file..." % voe)
+            else:
+                lyapunov_dict[filename.strip()] = lyapunov_data
+                if on_result is not None:
+                    on_result(filename.strip(), lyapunov_data)
+    else:
+        filename = os.path.basename(input_name)
+        if skip_files and filename in skip_files:
+            return lyapunov_dict
+        try:
+            lyapunov_data = lyapunov_file(input_name.strip(), tau, dimension, mean_period, sampling_frequency,
+                                          max_steps, round_digits)
+        except ValueError as voe:
+            module_logger.critical("%s. Skipping file..." % voe)
+        else:
+            lyapunov_dict[filename] = lyapunov_data
+            if on_result is not None:
+                on_result(filename, lyapunov_data)
+    return lyapunov_dict
+
+
+# IMPLEMENTATION
+def lyapunov_file(filename, tau, dimension, mean_period, sampling_frequency, max_steps=None, round_digits=None):
+    """
+    (str, int, int, int, float, int, int) -> LyapunovData
+
+    Given a filename, calculate the largest Lyapunov exponent.
+    """
+    if util.is_empty_file(filename):
+        raise ValueError("File %s is empty" % filename)
+
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
+
+    module_logger.info("Computing largest Lyapunov exponent for file '%s'"
+                       % util.remove_project_path_from_file(filename))
+
+    lle = largest_lyapunov_exponent(file_data, tau, dimension, mean_period, sampling_frequency, max_steps)
+    module_logger.debug("lle: %s" % lle)
+
+    if round_digits:
+        lle = round(lle, round_digits)
+
+    return LyapunovData(len(file_data), lle)
+
+
+def largest_lyapunov_exponent(x, tau, n, T, fs, max_steps=None):
+    """
+    (array, int, int, int, float, int) -> float
+
+    Calculate the largest Lyapunov exponent of the time series x using the Rosenstein
+    algorithm. The arguments follow pyeeg.LLE: tau is the embedding lag, n the embedding
+    dimension, T the mean period (temporal separation below which two points cannot be
+    neighbours) and fs the sampling frequency.
+
+    ALGORITHM: Reconstruct the trajectory with embed_seq(x, tau, n) and find, for each
+    point j, its nearest neighbour more than T samples away. For every step i, the
+    distance between the points j + i and neighbour[j] + i is gathered for all the pairs
+    still inside the trajectory and the mean of their logarithms is taken. The LLE is the
+    slope of the least squares line fitted to the mean log divergence, times fs.
+
+    Only max_steps steps are tracked if it is set, otherwise every step is (as pyeeg does).
+    """
+    embedded = embed_seq(numpy.ascontiguousarray(x, dtype=numpy.float64), tau, n)
+    num_points = len(embedded)
+    if num_points <= 2 * T + 1:
+        raise ValueError("Series too short (%d embedded points) for a mean period of %d" % (num_points, T))
+
+    neighbours = theiler_nearest_neighbours(embedded, T)
+    mean_divergence = mean_log_divergence(embedded, neighbours, max_steps)
+    if len(mean_divergence) < 2:
+        raise ValueError("Not enough divergence steps to fit the Lyapunov exponent")
+
+    steps = numpy.arange(len(mean_divergence))
+    slope = numpy.polyfit(steps, mean_divergence, 1)[0]
+    return fs * slope
+
+
+def theiler_nearest_neighbours(embedded, theiler_window):
+    """
+    (array, int) -> array of int
+
+    Return, for each row of the embedding matrix, the index of its nearest row (euclidean
+    distance) whose temporal separation is greater than theiler_window.
+
+    The k-d tree is queried for the 2 * theiler_window + 2 nearest points: at most
+    2 * theiler_window + 1 of them fall inside the window, so the first one outside it is
+    the wanted neighbour. For wide windows, or without scipy, the blocked search is used.
+
+    Among points at the same distance pyeeg.LLE takes the lowest index, while the k-d tree
+    orders them arbitrarily and may leave some of them out of the k it returns: the rows with
+    another point outside the window at (within TIE_TOLERANCE) the nearest distance, or with
+    their k-th point at it, are searched again with the blocked search.
+    """
+    num_points = len(embedded)
+    num_neighbours = min(2 * theiler_window + 2, num_points)
+    if kdtree_available and num_neighbours <= MAX_KDTREE_NEIGHBOURS:
+        tree = cKDTree(embedded)
+        distances, candidates = tree.query(embedded, k=num_neighbours)
+        distances = distances.reshape(num_points, num_neighbours)
+        candidates = candidates.reshape(num_points, num_neighbours)
+        rows = numpy.arange(num_points)
+        outside_window = numpy.abs(candidates - rows[:, None]) > theiler_window
+        nearest = outside_window.argmax(axis=1)
+        neighbours = candidates[rows, nearest]
+        tied = distances <= distances[rows, nearest][:, None] * (1 + TIE_TOLERANCE)
+        ties = ((tied & outside_window).sum(axis=1) > 1) | tied[:, -1]
+        if ties.any():
+            neighbours[ties] = blocked_nearest_neighbours(embedded, theiler_window, rows=rows[ties])
+        return neighbours
+    return blocked_nearest_neighbours(embedded, theiler_window)
+
+
+def blocked_nearest_neighbours(embedded, theiler_window, block_size=SEARCH_BLOCK_SIZE, rows=None):
+    """
+    (array, int, int, array of int) -> array of int
+
+    Exact nearest neighbour search outside the Theiler window, evaluating the distance
+    matrix SEARCH_BLOCK_SIZE rows at a time so only block_size x M distances are kept.
+    The distances are computed as in pyeeg.LLE and, among equal ones, the lowest index is
+    taken. Only the rows given are searched (all of them if None).
+    """
+    num_points = len(embedded)
+    columns = numpy.arange(num_points)
+    if rows is None:
+        rows = columns
+    neighbours = numpy.empty(len(rows), dtype=numpy.intp)
+    for block_start in range(0, len(rows), block_size):
+        block_rows = rows[block_start:block_start + block_size]
+        square_dists = numpy.zeros((len(block_rows), num_points))
+        for k in range(embedded.shape[1]):
+            square_dists += (embedded[block_rows, k][:, None] - embedded[:, k][None, :]) ** 2
+        dists = numpy.sqrt(square_dists)
+        dists[numpy.abs(columns[None, :] - block_rows[:, None]) <= theiler_window] = numpy.inf
+        neighbours[block_start:block_start + len(block_rows)] = dists.argmin(axis=1)
+    return neighbours
+
+
+def mean_log_divergence(embedded, neighbours, max_steps=None):
+    """
+    (array, array, int) -> array
+
+    Mean logarithm of the distance between every pair (j + i, neighbours[j] + i) for each
+    step i. Pairs that step outside the trajectory are discarded; null distances count as
+    log(1) = 0, as in pyeeg.LLE.
+    """
+    num_points = len(embedded)
+    num_steps = num_points if max_steps is None else min(max_steps, num_points)
+    origins = numpy.arange(num_points)
+    mean_divergence = []
+    for step in range(num_steps):
+        in_bounds = numpy.logical_and(origins + step <= num_points - 1, neighbours + step <= num_points - 1)
+        num_pairs = numpy.count_nonzero(in_bounds)
+        if num_pairs == 0:
+            break
+        dists = numpy.sqrt(((embedded[origins[in_bounds] + step] -
+                             embedded[neighbours[in_bounds] + step]) ** 2).sum(axis=1))
+        dists[dists == 0] = 1
+        mean_divergence.append(numpy.log(dists).sum() / num_pairs)
+    return numpy.array(mean_divergence)
+
+
+# AUXILIARY FUNCTIONS
+def is_lyapunov_table_empty(lyapunov_table):
+    return len(lyapunov_table) < 1
+
+
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument('-d', '--dimension', dest="dimension", type=int, action="store", metavar="DIMENSION",
+                        help="Embedding dimension. [default:%(default)s]", default=2)
+    parser.add_argument('-tau', '--lag', dest="lag", type=int, action="store", metavar="LAG",
+                        help="Embedding lag. [default:%(default)s]", default=1)
+    parser.add_argument('-mp', '--mean-period', dest="mean_period", type=int, action="store", metavar="SAMPLES",
+                        help="Mean period of the series in samples; neighbours closer in time are ignored. "
+                             "[default:%(default)s]", default=1)
+    parser.add_argument('-sf', '--sampling-frequency', dest="sampling_frequency", type=float, action="store",
+                        metavar="HERTZ", help="Sampling frequency of the series. [default:%(default)s]", default=4)
+    parser.add_argument('-ms', '--max-steps', dest="max_steps", type=int, action="store", metavar="STEPS",
+                        help="Number of divergence steps used to fit the exponent; "
+                             "if not set every step is used. [default:%(default)s]", default=None)
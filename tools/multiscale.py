@@ -27,30 +27,42 @@ A scale is related to the number of points in a time series in this
 case the practical creation of a scale N is achieved by taking every N
 numbers and transforming them into one by calculating their mean.
 
-Once the scales are created you can use this module to compress or calculate the 
-entropy of the different scales.
+The multiscale compression and entropy build the scales of each file in memory
+and compress (or calculate the entropy of) them directly; create_scales writes
+the same scales to disk, for inspection.
 
 MODULE DEPENDENCIES:
 numpy(http://numpy.scipy.org/)
+pandas(http://pandas.pydata.org/)
 
 ENTRY POINT: create_scales(input_name,dest_dir,start,stop,step,mul_order,round_to_int)
-             multiscale_compression(input_name,start,stop,step,compressor,level,decompress, with_compression_rate)
-             multiscale_entropy(input_name,start,stop,step,entropy_function,*args,round_digits)
+             multiscale_compression(input_name,start,stop,step,compressor,level,decompress, with_compression_rate,
+                                    round_digits,mul_order,round_to_int)
+             multiscale_entropy(input_name,start,stop,step,entropy_function,*args,round_digits,mul_order,
+                                round_to_int,mse_variant)
+             entropy_slopes(results_name,scales,separator,line_terminator,round_digits)
 """
 
 import os
+import json
 import numpy
+import pandas
+import shutil
+import hashlib
 import logging
+import tempfile
+import multiprocessing
+from collections import namedtuple, Counter
 
 try:
-    from tools.compress import compress
+    from tools.compress import compress_text
 except ImportError:
-    from compress import compress
+    from compress import compress_text
 try:
-    from tools.entropy import entropy, calculate_std
+    from tools.entropy import entropy_of_series, composite_entropy_of_series
 
 except ImportError:
-    from entropy import entropy, calculate_std
+    from entropy import entropy_of_series, composite_entropy_of_series
 
 try:
     import utility_functions as util
@@ -60,6 +72,24 @@ except ImportError:
 
 module_logger = logging.getLogger('tsanalyse.multiscale')
 
+# multiscale entropy variants: classic, composite and refined composite
+MSE_VARIANTS = ["mse", "cmse", "rcmse"]
+
+# manifest of a scales directory (hidden, so it is not taken for a scale)
+SCALES_MANIFEST = ".scales_manifest.json"
+SCALES_MANIFEST_VERSION = 1
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used by the task scheduler (see series_file_task); it
+contains the name of a file, the path of the .npy file its series was saved to, its number
+of points and its tolerance (None if not needed)"""
+SeriesFile = namedtuple('SeriesFile', 'filename series_file points tolerance')
+
+"""This is a data type defined to be used by the task scheduler (see schedule_scale_tasks); it
+contains the estimated cost of computing one scale of one file, the name of the file, the path
+of its saved series (see SeriesFile) and the scale"""
+ScaleTask = namedtuple('ScaleTask', 'cost filename file_path scale')
+
 # ENTRY POINT FUNCTION
 
 
@@ -74,6 +104,10 @@ def create_scales(input_name, dest_dir, start, stop, step, mul_order, round_to_i
 
     RETURN: None.
     
+    The scales already in dest_dir are reused if its manifest (SCALES_MANIFEST) lists them as
+    complete for the same mul_order, round_to_int and input series (by their hash); any other
+    scale directory is stale or partial and is rebuilt.
+
     ALGORITHM:Create a new folder for each scale between start and stop (use step 
     to jump between scale numbers). For each scale(s) build file with the same name 
     as the original, where every s points are averages to generate a new one. If
@@ -89,43 +123,73 @@ def create_scales(input_name, dest_dir, start, stop, step, mul_order, round_to_i
     :param mul_order: multiplication order to apply to the time series
     :param round_to_int: flat to round the time series to integer
     """
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    # the hash of every series, so scales built from other contents are not reused
+    inputs = {}
+    for filename, file_path in dataset_files(input_name):
+        # -1 to read the last available column (non numeric values raise a ValueError)
+        inputs[filename] = series_hash(util.load_series(file_path, col_index=-1))
+    parameters = {"mul_order": mul_order, "round_to_int": bool(round_to_int)}
+    valid = valid_scales(read_scales_manifest(dest_dir), parameters, inputs)
+
+    scales = []
     for scale in range(start, stop, step):
-        output_dir = os.path.join(dest_dir, "Scale %d" % scale)
-        if not os.path.isdir(output_dir):
-            module_logger.info("Creating Scale %d..." % scale)
-            os.makedirs(output_dir)
+        if scale in valid and scale_files(os.path.join(dest_dir, "Scale %d" % scale)) == set(inputs):
+            module_logger.info("Scale %d is up to date, skipping..." % scale)
         else:
-            module_logger.warning("Scale %d exists, skipping..." % scale)
-            continue
-        if os.path.isdir(input_name):
-            filelist = util.listdir_no_hidden(input_name)
-            for filename in filelist:
-                create_scale(os.path.join(input_name, filename.strip()),
-                             output_dir,
-                             scale,
-                             mul_order,
-                             round_to_int)
-        else:
-            create_scale(input_name.strip(),
-                         output_dir,
-                         scale,
-                         mul_order,
-                         round_to_int)
+            if os.path.isdir(os.path.join(dest_dir, "Scale %d" % scale)):
+                module_logger.warning("Scale %d is stale or incomplete, rebuilding..." % scale)
+            else:
+                module_logger.info("Creating Scale %d..." % scale)
+            scales.append(scale)
+    if not scales:
+        return
+
+    # the scales are written to hidden directories and only moved into place once complete
+    building_dirs = dict((scale, tempfile.mkdtemp(dir=dest_dir, prefix=".Scale %d." % scale)) for scale in scales)
+    try:
+        # every scale of a file is built from a single read of the file
+        for filename, file_path in dataset_files(input_name):
+            series = util.load_series(file_path, col_index=-1)
+            for scale, scaled in zip(scales, coarse_grain(series, scales, mul_order, round_to_int)):
+                write_scale(os.path.join(building_dirs[scale], filename), scaled, round_to_int)
+        completed = []
+        for scale in scales:
+            output_dir = os.path.join(dest_dir, "Scale %d" % scale)
+            shutil.rmtree(output_dir, ignore_errors=True)
+            try:
+                os.rename(building_dirs[scale], output_dir)
+            except OSError:
+                module_logger.warning("Scale %d was created by another process meanwhile, keeping it..." % scale)
+            else:
+                del building_dirs[scale]
+                completed.append(scale)
+    finally:
+        for building_dir in building_dirs.values():
+            shutil.rmtree(building_dir, ignore_errors=True)
+    update_scales_manifest(dest_dir, parameters, inputs, completed)
 
 
-def multiscale_compression(input_name, scales_dir, start, stop, step, compressor, level, decompress,
-                           with_compression_rate, round_digits=None):
+def multiscale_compression(input_name, start, stop, step, compressor, level, decompress, with_compression_rate,
+                           round_digits=None, mul_order=-1, round_to_int=False, on_result=None, skip_files=None,
+                           jobs=1):
     """
     Calculate the multiscale compression for a file or directory.
-    
+
     ARGUMENTS: String input file/directory name, int start scale, int stop scale,
     int step between scales, String compressor, int level, bool decompress.
-    
+
     RETURN: Dictionary with filenames as keys and an array of CompressionData
     (one for each scale) as values.
 
+    Each file is read once and all its scales are built in memory at once (see coarse_grain);
+    the text of each scale is the one create_scales would write, so the results are the same.
+    With more than one job, every (file, scale) is a task of its own and the tasks are run by a
+    pool of processes, the most expensive (the smallest scales) first (see run_scale_tasks);
+    each file is still parsed once.
+
     :param input_name: string containing the name of the dataset to read
-    :param scales_dir: string containing the directory with the scales
     :param start: starting scale
     :param stop: ending scale
     :param step: step between scales
@@ -134,60 +198,79 @@ def multiscale_compression(input_name, scales_dir, start, stop, step, compressor
     :param decompress: flag to enable the output of the decompression time
     :param with_compression_rate: flag to enable the calculation of the compression rate
     :param round_digits: number of decimal digits to use when rounding floats/doubles
+    :param mul_order: multiplication order to apply to the time series (-1 disables it)
+    :param round_to_int: flag to round the scales to integer
+    :param on_result: function called with (filename, row of the file) as soon as every scale of a file is done
+    :param skip_files: names of the files not to compute (e.g. those whose results are already stored)
+    :param jobs: number of processes used to compute the scales
     :return dictionary of 'string:CompressionData'
     """
 
     compression_table = {}
-    if os.path.isdir(input_name):
+    if util.is_dataset_dir(input_name):
         module_logger.info("Computing multiscale compression for directory %s"
                            % util.remove_project_path_from_file(input_name))
-        filelist = util.listdir_no_hidden(input_name)
-        for filename in filelist:
-            compression_table[filename] = []
-            for scale in range(start, stop, step):
-                file_to_compress = os.path.join(scales_dir, "Scale %d" % scale, filename)
-
-                compression_results = compress(file_to_compress, compressor, level, decompress,
-                                               with_compression_rate, round_digits)
-
-                compression_table[filename].append(compression_results[filename].original)
-                compression_table[filename].append(compression_results[filename].compressed)
-                if with_compression_rate:
-                    compression_table[filename].append(compression_results[filename].compression_rate)
-                if decompress:
-                    compression_table[filename].append(compression_results[filename].time)
-
     else:
         module_logger.info("Computing multiscale compression for file %s"
                            % util.remove_project_path_from_file(input_name))
-        filename = os.path.basename(input_name)
-        compression_table[filename] = []
-        for scale in range(start, stop, step):
-            file_to_compress = os.path.join(scales_dir, "Scale %d" % scale, filename)
-
-            compression_results = compress(file_to_compress, compressor, level, decompress,
-                                           with_compression_rate, round_digits)
 
-            compression_table[filename].append(compression_results[filename].original)
-            compression_table[filename].append(compression_results[filename].compressed)
+    scales = range(start, stop, step)
+    if jobs > 1:
+        def file_done(filename, scale_results):
+            compression_table[filename] = []
+            for scale in scales:
+                compression_table[filename].extend(scale_results[scale])
+            if on_result is not None:
+                on_result(filename, compression_table[filename])
+
+        run_scale_tasks(input_name, scales, lambda points, scale: points // scale, compression_task,
+                        (compressor, level, decompress, with_compression_rate, round_digits, mul_order,
+                         round_to_int), jobs, file_done, skip_files)
+    else:
+        for filename, file_path in dataset_files(input_name):
+            if skip_files and filename in skip_files:
+                continue
+            try:
+                # -1 to read the last available column (non numeric values raise a ValueError)
+                series = util.load_series(file_path, col_index=-1)
+            except ValueError as error:
+                module_logger.critical("%s. Did you forget to filter the file? Skipping file..." % error)
+                continue
 
-            if with_compression_rate:
-                compression_table[filename].append(compression_results[filename].compression_rate)
+            compression_table[filename] = []
+            for scaled in coarse_grain(series, scales, mul_order, round_to_int):
+                compression_table[filename].extend(scale_compression(scaled, compressor, level, decompress,
+                                                                     with_compression_rate, round_digits,
+                                                                     round_to_int))
+            if on_result is not None:
+                on_result(filename, compression_table[filename])
 
-            if decompress:
-                compression_table[filename].append(compression_results[filename].time)
     module_logger.debug("Compression Table: %s" % compression_table)
     module_logger.info("Finished computing multiscale compression")
     return compression_table
 
 
-def multiscale_entropy(input_name, scales_dir, start, stop, step, entropy_function, dimension, tolerance,
-                       use_sd_tolerance=True, round_digits=None):
+def multiscale_entropy(input_name, start, stop, step, entropy_function, dimension, tolerance, use_sd_tolerance=True,
+                       round_digits=None, mul_order=-1, round_to_int=False, on_result=None, skip_files=None,
+                       mse_variant="mse", jobs=1, **algorithm_options):
     """
     Calculate the multiscale entropy for a file or directory.
 
+    Each file is read once and its scales are built in memory and given straight to the
+    entropy algorithm. The values of each scale are those create_scales would write (with
+    the same 3 decimal places), so the results are the same. The tolerance of a file is taken
+    from its first scale. The row of a file stops at the first scale too short for the algorithm.
+
+    The mse_variant (see MSE_VARIANTS) selects the entropy of each scale N: that of the scale
+    (mse), the mean of the entropies of the N scales starting at each of the first N points
+    (cmse, composite) or the sample entropy of the match counts of those N scales added up
+    (rcmse, refined composite, only for sampen); see entropy.composite_entropy_of_series.
+
+    With more than one job, every (file, scale) is a task of its own and the tasks are run by a
+    pool of processes, the most expensive first (see run_scale_tasks); each file is still parsed
+    once and its tolerance computed once.
+
     :param input_name: string containing the name of the dataset to read
-    :param scales_dir: string containing the directory with the multiple scales
     :param start: integer containing the starting scale
     :param stop: integer containing the ending scale
     :param step: integer containing the step between scales
@@ -196,86 +279,443 @@ def multiscale_entropy(input_name, scales_dir, start, stop, step, entropy_functi
     :param tolerance: float/double containing the tolerance to use
     :param use_sd_tolerance: boolean flag to decide whether or not to multiply the tolerance by the standard deviation
     :param round_digits: integer containing the numbers of digits to round to
+    :param mul_order: multiplication order to apply to the time series (-1 disables it)
+    :param round_to_int: flag to round the scales to integer
+    :param on_result: function called with (filename, row of the file) as soon as every scale of a file is done
+    :param skip_files: names of the files not to compute (e.g. those whose results are already stored)
+    :param mse_variant: string containing the multiscale entropy variant (mse, cmse or rcmse)
+    :param jobs: number of processes used to compute the scales
+    :param algorithm_options: options specific to the entropy algorithm (see entropy.entropy)
     :return dictionary of 'string:EntropyData'
     """
 
     entropy_table = {}
-    if os.path.isdir(input_name):
+    if util.is_dataset_dir(input_name):
         module_logger.info("Computing multiscale entropy for directory %s"
                            % util.remove_project_path_from_file(input_name))
-        filelist = util.listdir_no_hidden(input_name)
-        files_stds = calculate_std(os.path.join("%s_Scales" % input_name, "Scale %d" % start))
-        tolerances = dict((filename, files_stds[filename] * tolerance) for filename in files_stds)
-
-        if not use_sd_tolerance:
-            module_logger.info("Tolerance does not include Standard Deviation")
-            tolerances = dict(zip(files_stds.keys(), [tolerance] * len(files_stds)))
-        else:
-            module_logger.info("Tolerance includes Standard Deviation")
-
-        for filename in filelist:
+    else:
+        module_logger.info("Computing multiscale entropy for file '%s'" % util.remove_project_path_from_file(input_name))
+    if use_sd_tolerance:
+        module_logger.info("Tolerance includes Standard Deviation")
+    else:
+        module_logger.info("Tolerance does not include Standard Deviation")
 
+    scales = range(start, stop, step)
+    if jobs > 1:
+        def file_done(filename, scale_results):
             entropy_table[filename] = []
-            for scale in range(start, stop, step):
-                file_in_scale = os.path.join("%s_Scales" % input_name, "Scale %d" % scale, filename)
-                try:
-                    entropy_results = entropy(file_in_scale, entropy_function, dimension,
-                                          {filename: tolerances[filename]}, round_digits)
-                except ValueError as ve:
-                    module_logger.error("%s." % ve)
+            for scale in scales:
+                # as when computed in order, the row of a file stops at the first scale that failed
+                if scale_results[scale] is None:
                     break
-                except KeyError as ke:
-                    module_logger.error("Key %s does not exist. Skipping file '%s'..."
-                                        % (ke, util.remove_project_path_from_file(filename)))
-                    break
-                else:
-                    try:
-                        entropy_table[filename].append(entropy_results[filename].entropy)
-                    except AttributeError as ate:
-                        module_logger.error("%s" % ate)
+                entropy_table[filename].append(scale_results[scale])
+            if on_result is not None and len(entropy_table[filename]) > 0:
+                on_result(filename, entropy_table[filename])
+
+        run_scale_tasks(input_name, scales,
+                        lambda points, scale: entropy_cost(entropy_function, points, scale, dimension, mse_variant),
+                        entropy_task, (entropy_function, dimension, round_digits, mul_order, round_to_int,
+                                       mse_variant, algorithm_options), jobs, file_done, skip_files,
+                        (start, tolerance, use_sd_tolerance, mul_order, round_to_int))
     else:
-        module_logger.info("Computing multiscale entropy for file '%s'" % util.remove_project_path_from_file(input_name))
-        filename = os.path.basename(input_name)
-        file_for_std = os.path.join(scales_dir, "Scale %d" % start, filename)
-        try:
-            file_std = calculate_std(file_for_std)
-        except ValueError as ve:
-            module_logger.error("%s" % ve)
-            module_logger.warning("Skipping file '%s'" % filename)
-        except IndexError as ixe:
-                module_logger.critical("%s - The file '%s' does not conform to the requisites:"
-                                       " one column with the hrf vales."
-                                       % (ixe, util.remove_project_path_from_file(filename)))
-        else:
-            tolerances = dict((filename, file_std[fname] * tolerance) for fname in file_std)
-            if not use_sd_tolerance:
-                module_logger.info("Tolerance does not include Standard Deviation")
-                tolerances = dict(zip(file_std.keys(), [tolerance] * len(file_std)))
-            else:
-               module_logger.info("Tolerance includes Standard Deviation")
+        for filename, file_path in dataset_files(input_name):
+            if skip_files and filename in skip_files:
+                continue
+            try:
+                # -1 to read the last available column (non numeric values raise a ValueError)
+                series = util.load_series(file_path, col_index=-1)
+            except ValueError as error:
+                module_logger.critical("%s. Did you forget to filter the file? Skipping file..." % error)
+                continue
 
             entropy_table[filename] = []
-            for scale in range(start, stop, step):
-                file_in_scale = os.path.join(scales_dir, "Scale %d" % scale, filename)
-                try:
-                    entropy_results = entropy(file_in_scale, entropy_function, dimension, tolerances, round_digits)
-                except ValueError as ve:
-                    module_logger.error("%s" % ve)
-                    break
-                except IndexError as ixe:
-                    module_logger.critical("%s - The file '%s' does not conform to the requisites:"
-                                           " one column with the hrf vales."
-                                           % (ixe, util.remove_project_path_from_file(filename)))
+            file_tolerance = tolerance_of_file(series, start, tolerance, use_sd_tolerance, mul_order, round_to_int)
+            for scale, scaled in zip(scales, coarse_grain(series, scales, mul_order, round_to_int)):
+                entropy_value = scale_entropy(series, scale, scaled, entropy_function, dimension, file_tolerance,
+                                              round_digits, mul_order, round_to_int, mse_variant, algorithm_options,
+                                              filename)
+                if entropy_value is None:
                     break
-                else:
-                    entropy_table[filename].append(entropy_results[filename].entropy)
+                entropy_table[filename].append(entropy_value)
+            if on_result is not None and len(entropy_table[filename]) > 0:
+                on_result(filename, entropy_table[filename])
 
     module_logger.debug("Entropy Table: %s" % entropy_table)
     module_logger.info("Finished computing multiscale entropy")
     return entropy_table
 
 
+def entropy_slopes(results_name, scales, separator=",", line_terminator="\n", round_digits=None):
+    """
+    (str, list of int, str, str, int) -> str
+
+    Post-processing of a multiscale entropy csv file (a row per file, one column per scale):
+    write, next to it, the file '<RESULTS>_slopes.csv' with the columns Slope_<FIRST>:<LAST>
+    of each row, the slope of the least squares line of its entropies against the scales
+    FIRST..LAST (see utility_functions.multiscale_slopes). The slopes of every row and scale
+    are computed at once.
+
+    :param results_name: name of the multiscale entropy csv file
+    :param scales: the scales of the columns of the file
+    :param separator: csv separator of the file (also used to write the slopes)
+    :param line_terminator: line terminator used to write the slopes
+    :param round_digits: number of digits to round the slopes to
+    :return name of the slopes file
+    """
+    results = pandas.read_csv(results_name, sep=separator)
+    slopes = util.multiscale_slopes(results, scales, round_digits)
+    slopes.insert(0, results.columns[0], results.iloc[:, 0])
+    slopes_name = "%s_slopes.csv" % util.remove_file_extension(results_name)
+    slopes.to_csv(slopes_name, sep=separator, line_terminator=line_terminator, index=False)
+    module_logger.debug("Slopes of '%s' stored in '%s'" % (results_name, slopes_name))
+    return slopes_name
+
+
 # IMPLEMENTATION
+def scale_compression(scaled, compressor, level, decompress, with_compression_rate, round_digits, round_to_int):
+    """
+    (array, str, int, bool, bool, int, bool) -> list
+
+    The values of the row of a file for one scale: the original and compressed sizes of the
+    text of the scale and, optionally, its compression rate and decompression time.
+    """
+    scale_text = "".join("%s\n" % line for line in scale_lines(scaled, round_to_int))
+    compression_results = compress_text(scale_text, compressor, level, decompress, with_compression_rate,
+                                        round_digits)
+    values = [compression_results.original, compression_results.compressed]
+    if with_compression_rate:
+        values.append(compression_results.compression_rate)
+    if decompress:
+        values.append(compression_results.time)
+    return values
+
+
+def tolerance_of_file(series, start, tolerance, use_sd_tolerance, mul_order, round_to_int):
+    """
+    (array, int, float, bool, int, bool) -> float
+
+    The tolerance used for every scale of a file: tolerance times the standard deviation of its
+    first scale (if use_sd_tolerance is set and that scale is not empty), or tolerance itself.
+    """
+    if not use_sd_tolerance:
+        return tolerance
+    start_series = scale_values(coarse_grain(series, [start], mul_order, round_to_int)[0], round_to_int)
+    if len(start_series) == 0:
+        return tolerance
+    return numpy.std(start_series) * tolerance
+
+
+def scale_entropy(series, scale, scaled, entropy_function, dimension, tolerance, round_digits, mul_order,
+                  round_to_int, mse_variant, algorithm_options, filename):
+    """
+    (array, int, array, str, int, float, int, int, bool, str, dict, str) -> float
+
+    The entropy of one scale of a file (see multiscale_entropy); None (the error is logged) if it
+    cannot be computed, e.g. if the scale is too short.
+    """
+    try:
+        if mse_variant == "mse":
+            entropy_results = entropy_of_series(scale_values(scaled, round_to_int), entropy_function, dimension,
+                                                tolerance, round_digits, **algorithm_options)
+        else:
+            entropy_results = composite_entropy_of_series(offset_scales(series, scale, mul_order, round_to_int),
+                                                          entropy_function, dimension, tolerance, round_digits,
+                                                          mse_variant == "rcmse", **algorithm_options)
+    except ValueError as ve:
+        module_logger.error("%s (file '%s', scale %d)." % (ve, filename, scale))
+    except IndexError as ixe:
+        module_logger.critical("%s - The file '%s' does not conform to the requisites:"
+                               " one column with the hrf vales." % (ixe, filename))
+    else:
+        return entropy_results.entropy
+    return None
+
+
+def entropy_cost(entropy_function, points, scale, dimension, mse_variant="mse"):
+    """
+    (str, int, int, int, str) -> int
+
+    Estimated cost of the entropy of one scale of a file with 'points' points. sampen and apen
+    compare every pair of templates, so their cost grows with the square of the length of the
+    scale (a scale S task costs about 1/S^2 of the scale 1 task); the composite variants do it
+    for each of the S coarse-grained series of the scale. cce is linear on the length.
+    """
+    windows = points // scale
+    if entropy_function == "cce":
+        return windows * dimension
+    if mse_variant != "mse":
+        return scale * windows ** 2
+    return windows ** 2
+
+
+def schedule_scale_tasks(series_files, scales, cost_function):
+    """
+    (list of SeriesFile, list of int, function) -> list of ScaleTask
+
+    The (file, scale) tasks of a multiscale run, the most expensive first. The cost of a task is
+    cost_function(points of the file, scale).
+    """
+    tasks = [ScaleTask(cost_function(series_file.points, scale), series_file.filename, series_file.series_file, scale)
+             for series_file in series_files for scale in scales]
+    tasks.sort(key=lambda task: task.cost, reverse=True)
+    return tasks
+
+
+def run_scale_tasks(input_name, scales, cost_function, task_function, task_arguments, jobs, on_file_done,
+                    skip_files=None, tolerance_arguments=None):
+    """
+    (str, list of int, function, function, tuple, int, function, set, tuple) -> NoneType
+
+    Run the (file, scale) tasks of a multiscale run of a file or dataset in a pool of jobs
+    processes. The pool first parses every file once (see series_file_task), saving its series
+    to a temporary .npy file and computing its tolerance if tolerance_arguments are given. Then
+    the tasks are run, the most expensive first (see schedule_scale_tasks). Each task loads the
+    saved series of its file (memory mapped) and coarse-grains it to its own scale, so the series
+    are never held by this process. task_function is called with (task, tolerance of the file,
+    task_arguments) and returns (filename, scale, value). As soon as every scale of a file is
+    done on_file_done is called with the file name and a dictionary of scale: value.
+    """
+    series_dir = tempfile.mkdtemp(prefix="tsanalyse_series_")
+    pool = multiprocessing.Pool(jobs)
+    try:
+        file_jobs = [(filename, file_path, os.path.join(series_dir, "%d.npy" % position), tolerance_arguments)
+                     for position, (filename, file_path) in enumerate(dataset_files(input_name))
+                     if not (skip_files and filename in skip_files)]
+        series_files = [series_file for series_file in pool.imap(series_file_task, file_jobs, 1)
+                        if series_file is not None]
+        tolerances = dict((series_file.filename, series_file.tolerance) for series_file in series_files)
+        tasks = schedule_scale_tasks(series_files, scales, cost_function)
+
+        module_logger.info("Computing %d (file, scale) tasks with %d processes" % (len(tasks), jobs))
+        remaining = Counter(task.filename for task in tasks)
+        file_results = {}
+        # one task at a time, so the processes take the tasks in their order (the most expensive first)
+        for filename, scale, value in pool.imap_unordered(
+                task_function, [(task, tolerances[task.filename], task_arguments) for task in tasks], 1):
+            file_results.setdefault(filename, {})[scale] = value
+            remaining[filename] -= 1
+            if remaining[filename] == 0:
+                on_file_done(filename, file_results.pop(filename))
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(series_dir, ignore_errors=True)
+
+
+def series_file_task(file_job):
+    """
+    (tuple) -> SeriesFile
+
+    !!!Auxiliary function!!! Parse one file and save its series to series_file (see
+    run_scale_tasks). None if the file cannot be read (the error is logged).
+    """
+    filename, file_path, series_file, tolerance_arguments = file_job
+    try:
+        # -1 to read the last available column (non numeric values raise a ValueError)
+        series = util.load_series(file_path, col_index=-1)
+    except ValueError as error:
+        module_logger.critical("%s. Did you forget to filter the file? Skipping file..." % error)
+        return None
+    numpy.save(series_file, series)
+    file_tolerance = None
+    if tolerance_arguments is not None:
+        file_tolerance = tolerance_of_file(series, *tolerance_arguments)
+    return SeriesFile(filename, series_file, len(series), file_tolerance)
+
+
+def compression_task(task_job):
+    """
+    (tuple) -> (str, int, list)
+
+    !!!Auxiliary function!!! Compress one scale of one file (see run_scale_tasks).
+    """
+    task, _, (compressor, level, decompress, with_compression_rate, round_digits, mul_order,
+              round_to_int) = task_job
+    scaled = coarse_grain(numpy.load(task.file_path, mmap_mode="r"), [task.scale], mul_order, round_to_int)[0]
+    return task.filename, task.scale, scale_compression(scaled, compressor, level, decompress, with_compression_rate,
+                                                        round_digits, round_to_int)
+
+
+def entropy_task(task_job):
+    """
+    (tuple) -> (str, int, float)
+
+    !!!Auxiliary function!!! Calculate the entropy of one scale of one file (see run_scale_tasks).
+    """
+    task, file_tolerance, (entropy_function, dimension, round_digits, mul_order, round_to_int, mse_variant,
+                           algorithm_options) = task_job
+    series = numpy.load(task.file_path, mmap_mode="r")
+    scaled = coarse_grain(series, [task.scale], mul_order, round_to_int)[0]
+    return task.filename, task.scale, scale_entropy(series, task.scale, scaled, entropy_function, dimension,
+                                                    file_tolerance, round_digits, mul_order, round_to_int,
+                                                    mse_variant, algorithm_options, task.filename)
+
+
+def dataset_files(input_name):
+    """
+    (str) -> list of (str, str)
+
+    Name and path of every file of a dataset (directory or container), or of a single file.
+    """
+    if util.is_dataset_dir(input_name):
+        return [(filename.strip(), os.path.join(input_name, filename.strip()))
+                for filename in util.listdir_no_hidden(input_name)]
+    return [(os.path.basename(input_name), input_name.strip())]
+
+
+def coarse_grain(series, scales, mul_order=-1, round_to_int=False):
+    """
+    (array, list of int, int, bool) -> list of arrays
+
+    Every scale of a series in one call: for each scale N, the mean of every N consecutive
+    points (trailing points that do not fill a window are dropped), multiplied by mul_order
+    unless it is -1 and rounded to integer (half away from zero) if round_to_int is set.
+
+    ALGORITHM: The cumulative sum of the series is computed once and the sums of the windows
+    of each scale are the differences of its values N points apart. The cumulative sum is only
+    exact for integer valued series (e.g. RR intervals in ms); for any other series each scale
+    is the mean of the series reshaped into rows of N points, which gives the very same values
+    numpy.mean gives for each window (so the scales keep the text they always had).
+
+    :param series: the series to coarse-grain
+    :param scales: the scales to build
+    :param mul_order: multiplication order to apply to the time series (-1 disables it)
+    :param round_to_int: flag to round the scales to integer
+    :return list with the values of each scale
+    """
+    series = numpy.asarray(series, dtype=numpy.float64)
+    cumulative = None
+    if is_integer_valued(series):
+        cumulative = numpy.concatenate(([0.0], numpy.cumsum(series)))
+
+    pyramid = []
+    for scale in scales:
+        num_windows = len(series) // scale
+        if num_windows == 0:
+            scaled = numpy.zeros(0)
+        elif cumulative is not None:
+            window_ends = cumulative[scale:num_windows * scale + 1:scale]
+            window_starts = cumulative[0:(num_windows - 1) * scale + 1:scale]
+            scaled = (window_ends - window_starts) / scale
+        else:
+            scaled = series[:num_windows * scale].reshape(num_windows, scale).mean(axis=1)
+        if mul_order != -1:
+            scaled = scaled * mul_order
+        if round_to_int:
+            scaled = round_half_away_from_zero(scaled)
+        pyramid.append(scaled)
+    return pyramid
+
+
+def scale_lines(scaled, round_to_int):
+    """
+    (array, bool) -> list of str
+
+    The lines of a scale (see coarse_grain): integers if round_to_int is set and values with
+    3 decimal places otherwise.
+    """
+    if round_to_int:
+        return ['%d' % value for value in scaled.tolist()]
+    return ['%.3f' % value for value in scaled.tolist()]
+
+
+def scale_values(scaled, round_to_int):
+    """
+    (array, bool) -> array
+
+    The values of a scale read back from its text (see scale_lines), as they would be read
+    from its scale file.
+    """
+    return numpy.array(scale_lines(scaled, round_to_int), dtype=numpy.float64)
+
+
+def offset_scales(series, scale, mul_order=-1, round_to_int=False):
+    """
+    (array, int, int, bool) -> list of arrays
+
+    The values (see scale_values) of the 'scale' coarse-grained series of a series that start at
+    each of its first 'scale' points, the first one being the scale itself.
+    """
+    series = numpy.asarray(series, dtype=numpy.float64)
+    return [scale_values(coarse_grain(series[offset:], [scale], mul_order, round_to_int)[0], round_to_int)
+            for offset in range(scale)]
+
+
+def series_hash(series):
+    """
+    (array) -> str
+
+    Hash (sha1) of the values of a series.
+    """
+    return hashlib.sha1(numpy.ascontiguousarray(series, dtype=numpy.float64).tobytes()).hexdigest()
+
+
+def read_scales_manifest(dest_dir):
+    """
+    (str) -> dict
+
+    Manifest of a scales directory; empty if it does not exist, cannot be read or was
+    written by another version of this module.
+    """
+    try:
+        with open(os.path.join(dest_dir, SCALES_MANIFEST), "r") as fdin:
+            manifest = json.load(fdin)
+    except (IOError, OSError, ValueError):
+        return {}
+    if manifest.get("version") != SCALES_MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def valid_scales(manifest, parameters, inputs):
+    """
+    (dict, dict, dict) -> set of int
+
+    Scales of a manifest that are complete for these parameters and input hashes.
+    """
+    if manifest.get("parameters") != parameters or manifest.get("inputs") != inputs:
+        return set()
+    return set(manifest.get("scales", []))
+
+
+def scale_files(scale_dir):
+    """
+    (str) -> set of str
+
+    Files of a scale directory (none if it does not exist).
+    """
+    if not os.path.isdir(scale_dir):
+        return set()
+    return set(util.listdir_no_hidden(scale_dir))
+
+
+def update_scales_manifest(dest_dir, parameters, inputs, scales):
+    """
+    (str, dict, dict, list of int) -> NoneType
+
+    Record scales as complete in the manifest of a scales directory, along with those already
+    recorded for the same parameters and inputs (e.g. by another process). The manifest is
+    written atomically; a manifest that cannot be written is only logged (its scales are
+    rebuilt by the next run).
+    """
+    completed = valid_scales(read_scales_manifest(dest_dir), parameters, inputs) | set(scales)
+    manifest = {"version": SCALES_MANIFEST_VERSION, "parameters": parameters, "inputs": inputs,
+                "scales": sorted(completed)}
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=dest_dir, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "w") as fdout:
+            json.dump(manifest, fdout, sort_keys=True)
+        os.rename(tmp_name, os.path.join(dest_dir, SCALES_MANIFEST))
+    except (OSError, IOError) as err:
+        module_logger.warning("Unable to write scales manifest in '%s': %s" % (dest_dir, err))
+
+
+def write_scale(scale_file, scaled, round_to_int):
+    with open(scale_file, "w") as fdout:
+        for line in scale_lines(scaled, round_to_int):
+            fdout.write('%s\n' % line)
+
+
 def create_scale(inputfile, output_dir, scale, mul_order, round_to_int):
     """
     This function creates a one scale for one file.
@@ -288,7 +728,7 @@ def create_scale(inputfile, output_dir, scale, mul_order, round_to_int):
     ALGORITHM: For a scale N, read the file, on each iteration extract an interval
     of N values, calculate the mean of these numbers and save it in the resulting
     file. Each iteration's interval starts after the last number used in the
-    previous iteration.
+    previous iteration (see coarse_grain).
 
     :param inputfile: file to read
     :param output_dir: output directory
@@ -298,33 +738,36 @@ def create_scale(inputfile, output_dir, scale, mul_order, round_to_int):
 
     """
     filename = os.path.basename(inputfile)
-    line_index = 0
-
-    # with open(inputfile, "rU") as fdin:
-    #     lines = fdin.readlines()
-    #     lines = list(map(float, lines))
-    #
-
-    # -1 to read the last available column
-    lines = util.readlines_with_col_index(inputfile, col_index=-1, as_type=float)
-    # lets force a type cast to float so the error can be caught outside
-    lines = list(map(float, lines))
-    # print(lines)
-
-    with open(os.path.join(output_dir, filename), "w") as fdout:
-        while line_index + scale <= len(lines):
-            scaled_hrf = numpy.mean(lines[line_index:line_index + scale])
-            if mul_order != -1:
-                scaled_hrf *= mul_order
-            if round_to_int:
-                fdout.write('%d\n' % round(scaled_hrf))
-            else:
-                fdout.write('%.3f\n' % scaled_hrf)
-            line_index += scale
+
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    lines = util.load_series(inputfile, col_index=-1)
+    write_scale(os.path.join(output_dir, filename), coarse_grain(lines, [scale], mul_order, round_to_int)[0],
+                round_to_int)
     return
 
 
 # AUXILIARY FUNCTIONS
+def is_integer_valued(series):
+    """
+    (array) -> bool
+
+    True if every value of the series is an integer and its cumulative sum is exact in floating point.
+    """
+    return bool(numpy.all(numpy.mod(series, 1) == 0)) and numpy.sum(numpy.abs(series)) < 2 ** 53
+
+
+def round_half_away_from_zero(values):
+    """
+    (array) -> array
+
+    The values rounded to integer as python's round rounds them (halves away from zero).
+    """
+    magnitude = numpy.abs(values)
+    rounded = numpy.floor(magnitude)
+    rounded += (magnitude - rounded) >= 0.5
+    return numpy.copysign(rounded, values)
+
+
 def add_parser_options(parser):
     """
     !!!Auxiliary function!!!  These are arguments for an argparse
@@ -375,9 +818,48 @@ def add_parser_options(parser):
                         action="store_true",
                         help="Round the scales values to int.",
                         default=False)
+    parser.add_argument("-j",
+                        "--jobs",
+                        dest="jobs",
+                        metavar="JOBS",
+                        action="store",
+                        default=1,
+                        type=int,
+                        help="Number of processes used to compute the scales; every (file, scale) is a task of "
+                             "its own and the most expensive ones are run first. Default:[%(default)s]")
     parser.add_argument("-ks",
                         "--keep-scales",
                         dest="keep_scales",
                         action="store_true",
-                        help="After multiscale processing maintain the generated scales",
+                        help="Also write the scales to disk (they are otherwise only built in memory) and keep "
+                             "them after multiscale processing, for inspection. Scales written by a previous run "
+                             "are reused if they were built from the same inputs and parameters",
+                        default=False)
+
+
+def add_entropy_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for the entropy parser or subparser,
+    and are the optional arguments for multiscale_entropy
+
+    """
+    parser.add_argument("-mse",
+                        "--mse-variant",
+                        dest="mse_variant",
+                        action="store",
+                        choices=MSE_VARIANTS,
+                        help="Multiscale entropy variant: classic (mse), composite (cmse, the mean over the "
+                             "coarse-grained series starting at each of the first SCALE points) or refined "
+                             "composite (rcmse, sampen only, their match counts added up). "
+                             "Default:[%(default)s]",
+                        default="mse")
+    parser.add_argument("-slopes",
+                        "--with-slopes",
+                        dest="with_slopes",
+                        action="store_true",
+                        help="Also write the file <RESULTS>_slopes.csv with the slope of the least squares "
+                             "line of the entropies of each file against the scales, from the first scale to "
+                             "each of the others (columns Slope_<FIRST>:<LAST>).",
                         default=False)
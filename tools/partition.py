@@ -31,13 +31,47 @@ uses the mode of all timestamps this way the data is not affected by
 extended periods of signal loss, and what we get is closer to the
 period of acquired signal. !!!
 
+The blocks of a full file can also be obtained without writing them (see
+file_blocks): their bounds are the rows of the file each block spans, so the
+values of a block are a slice of the values of the file. block_index gives
+these bounds for every file of a dataset (the block index), and write_blocks
+writes the block files of an index, only when they are wanted. file_block_index
+gives the bounds of a single file along with the lines they index, so a file is
+read once to be partitioned, analysed and written (see write_file_blocks).
+
+Partitioning from the end of a file (start_at_end) cuts a single block: the
+last section seconds (or lines) ending starting_point seconds (or lines) before
+its last line (see tail_block). The file is read backwards from its end, in
+chunks of TAIL_CHUNK_SIZE bytes (see TailReader), only until the lines read hold
+the block, so the cost depends on the size of the block and not on the size of
+the file (compressed files cannot be read backwards and are read whole). The
+rows of the block are counted from the end of the file (negative), so they index
+the last lines of the file and all of its lines alike.
+
+The timestamps of a file are parsed once (see line_times). Partitioning by time
+searches the limits of every block with numpy.searchsorted: in the timestamps
+of a cumulative file, or in the acquired time (k times the mode of the
+timestamps after k lines) of a periodic one, giving the blocks the line by line
+walk of initial_indexes_time and next_indexes_time gives. That walk is still
+used when partitioning from the end of the file and for cumulative timestamps
+that are not sorted. The real times of the blocks come from the cumulative sums
+of the timestamps.
+
 ENTRY POINT:    partition(input_name, dest_dir, starting_point=0, section=-1, gap=-1, start_at_end=False,
                         full_file=False, lines=False)
+                file_blocks(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False)
+                block_index(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False)
+                file_block_index(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False)
+                write_blocks(input_name, dest_dir, index)
+                write_file_blocks(filename, file_lines, dest_dir, blocks)
+                tail_block(input_name, starting_point=0, section=-1, lines=False, chunk_size=TAIL_CHUNK_SIZE)
 
 """
 
 import os
+import numpy
 import logging
+from collections import namedtuple
 
 try:
     import utility_functions as util
@@ -49,6 +83,15 @@ module_logger = logging.getLogger('tsanalyse.partition')
 # This number was randomly chosen, no meaning to it
 SAMPLE_SIZE = 42
 
+# bytes read at a time when reading a file backwards from its end
+TAIL_CHUNK_SIZE = 64 * 1024
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for file_blocks and block_index; it contains
+the number of a block (as in the name of its file, '<FILE>_<NUMBER>'), the rows of the file it
+spans (start included, end excluded) and its real start and end times (see get_p_rtime)"""
+BlockBounds = namedtuple('BlockBounds', 'number start end real_start real_end')
+
 
 # ENTRY POINT FUNCTIONS
 # note: section and gap have default it is never used, the parser contains the correct value.
@@ -80,6 +123,124 @@ def partition(input_name, dest_dir, starting_point=0, section=-1, gap=-1, start_
     return block_times
 
 
+def file_blocks(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False):
+    """
+    (str, int, int, int, bool, bool) -> (list of str, list of BlockBounds)
+
+    The blocks partition would write for the full file input_name, without writing them: the
+    (non empty) lines of the file and the bounds of each block. A block's values are those of its
+    lines[start:end]; blocks with no lines (start >= end) are not written by partition either.
+    """
+    file_lines = read_lines(input_name)
+    if not file_lines:
+        return file_lines, []
+    if start_at_end:
+        cumulative, time_stamp = sniffer(file_lines[-SAMPLE_SIZE:], start_at_end)
+    else:
+        cumulative, time_stamp = sniffer(file_lines[:SAMPLE_SIZE], start_at_end)
+    if lines:
+        return file_lines, line_block_bounds(file_lines, starting_point, section, gap, start_at_end, cumulative)
+    return file_lines, time_block_bounds(file_lines, starting_point, section, gap, start_at_end, cumulative,
+                                         time_stamp)
+
+
+def block_index(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False):
+    """
+    (str, int, int, int, bool, bool) -> dict of str: list of BlockBounds
+
+    The block index of the file or directory input_name: the bounds of the blocks partition would
+    write for each full file (see file_block_index), without writing them.
+    """
+    index = {}
+    for filename, file_path in dataset_files(input_name):
+        index[filename] = file_block_index(file_path, starting_point, section, gap, start_at_end, lines)[1]
+    return index
+
+
+def file_block_index(input_name, starting_point=0, section=-1, gap=-1, start_at_end=False, lines=False):
+    """
+    (str, int, int, int, bool, bool) -> (list of str, list of BlockBounds)
+
+    The lines of the file input_name and the bounds of the blocks partition would write for it
+    (see file_blocks), reading the file once: the blocks are analysed (see block_views) and
+    written (see write_file_blocks) from these lines. Blocks with no lines are left out, as
+    partition writes no file for them. If start_at_end is set the file has a single block, cut
+    from its end, and only the last lines of the file are read (see tail_block).
+    """
+    if util.is_empty_file(input_name):
+        module_logger.warning("File '{0}' is empty. Skipping blocks creation..."
+                              .format(util.remove_project_path_from_file(input_name)))
+        return [], []
+    if start_at_end:
+        file_lines, block = tail_block(input_name, starting_point, section, lines)
+        bounds = [block]
+    else:
+        file_lines, bounds = file_blocks(input_name, starting_point, section, gap, start_at_end, lines)
+    return file_lines, [block for block in bounds if block is not None and block.start < block.end]
+
+
+def dataset_files(input_name):
+    """
+    (str) -> list of (str, str)
+
+    The name (as in the block index) and path of each file of the file or directory input_name.
+    """
+    if os.path.isdir(input_name):
+        return [(filename.strip(), os.path.join(input_name, filename.strip()))
+                for filename in util.listdir_no_hidden(input_name)]
+    return [(os.path.basename(input_name), input_name.strip())]
+
+
+def write_blocks(input_name, dest_dir, index):
+    """
+    (str, str, dict of str: list of BlockBounds) -> NoneType
+
+    Write the block files of a block index of the file or directory input_name into dest_dir, as
+    partition writes them (see write_file_blocks).
+    """
+    for filename in index:
+        file_path = os.path.join(input_name, filename) if os.path.isdir(input_name) else input_name
+        write_file_blocks(filename, blocks_lines(file_path, index[filename]), dest_dir, index[filename])
+
+
+def write_file_blocks(filename, file_lines, dest_dir, blocks):
+    """
+    (str, list of str, str, list of BlockBounds) -> NoneType
+
+    Write the block files of the file filename, from the lines its blocks are sliced from (see
+    file_block_index), into dest_dir as partition writes them ('<FILE>_blocks/<FILE>_<NUMBER>').
+    """
+    name = os.path.splitext(util.remove_compression_extension(filename))[0]
+    file_block_dir = os.path.join(dest_dir, "%s_blocks" % name)
+    if not os.path.isdir(file_block_dir):
+        module_logger.info("Creating %s..." % util.remove_project_path_from_file(file_block_dir))
+        os.makedirs(file_block_dir)
+    for block in blocks:
+        write_partition(file_lines, os.path.join(file_block_dir, "%s_%d" % (name, block.number)), block.start,
+                        block.end)
+
+
+def tail_block(input_name, starting_point=0, section=-1, lines=False, chunk_size=TAIL_CHUNK_SIZE):
+    """
+    (str, int, int, bool, int) -> (list of str, BlockBounds)
+
+    The block cut from the end of the file input_name, as partitioning from the end of the file
+    (start_at_end) cuts its first block, reading the file backwards only until the lines read
+    hold it. Returns the lines read (the last lines of the file) and the bounds of the block, with
+    its rows counted from the end of the file (None for an empty file).
+    """
+    reader = TailReader(input_name, chunk_size)
+    wanted_lines = SAMPLE_SIZE
+    while True:
+        while len(reader.lines) < wanted_lines and not reader.whole_file:
+            reader.read_more()
+        block = tail_block_bounds(reader.lines, starting_point, section, lines, reader.whole_file)
+        if block is not None or reader.whole_file:
+            return reader.lines, block
+        # the block may start before the lines read: read as many again
+        wanted_lines = 2 * len(reader.lines)
+
+
 # IMPLEMENTATION
 
 def partition_file(input_name, dest_dir, starting_point, section, gap, start_at_end, full_file, lines):
@@ -108,47 +269,63 @@ def partition_by_lines(input_name, dest_dir, starting_point, section, gap, start
     (not just acquired signal time) times for beginning and end of the partitions.
     """
 
-    with open(input_name, 'rU') as fdin:
+    with util.open_text(input_name) as fdin:
         lines = fdin.readlines()
     lines = [line for line in lines if line != "\n"]
-    filename = os.path.splitext(os.path.basename(input_name))[0]
+    filename = os.path.splitext(util.remove_compression_extension(os.path.basename(input_name)))[0]
     if start_at_end:
         cumulative, time_stamp = sniffer(lines[-SAMPLE_SIZE:], start_at_end)
     else:
         cumulative, time_stamp = sniffer(lines[:SAMPLE_SIZE], start_at_end)
-    p_init, p_end = initial_indexes_lines(starting_point, section, start_at_end, len(lines) - 1)
-    r_start = get_p_rtime(lines[:p_init + 1], 0, cumulative)
-    r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
     p_times = []
     if full_file:
-        k = 1
         file_block_dir = os.path.join(dest_dir, "%s_blocks" % filename)
         if not os.path.isdir(file_block_dir):
             module_logger.info("Creating %s..." % file_block_dir)
             os.makedirs(file_block_dir)
-        while p_end < len(lines):
-            partname = "%s_%d" % (filename, k)
-            write_partition(lines, os.path.join(file_block_dir, partname), p_init, p_end)
-            p_times.append((r_start, r_end))
-            k += 1
-            r_start = get_p_rtime(lines[p_end:p_end + 1], r_end, cumulative)
-            try:
-                p_init, p_end = next_indexes_lines(p_init, p_end, gap)
-            except IndexError as ie:
-                module_logger.error("{0}.Ignoring further partitions.".format(ie))
-                break
-            else:
-                r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
-        partname = "%s_%d" % (filename, k)
-        write_partition(lines, os.path.join(file_block_dir, partname), p_init, len(lines))
-        p_times.append((r_start, r_end))
+        for block in line_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative):
+            write_partition(lines, os.path.join(file_block_dir, "%s_%d" % (filename, block.number)),
+                            block.start, block.end)
+            p_times.append((block.real_start, block.real_end))
     else:
+        p_init, p_end = initial_indexes_lines(starting_point, section, start_at_end, len(lines) - 1)
+        r_start = get_p_rtime(lines[:p_init + 1], 0, cumulative)
+        r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
         write_partition(lines, os.path.join(dest_dir, filename), p_init, p_end)
         p_times.append((r_start, r_end))
-    fdin.close()
     return p_times
 
 
+def line_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative):
+    """
+    (list, int, int, int, bool, bool) -> list of BlockBounds
+
+    Bounds of the blocks of the full file, measuring their size in lines: the first block starts at
+    starting_point and each of the others gap lines after the previous one; the last block runs
+    to the end of the file.
+    """
+    times = line_times(lines)[0]
+    real_times = RealTimes(times, cumulative)
+    p_init, p_end = initial_indexes_lines(starting_point, section, start_at_end, len(lines) - 1)
+    r_start = real_times.at(0, p_init + 1, 0)
+    r_end = real_times.at(p_init, p_end, r_start)
+    blocks = []
+    block_count = 1
+    while p_end < len(lines):
+        blocks.append(BlockBounds(block_count, p_init, p_end, r_start, r_end))
+        block_count += 1
+        r_start = real_times.at(p_end, p_end + 1, r_end)
+        try:
+            p_init, p_end = next_indexes_lines(p_init, p_end, gap)
+        except IndexError as ie:
+            module_logger.error("{0}.Ignoring further partitions.".format(ie))
+            break
+        else:
+            r_end = real_times.at(p_init, p_end, r_start)
+    blocks.append(BlockBounds(block_count, p_init, len(lines), r_start, r_end))
+    return blocks
+
+
 def initial_indexes_lines(starting_point, section, start_at_end, total_len):
     """
     (int,int,bool,int) -> (int, int)
@@ -212,53 +389,216 @@ def partition_by_time(input_name, dest_dir, starting_point, section, gap, start_
                               .format(util.remove_project_path_from_file(input_name)))
         return []
 
-    with open(input_name, 'rU') as fdin:
+    with util.open_text(input_name) as fdin:
         lines = fdin.readlines()
     lines = [line for line in lines if line != "\n"]
-    filename = os.path.splitext(os.path.basename(input_name))[0]
+    filename = os.path.splitext(util.remove_compression_extension(os.path.basename(input_name)))[0]
     if start_at_end:
         cumulative, time_stamp = sniffer(lines[-SAMPLE_SIZE:], start_at_end)
     else:
         cumulative, time_stamp = sniffer(lines[:SAMPLE_SIZE], start_at_end)
-    p_init, p_end = initial_indexes_time(lines, starting_point, section, start_at_end, cumulative, time_stamp)
-    r_start = get_p_rtime(lines[:p_init + 1], 0, cumulative)
-    r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
     p_times = []
     if full_file:
-        block_count = 1
         file_block_dir = os.path.join(dest_dir, "%s_blocks" % filename)
         if not os.path.isdir(file_block_dir):
             module_logger.info("Creating %s..." % util.remove_project_path_from_file(file_block_dir))
             os.makedirs(file_block_dir)
-        while p_init < p_end < len(lines):  # p_end < len(lines) and p_end > p_init:
-            partname = "%s_%d" % (filename, block_count)
-            write_partition(lines, os.path.join(file_block_dir, partname), p_init, p_end)
+        for block in time_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative, time_stamp):
+            partname = "%s_%d" % (filename, block.number)
+            write_partition(lines, os.path.join(file_block_dir, partname), block.start, block.end)
 
             module_logger.debug("Writing partition %s to file %s"
                                 % (partname, util.remove_project_path_from_file(os.path.join(file_block_dir, partname))))
 
-            p_times.append((r_start, r_end))
-            block_count += 1
-            r_start = get_p_rtime(lines[p_end:p_end + 1], r_end, cumulative)
-            try:
-                p_init, p_end = next_indexes_time(lines, p_init, p_end, gap, section, cumulative, time_stamp)
-            except IndexError as ie:
-                module_logger.error("{0}.Ignoring further partitions.".format(ie))
-                break
-            else:
-                r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
-        # to write the last partition?
-        partname = "%s_%d" % (filename, block_count)
-        write_partition(lines, os.path.join(file_block_dir, partname), p_init, p_end)
-        p_times.append((r_start, r_end))
+            p_times.append((block.real_start, block.real_end))
     else:
+        p_init, p_end = initial_indexes_time(lines, starting_point, section, start_at_end, cumulative, time_stamp)
+        r_start = get_p_rtime(lines[:p_init + 1], 0, cumulative)
+        r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
         write_partition(lines, os.path.join(dest_dir, filename), p_init, p_end)
         p_times.append((r_start, r_end))
-    fdin.close()
     # module_logger.debug("partition times:{0}".format(p_times))
     return p_times
 
 
+def time_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative, time_stamp):
+    """
+    (list, int, int, int, bool, bool, float) -> list of BlockBounds
+
+    Bounds of the blocks of the full file, measuring their size in elapsed time: the first block
+    starts at starting_point seconds and each of the others gap seconds after the previous one.
+    The limits of each block are searched (see TimeSearch) unless the blocks start at the end of
+    the file or the timestamps cannot be searched; then the file is walked line by line.
+    """
+    times, two_columns = line_times(lines)
+    if start_at_end or not two_columns or not is_searchable(times, cumulative, time_stamp):
+        return walked_time_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative, time_stamp)
+
+    search = TimeSearch(times, cumulative, time_stamp)
+    real_times = RealTimes(times, cumulative)
+    p_init, p_end = search.initial_indexes(starting_point, section)
+    r_start = real_times.at(0, p_init + 1, 0)
+    r_end = real_times.at(p_init, p_end, r_start)
+    blocks = []
+    block_count = 1
+    while p_init < p_end < len(lines):
+        blocks.append(BlockBounds(block_count, p_init, p_end, r_start, r_end))
+        block_count += 1
+        r_start = real_times.at(p_end, p_end + 1, r_end)
+        try:
+            p_init, p_end = search.next_indexes(p_init, p_end, gap, section)
+        except IndexError as ie:
+            module_logger.error("{0}.Ignoring further partitions.".format(ie))
+            break
+        else:
+            r_end = real_times.at(p_init, p_end, r_start)
+    # the last partition
+    blocks.append(BlockBounds(block_count, p_init, p_end, r_start, r_end))
+    return blocks
+
+
+class TimeSearch(object):
+    """
+    Limits of the blocks of a file searched with numpy.searchsorted, with the results of the line
+    by line walk of initial_indexes_time and next_indexes_time (which apply test_time_limit to
+    each line):
+
+    - cumulative timestamps: a limit is the first line whose distance to a reference timestamp
+      (the first of the file, or of the previous block) reaches the desired time. The timestamps
+      are searched for reference + time and the candidate is checked with the exact distance.
+    - periodic timestamps: the time elapsed after k lines is k times the mode of the timestamps,
+      added up line by line as the walk does (self.elapsed[k]); the desired time is in
+      seconds and the timestamps in milliseconds.
+    """
+
+    def __init__(self, times, cumulative, time_stamp):
+        self.times = times
+        self.cumulative = cumulative
+        self.time_stamp = time_stamp
+        self.num_lines = len(times)
+        if not cumulative:
+            # elapsed[k]: k time stamps added one at a time, as time_elapsed is (the end of a block is
+            # walked on from the lines its start walked, so a walk may add up to twice the number of lines)
+            self.elapsed = numpy.concatenate(([0.0], numpy.cumsum(numpy.full(2 * self.num_lines + 1, time_stamp))))
+
+    def reached(self, low, reference, desired_time):
+        """
+        First line, from low, whose timestamp is desired_time or more after reference (the
+        number of lines if there is none).
+        """
+        index = max(low, int(numpy.searchsorted(self.times, reference + desired_time, side="left")))
+        # reference + desired_time is rounded: the candidate is corrected with the distance test_time_limit uses
+        while index > low and self.times[index - 1] - reference >= desired_time:
+            index -= 1
+        while index < self.num_lines and self.times[index] - reference < desired_time:
+            index += 1
+        return index
+
+    def steps(self, done, desired_time):
+        """
+        Lines walked, after done lines, while the elapsed time stays under desired_time seconds
+        (more than the number of lines if it never reaches it).
+        """
+        index = int(numpy.searchsorted(self.elapsed, desired_time * 1000, side="left"))
+        if index == len(self.elapsed):
+            return self.num_lines + 1
+        return max(index - done - 1, 0)
+
+    def initial_indexes(self, starting_point, section):
+        """
+        (int, int) -> (int, int)
+
+        The initial and final indexes of the first block (see initial_indexes_time).
+        """
+        if self.cumulative:
+            p_init = self.reached(0, self.time_stamp, starting_point)
+            if p_init == self.num_lines:
+                raise IndexError("list index out of range")
+            if self.times[p_init] - self.time_stamp >= starting_point + section:
+                p_end = p_init
+            else:
+                p_end = self.reached(p_init + 1, self.time_stamp, starting_point + section)
+        else:
+            p_init = self.steps(0, starting_point)
+            if p_init >= self.num_lines:
+                raise IndexError("list index out of range")
+            p_end = p_init + self.steps(p_init, starting_point + section)
+        # the walk stops at the last line, and the first block is left empty if it does not pass p_init
+        if p_end == p_init or p_init == self.num_lines - 1:
+            return p_init, 0
+        return p_init, min(p_end, self.num_lines - 1)
+
+    def next_indexes(self, p_init, p_end, gap, section):
+        """
+        (int, int, int, int) -> (int, int)
+
+        The initial and final indexes of the block after the one starting at p_init and ending
+        at p_end (see next_indexes_time).
+        """
+        if self.cumulative:
+            reference = self.times[p_init]
+            next_init = p_init if gap <= 0 else self.reached(p_init + 1, reference, gap)
+            if next_init == self.num_lines:
+                raise IndexError("list index out of range")
+            if self.times[next_init] - reference >= gap + section:
+                return next_init, p_end
+            return next_init, self.reached(p_end + 1, reference, gap + section)
+        walked = self.steps(0, gap)
+        if p_init + walked >= self.num_lines:
+            raise IndexError("list index out of range")
+        return p_init + walked, min(p_end + self.steps(walked, gap + section), self.num_lines)
+
+
+class RealTimes(object):
+    """
+    Real times of the blocks of a file (see get_p_rtime), from the cumulative sums of its timestamps.
+    """
+
+    def __init__(self, times, cumulative):
+        self.times = times
+        self.cumulative = cumulative
+        self.sums = numpy.concatenate(([0.0], numpy.cumsum(times)))
+
+    def at(self, start, end, real_start):
+        """
+        Real time at the end of lines[start:end], given the real time real_start at its start.
+        """
+        start, end = min(start, len(self.times)), min(end, len(self.times))
+        if end <= start:
+            return real_start
+        if self.cumulative:
+            return float(self.times[end - 1])
+        return real_start + float(self.sums[end] - self.sums[start])
+
+
+def walked_time_block_bounds(lines, starting_point, section, gap, start_at_end, cumulative, time_stamp):
+    """
+    (list, int, int, int, bool, bool, float) -> list of BlockBounds
+
+    Bounds of the blocks of the full file (see time_block_bounds), walking the file line by line
+    with initial_indexes_time and next_indexes_time.
+    """
+    p_init, p_end = initial_indexes_time(lines, starting_point, section, start_at_end, cumulative, time_stamp)
+    r_start = get_p_rtime(lines[:p_init + 1], 0, cumulative)
+    r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
+    blocks = []
+    block_count = 1
+    while p_init < p_end < len(lines):  # p_end < len(lines) and p_end > p_init:
+        blocks.append(BlockBounds(block_count, p_init, p_end, r_start, r_end))
+        block_count += 1
+        r_start = get_p_rtime(lines[p_end:p_end + 1], r_end, cumulative)
+        try:
+            p_init, p_end = next_indexes_time(lines, p_init, p_end, gap, section, cumulative, time_stamp)
+        except IndexError as ie:
+            module_logger.error("{0}.Ignoring further partitions.".format(ie))
+            break
+        else:
+            r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
+    # the last partition
+    blocks.append(BlockBounds(block_count, p_init, p_end, r_start, r_end))
+    return blocks
+
+
 def next_indexes_time(lines, p_init, p_end, gap, section, cumulative, time_stamp):
     """
     (int, int, int) -> (int, int)
@@ -406,11 +746,188 @@ def write_partition(lines, output_file, i_index, f_index):
     return
 
 
+def tail_block_bounds(lines, starting_point, section, by_lines, whole_file):
+    """
+    (list of str, int, int, bool, bool) -> BlockBounds
+
+    Bounds of the block cut from the end of a file (see tail_block), given its last lines, with the
+    indexes of initial_indexes_lines or initial_indexes_time. None if the block may start before
+    the first of the lines (unless they are the whole file) or if there are no lines.
+
+    The real times are those of get_p_rtime for cumulative timestamps; for periodic ones both are
+    measured back from the end of the file (the negative sum of the timestamps from the start, or
+    the end, of the block to the end of the file), as the timestamps before the lines are not read. A block whose start is not found before its end (the walk of initial_indexes_time leaves
+    p_init at 0) is empty.
+    """
+    if not lines:
+        return None
+    cumulative, time_stamp = sniffer(lines[-SAMPLE_SIZE:], True)
+    if by_lines:
+        # initial_indexes_lines on the whole file, counted from its end
+        p_init, p_end = int(-section - 1), int(-starting_point - 1)
+        if not whole_file and -p_init > len(lines):
+            return None
+    else:
+        p_init, p_end = initial_indexes_time(lines, starting_point, section, True, cumulative, time_stamp)
+        # the walk stops at the first line of the lines read, which may not be the first of the file
+        if not whole_file and max(-p_init, -p_end) >= len(lines) - 1:
+            return None
+        if p_init == 0:
+            p_init = p_end
+    if cumulative:
+        r_start = get_p_rtime(lines[p_init:][:1], 0, cumulative)
+        r_end = get_p_rtime(lines[p_init:p_end], r_start, cumulative)
+    else:
+        r_start = -get_p_rtime(lines[p_init:], 0, cumulative)
+        r_end = -get_p_rtime(lines[p_end:], 0, cumulative)
+    return BlockBounds(1, p_init, p_end, r_start, r_end)
+
+
+class TailReader(object):
+    """
+    The last lines of a file, read backwards from its end chunk_size bytes at a time (see
+    reverse_chunks). self.lines holds the complete lines read so far, as read_lines reads them,
+    and self.whole_file is set once the start of the file is reached.
+    """
+
+    def __init__(self, input_name, chunk_size=TAIL_CHUNK_SIZE):
+        self.lines = []
+        self.whole_file = False
+        self.head = ""
+        if util.remove_compression_extension(input_name) != input_name:
+            # compressed files cannot be read from their end
+            self.chunks = iter([])
+            self.lines = read_lines(input_name)
+            self.whole_file = True
+        else:
+            self.chunks = reverse_chunks(input_name, chunk_size)
+
+    def read_more(self):
+        """
+        Read the previous chunk of the file. The first (possibly incomplete) line of the bytes read
+        is kept aside until the chunk before it is read.
+        """
+        try:
+            text = next(self.chunks) + self.head
+        except StopIteration:
+            text, self.whole_file = self.head, True
+        text_lines = text.splitlines(True)
+        if not self.whole_file and text_lines:
+            self.head = text_lines.pop(0)
+        else:
+            self.head = ""
+        text_lines = [universal_line(line) for line in text_lines]
+        self.lines = [line for line in text_lines if line != "\n"] + self.lines
+
+
+def reverse_chunks(input_name, chunk_size=TAIL_CHUNK_SIZE):
+    """
+    (str, int) -> iterator of str
+
+    The bytes of a file, chunk_size at a time, from its end to its start.
+    """
+    with open(input_name, "rb") as fdin:
+        fdin.seek(0, os.SEEK_END)
+        position = fdin.tell()
+        while position > 0:
+            size = min(chunk_size, position)
+            position -= size
+            fdin.seek(position)
+            yield fdin.read(size)
+
+
+def universal_line(line):
+    """
+    (str) -> str
+
+    A line with its line terminator ('\r\n' or '\r') read as '\n', as files opened with
+    universal newlines (see utility_functions.open_text) read it.
+    """
+    if line.endswith("\r\n"):
+        return line[:-2] + "\n"
+    if line.endswith("\r"):
+        return line[:-1] + "\n"
+    return line
+
+
+def blocks_lines(input_name, blocks):
+    """
+    (str, list of BlockBounds) -> list of str
+
+    The lines of a file its blocks are sliced from: only its last lines if every block is counted
+    from the end of the file (see tail_block), all of them otherwise.
+    """
+    if blocks and all(block.start < 0 for block in blocks):
+        reader = TailReader(input_name)
+        while len(reader.lines) < -min(block.start for block in blocks) and not reader.whole_file:
+            reader.read_more()
+        return reader.lines
+    return read_lines(input_name)
+
+
 # AUXILIARY FUNCTIONS
+def read_lines(input_name):
+    """
+    (str) -> list of str
+
+    The lines of a file, without the empty ones.
+    """
+    with util.open_text(input_name) as fdin:
+        return [line for line in fdin.readlines() if line != "\n"]
+
+
+def block_text(lines, start, end):
+    """
+    (list of str, int, int) -> str
+
+    Text of the block file write_partition writes for lines[start:end]: the hrf column of each
+    line (the whole line, for lines without two columns).
+    """
+    values = []
+    for line in lines[start:end]:
+        columns = line.split()
+        values.append(columns[1] if len(columns) == 2 else line.strip())
+    return "".join("%s\n" % value for value in values)
+
+
+def line_times(lines):
+    """
+    (list of str) -> (array, bool)
+
+    The timestamps of the lines (their first column; 0 for the lines without two columns, as
+    get_p_rtime reads them) and whether every line has two columns.
+    """
+    times = numpy.zeros(len(lines))
+    two_columns = True
+    for position, line in enumerate(lines):
+        columns = line.split()
+        if len(columns) == 2:
+            times[position] = float(columns[0])
+        else:
+            two_columns = False
+    return times, two_columns
+
+
+def is_searchable(times, cumulative, time_stamp):
+    """
+    (array, bool, float) -> bool
+
+    Whether the limits of the blocks can be searched: sorted cumulative timestamps, or periodic
+    timestamps with a mode that is not negative.
+    """
+    if cumulative:
+        return bool(numpy.all(times[1:] >= times[:-1]))
+    return time_stamp >= 0
+
+
 def is_block_time_table_empty(block_table):
     return all(map(lambda x: len(block_table[x]) <= 1, block_table))
 
 
+def is_block_index_empty(index):
+    return all(map(lambda x: len(index[x]) < 1, index))
+
+
 def sniffer(lines, start_at_end=False):
     """
     (list, bool) -> (bool, float)
@@ -484,11 +1001,11 @@ def add_parser_options(parser, full_file_option=True, file_blocks_usage=False):
     # correction: 30/03/18 - we will only consider these flags to the FileBlocks
 
     if file_blocks_usage:
-        #  30/03/18: however this one may still be disabled
-        # parser.add_argument("-sae", "--start-at-end", dest="start_at_end",
-        #                     action="store_true",
-        #                     default=False,
-        #                     help="Partition from end of file instead of beginning")
+        parser.add_argument("-sae", "--start-at-end", dest="start_at_end",
+                            action="store_true",
+                            default=False,
+                            help="Cut a single block from the end of each file: the last SECONDS (section) "
+                                 "ending deferred-start SECONDS before the end, reading only the end of the file")
 
         parser.add_argument("-s", "--section", dest="section", metavar="SECONDS",
                             action="store",
@@ -504,7 +1021,8 @@ def add_parser_options(parser, full_file_option=True, file_blocks_usage=False):
                             "--keep-blocks",
                             dest="keep_blocks",
                             action="store_true",
-                            help="After processing file blocks maintain the partitions generated",
+                            help="Also write the blocks into files (in the file_blocks directory); the blocks "
+                                 "are otherwise analysed without writing them",
                             default=False)
         if full_file_option:
             # this flag is disabled, always try to partition the full file during the execution
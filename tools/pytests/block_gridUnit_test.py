@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import block_grid
+from tools import multiscale
+from tools import partition
+import tools.filter
+
+
+class TestBlockGridModule(unittest.TestCase):
+    """
+    Tests for the block_grid module
+
+    All the test use a predetermined file adulterado (with its timestamps) in the unittest_dataset_timed
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_timed'):
+            os.mkdir('unittest_dataset_timed')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_timed', keep_time=True,
+                               cutoff_limits=[50, 250])
+        cls.blocks_dir = tempfile.mkdtemp()
+        partition.partition('unittest_dataset_timed', cls.blocks_dir, 0, 300, 300, full_file=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_timed')
+        shutil.rmtree(cls.blocks_dir)
+
+    def blocks_rows(self, table, values_per_scale):
+        """
+        The rows [block, scale, values...] of a multiscale table of the block files
+        """
+        rows = []
+        for block_name in sorted(table, key=lambda name: int(name.rsplit('_', 1)[1])):
+            values = table[block_name]
+            for position in range(len(values) // values_per_scale):
+                rows.append([int(block_name.rsplit('_', 1)[1]), 2 * position + 1] +
+                            values[position * values_per_scale:(position + 1) * values_per_scale])
+        return rows
+
+    def test_file_blocks(self):
+        """
+        The values of each block are those of the file partition writes for it
+        """
+        lines, bounds = partition.file_blocks('unittest_dataset_timed/adulterado.txt', 0, 300, 300)
+        block_files = os.listdir(os.path.join(self.blocks_dir, 'adulterado_blocks'))
+        self.assertEqual(sorted('adulterado_%d' % block.number for block in bounds), sorted(block_files))
+        for block in bounds:
+            with open(os.path.join(self.blocks_dir, 'adulterado_blocks', 'adulterado_%d' % block.number)) as fdin:
+                self.assertEqual(fdin.read().split(), [line.split()[1] for line in lines[block.start:block.end]])
+
+    def test_grid_entropy(self):
+        """
+        The grid holds the multiscale entropy of every block file
+        """
+        blocks_files = os.path.join(self.blocks_dir, 'adulterado_blocks')
+        for algorithm, mse_variant in (('sampen', 'mse'), ('sampen', 'rcmse'), ('apen', 'mse')):
+            grid = block_grid.grid_entropy('unittest_dataset_timed', 300, 300, 1, 6, 2, algorithm, 2, 0.15,
+                                           mse_variant=mse_variant)
+            expected = multiscale.multiscale_entropy(blocks_files, 1, 6, 2, algorithm, 2, 0.15,
+                                                     mse_variant=mse_variant)
+            self.assertEqual(grid['adulterado.txt'], self.blocks_rows(expected, 1))
+
+    def test_grid_compression(self):
+        """
+        The grid holds the multiscale compression of every block file
+        """
+        grid = block_grid.grid_compression('unittest_dataset_timed', 300, 300, 1, 6, 2, 'gzip', 9,
+                                           with_compression_rate=True)
+        expected = multiscale.multiscale_compression(os.path.join(self.blocks_dir, 'adulterado_blocks'), 1, 6, 2,
+                                                     'gzip', 9, False, True)
+        self.assertEqual(grid['adulterado.txt'], self.blocks_rows(expected, 3))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools import block_views
+from tools import compress
+from tools import entropy
+from tools import partition
+from tools import rqa
+import tools.filter
+
+
+class TestBlockViewsModule(unittest.TestCase):
+    """
+    Tests for the block_views module
+
+    All the test use a predetermined file adulterado (with its timestamps) in the unittest_dataset_views
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_views'):
+            os.mkdir('unittest_dataset_views')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_views', keep_time=True,
+                               cutoff_limits=[50, 250])
+        cls.file_path = 'unittest_dataset_views/adulterado.txt'
+        cls.index = partition.block_index('unittest_dataset_views', 0, 300, 300)
+        cls.blocks_dir = tempfile.mkdtemp()
+        partition.partition('unittest_dataset_views', cls.blocks_dir, 0, 300, 300, full_file=True)
+        cls.block_files = os.path.join(cls.blocks_dir, 'adulterado_blocks')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_views')
+        shutil.rmtree(cls.blocks_dir)
+
+    def block_results(self, table):
+        """
+        The results of a table of the block files, by block number
+        """
+        return dict((int(block_name.rsplit('_', 1)[1]), table[block_name]) for block_name in table)
+
+    def test_block_index(self):
+        """
+        The index holds a block for every block file partition writes, and write_blocks writes the same files
+        """
+        self.assertEqual(list(self.index.keys()), ['adulterado.txt'])
+        self.assertEqual(sorted('adulterado_%d' % block.number for block in self.index['adulterado.txt']),
+                         sorted(os.listdir(self.block_files)))
+        written_dir = tempfile.mkdtemp()
+        try:
+            partition.write_blocks('unittest_dataset_views', written_dir, self.index)
+            for block_name in os.listdir(self.block_files):
+                with open(os.path.join(self.block_files, block_name)) as expected:
+                    with open(os.path.join(written_dir, 'adulterado_blocks', block_name)) as written:
+                        self.assertEqual(written.read(), expected.read())
+        finally:
+            shutil.rmtree(written_dir)
+
+    def test_file_block_index(self):
+        """
+        The lines read to partition a file give its blocks the results of reading it again
+        """
+        file_lines, blocks = partition.file_block_index(self.file_path, 0, 300, 300)
+        self.assertEqual(blocks, self.index['adulterado.txt'])
+        self.assertEqual(file_lines, partition.read_lines(self.file_path))
+        self.assertEqual(block_views.blocks_compression(self.file_path, blocks, 'gzip', 9, file_lines=file_lines),
+                         block_views.blocks_compression(self.file_path, blocks, 'gzip', 9))
+        self.assertEqual(block_views.blocks_rqa(self.file_path, blocks, 2, 1, 0.15, file_lines=file_lines),
+                         block_views.blocks_rqa(self.file_path, blocks, 2, 1, 0.15))
+        tail_lines, tail_blocks = partition.file_block_index(self.file_path, 0, 300, start_at_end=True)
+        self.assertEqual(tail_lines, partition.blocks_lines(self.file_path, tail_blocks))
+        self.assertEqual(block_views.blocks_entropy(self.file_path, tail_blocks, 'sampen', 2, 0.15,
+                                                    file_lines=tail_lines),
+                         block_views.blocks_entropy(self.file_path, tail_blocks, 'sampen', 2, 0.15))
+
+    def test_blocks_compression(self):
+        """
+        The compression of each block is that of its block file
+        """
+        results = block_views.blocks_compression(self.file_path, self.index['adulterado.txt'], 'gzip', 9,
+                                                 with_compression_rate=True)
+        expected = compress.compress(self.block_files, 'gzip', 9, False, True)
+        self.assertEqual(results, self.block_results(expected))
+
+    def test_blocks_entropy(self):
+        """
+        The entropy of each block is that of its block file, with the same tolerances
+        """
+        stds = entropy.calculate_std(self.block_files)
+        for algorithm in ('sampen', 'apen'):
+            results = block_views.blocks_entropy(self.file_path, self.index['adulterado.txt'], algorithm, 2, 0.15)
+            expected = entropy.entropy(self.block_files, algorithm, 2,
+                                       dict((name, stds[name] * 0.15) for name in stds))
+            self.assertEqual(results, self.block_results(expected))
+        results = block_views.blocks_entropy(self.file_path, self.index['adulterado.txt'], 'sampen', 2, 5,
+                                             use_sd_tolerance=False)
+        expected = entropy.entropy(self.block_files, 'sampen', 2, dict((name, 5) for name in stds))
+        self.assertEqual(results, self.block_results(expected))
+
+    def test_blocks_rqa(self):
+        """
+        The RQA measures of each block are those of its block file
+        """
+        stds = entropy.calculate_std(self.block_files)
+        results = block_views.blocks_rqa(self.file_path, self.index['adulterado.txt'], 2, 1, 0.15)
+        expected = rqa.rqa(self.block_files, 2, 1, dict((name, stds[name] * 0.15) for name in stds))
+        self.assertEqual(results, self.block_results(expected))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
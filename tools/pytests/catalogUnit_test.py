@@ -0,0 +1,76 @@
+import tools.catalog
+import tools.dataset
+import unittest
+import os
+import shutil
+import numpy
+
+
+class TestCatalogModule(unittest.TestCase):
+    """Test functions in catalog module"""
+
+    def setUp(self):
+        if not os.path.exists('unittest_catalog'):
+            os.mkdir('unittest_catalog')
+        with open('unittest_catalog/series.txt', 'w') as fdout:
+            fdout.write("\n".join(["60", "70", "20", "300", "80"]) + "\n")
+        open('unittest_catalog/empty.txt', 'w').close()
+        with open('unittest_catalog/broken.txt', 'w') as fdout:
+            fdout.write("60\nabc\n")
+
+    def tearDown(self):
+        shutil.rmtree('unittest_catalog')
+
+    def test_catalog_stats(self):
+        catalog = tools.catalog.dataset_catalog('unittest_catalog')
+        self.assertEqual(sorted(catalog), ['empty.txt', 'series.txt'])
+        values = numpy.array([60, 70, 20, 300, 80], dtype=numpy.float64)
+        self.assertEqual(catalog['series.txt'].points, 5)
+        self.assertEqual(catalog['series.txt'].mean, numpy.mean(values))
+        self.assertEqual(catalog['series.txt'].std, numpy.std(values))
+        self.assertEqual(catalog['series.txt'].loss_ratio, 0.4)
+        self.assertEqual(catalog['empty.txt'].points, 0)
+        self.assertTrue(numpy.isnan(catalog['empty.txt'].std))
+        self.assertTrue(os.path.exists(os.path.join('unittest_catalog', tools.catalog.CATALOG_NAME)))
+
+    def test_catalog_is_reused(self):
+        """
+        Test that the stored statistics are used while a file is unchanged and computed
+        again once it changes.
+    """
+        tools.catalog.dataset_catalog('unittest_catalog')
+        original_stats = tools.catalog.series_stats
+        read_files = []
+
+        def counted_stats(filename, cutoff_limits):
+            read_files.append(os.path.basename(filename))
+            return original_stats(filename, cutoff_limits)
+        try:
+            tools.catalog.series_stats = counted_stats
+            self.assertEqual(tools.catalog.dataset_catalog('unittest_catalog')['series.txt'].points, 5)
+        finally:
+            tools.catalog.series_stats = original_stats
+        # only the file that could not be read is read again
+        self.assertEqual(read_files, ['broken.txt'])
+
+        with open('unittest_catalog/series.txt', 'a') as fdout:
+            fdout.write("90\n")
+        os.utime('unittest_catalog/series.txt', (0, 0))
+        self.assertEqual(tools.catalog.dataset_catalog('unittest_catalog')['series.txt'].points, 6)
+
+    def test_container_catalog(self):
+        tools.dataset.pack_dataset('unittest_dataset', 'unittest_catalog.tsds')
+        try:
+            catalog = tools.catalog.dataset_catalog('unittest_catalog.tsds')
+            self.assertTrue(os.path.exists('unittest_catalog.tsds' + tools.catalog.CATALOG_EXTENSION))
+            for filename in catalog:
+                series = tools.dataset.read_entry('unittest_catalog.tsds', filename)
+                self.assertEqual(catalog[filename].points, len(series))
+                self.assertEqual(catalog[filename].std, numpy.std(series))
+        finally:
+            os.remove('unittest_catalog.tsds')
+            os.remove('unittest_catalog.tsds' + tools.catalog.CATALOG_EXTENSION)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
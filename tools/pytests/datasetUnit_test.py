@@ -0,0 +1,91 @@
+import os
+import shutil
+import unittest
+
+import numpy
+
+from tools import dataset
+from tools import entropy
+from tools import utility_functions as util
+import tools.filter
+
+
+class TestDatasetModule(unittest.TestCase):
+    """
+    Tests for the dataset module
+
+    All the test use a predetermined file adulterado in the unittest_dataset_filtered
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+        tools.filter.ds_filter('unittest_dataset/S0001312.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+        dataset.pack_dataset('unittest_dataset_filtered', 'unittest_dataset_filtered.tsds')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_filtered')
+        os.remove('unittest_dataset_filtered.tsds')
+
+    def test_entries(self):
+        """
+        The container lists its series and returns them as zero-copy slices
+        """
+        self.assertTrue(util.is_dataset_dir('unittest_dataset_filtered.tsds'))
+        self.assertEqual(util.listdir_no_hidden('unittest_dataset_filtered.tsds'), ['S0001312.txt', 'adulterado.txt'])
+        for name in ['S0001312.txt', 'adulterado.txt']:
+            series = util.load_series(os.path.join('unittest_dataset_filtered.tsds', name))
+            self.assertIsInstance(series, numpy.memmap)
+            self.assertEqual(series.tolist(),
+                             util.load_series(os.path.join('unittest_dataset_filtered', name)).tolist())
+
+    def test_same_entropy(self):
+        """
+        The modules give the same results for the container and for the directory
+        """
+        tolerances = {'S0001312.txt': 0.2, 'adulterado.txt': 0.2}
+        self.assertEqual(entropy.entropy('unittest_dataset_filtered.tsds', 'sampen', 2, tolerances),
+                         entropy.entropy('unittest_dataset_filtered', 'sampen', 2, tolerances))
+
+    def test_unpack(self):
+        """
+        Unpacking writes the series as they were filtered
+        """
+        dataset.unpack_dataset('unittest_dataset_filtered.tsds', 'unittest_dataset_filtered/unpacked')
+        with open('unittest_dataset_filtered/adulterado.txt') as fdorig:
+            with open('unittest_dataset_filtered/unpacked/adulterado.txt') as fdunpacked:
+                self.assertEqual(fdorig.read(), fdunpacked.read())
+        shutil.rmtree('unittest_dataset_filtered/unpacked')
+
+
+    def test_unpack_timestamps(self):
+        """
+        Unpacking writes the timestamps as they were read, or as the same numbers if they have no single format
+        """
+        packed_dir = 'unittest_dataset_filtered/timestamps'
+        os.mkdir(packed_dir)
+        try:
+            for name, text in [('integer.txt', "250 139.198\n250 139.751\n251 139.294\n"),
+                               ('decimals.txt', "0.001 164.000\n0.501 166.000\n1.001 166.999\n"),
+                               ('mixed.txt', "0.1 164.000\n0.25 166.000\n1.5 166.999\n")]:
+                with open(os.path.join(packed_dir, name), "w") as fdout:
+                    fdout.write(text)
+            dataset.pack_dataset(packed_dir, packed_dir + '.tsds', keep_time=True)
+            dataset.unpack_dataset(packed_dir + '.tsds', os.path.join(packed_dir, 'unpacked'))
+            for name in ['integer.txt', 'decimals.txt']:
+                with open(os.path.join(packed_dir, name)) as fdorig:
+                    with open(os.path.join(packed_dir, 'unpacked', name)) as fdunpacked:
+                        self.assertEqual(fdorig.read(), fdunpacked.read())
+            self.assertEqual(util.load_series(os.path.join(packed_dir, 'unpacked', 'mixed.txt'), col_index=0).tolist(),
+                             [0.1, 0.25, 1.5])
+        finally:
+            shutil.rmtree(packed_dir)
+            os.remove(packed_dir + '.tsds')
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
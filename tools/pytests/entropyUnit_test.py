@@ -1,11 +1,29 @@
 import os
 import shutil
 import unittest
+from collections import Counter
+
+import numpy
 
 from tools import entropy
+from tools.pyeeg import samp_entropy
 import tools.filter
 
 
+def cce_reference(x, max_length, levels):
+    """Corrected conditional entropy counting the patterns as tuples"""
+    symbols = list(entropy.quantize(x, levels))
+    shannon = [0.0]
+    corrected = []
+    for length in range(1, max_length + 1):
+        counts = Counter(tuple(symbols[i:i + length]) for i in range(len(symbols) - length + 1))
+        total = float(sum(counts.values()))
+        shannon.append(-sum((c / total) * numpy.log(c / total) for c in counts.values()))
+        unique = sum(1 for c in counts.values() if c == 1) / total
+        corrected.append(shannon[length] - shannon[length - 1] + unique * shannon[1])
+    return min(corrected)
+
+
 class TestEntropyModule(unittest.TestCase):
     """
     Tests for the entropy module
@@ -26,5 +44,45 @@ class TestEntropyModule(unittest.TestCase):
 
     # TODO: add unit-tests similar to "compressUnit_test.py"
 
+    def test_cce_matches_reference(self):
+        """
+        The rolling pattern codes must count the same patterns as the tuples
+        """
+        x = numpy.random.RandomState(1).randn(500).cumsum()
+        for levels in (2, 6):
+            self.assertAlmostEqual(entropy.corrected_conditional_entropy(x, 8, levels), cce_reference(x, 8, levels))
+
+    def test_cce_file(self):
+        """
+        cce is available through the entry point, as the other algorithms
+        """
+        result = entropy.entropy('unittest_dataset_filtered/adulterado.txt', 'cce', 10, {'adulterado.txt': None},
+                                 levels=6)
+        self.assertEqual(result['adulterado.txt'].points, 5960)
+        self.assertTrue(0 < result['adulterado.txt'].entropy < numpy.log(6))
+
+    def test_sampen_match_counts(self):
+        """
+        The batched match counts give pyeeg's sample entropy for series of different lengths
+        """
+        random_state = numpy.random.RandomState(2)
+        series_list = [random_state.rand(300), random_state.rand(299), random_state.randn(297).cumsum()]
+        m_counts, m1_counts = entropy.sampen_match_counts(series_list, 2, 0.2, tile_pairs=5000)
+        for series, m_count, m1_count in zip(series_list, m_counts, m1_counts):
+            self.assertEqual(entropy.sampen_from_counts(m_count, m1_count), samp_entropy(series, 2, 0.2))
+
+    def test_refined_composite_sampen(self):
+        """
+        The refined composite sample entropy adds up the match counts of all the series
+        """
+        random_state = numpy.random.RandomState(3)
+        series_list = [random_state.rand(40), random_state.rand(39)]
+        m_counts, m1_counts = entropy.sampen_match_counts(series_list, 2, 0.1)
+        result = entropy.composite_entropy_of_series(series_list, 'sampen', 2, 0.1, refined=True)
+        self.assertEqual(result.points, 79)
+        self.assertEqual(result.entropy, numpy.log(float(m_counts.sum()) / m1_counts.sum()))
+        self.assertRaises(ValueError, entropy.composite_entropy_of_series, series_list, 'apen', 2, 0.1, None, True)
+
+
 if __name__ == '__main__':
     unittest.main(exit=False, verbosity=2)
@@ -63,6 +63,78 @@ class TestCleanModule(unittest.TestCase):
         fdclean.close()
         shutil.rmtree('unittest_dataset_filtered')
 
+    def test_chunks_match_line_by_line(self):
+        """
+        Test that filtering in chunks (and in parallel) gives the same files as filtering line by line,
+        with and without timestamps, limits and rounding.
+    """
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        for keep_time in (False, True):
+            for round_to_int in (False, True):
+                tools.filter.ds_filter('unittest_dataset', 'unittest_dataset_filtered', keep_time,
+                                       cutoff_limits=[50, 250], round_to_int=round_to_int, jobs=2)
+                for filename in os.listdir('unittest_dataset'):
+                    chunked_file = os.path.join('unittest_dataset_filtered', 'chunked')
+                    tools.filter.clean_file(os.path.join('unittest_dataset', filename), chunked_file, keep_time,
+                                            [50, 250], round_to_int, chunk_lines=1000)
+                    tools.filter.clean_file_by_line(os.path.join('unittest_dataset', filename),
+                                                    os.path.join('unittest_dataset_filtered', 'by_line'), keep_time,
+                                                    [50, 250], round_to_int)
+                    with open(os.path.join('unittest_dataset_filtered', 'by_line')) as fdline:
+                        by_line = fdline.read()
+                    with open(chunked_file) as fdchunk:
+                        self.assertEqual(fdchunk.read(), by_line)
+                    with open(os.path.join('unittest_dataset_filtered', filename)) as fdparallel:
+                        self.assertEqual(fdparallel.read(), by_line)
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_compressed_input(self):
+        """
+        Test that a gzip compressed file is filtered as the uncompressed one, into a file
+        without the compression extension.
+    """
+        import gzip
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        os.mkdir('unittest_dataset_filtered/gz')
+        with open('unittest_dataset/S0001312.txt', 'rb') as fdin:
+            fdout = gzip.open('unittest_dataset_filtered/gz/S0001312.txt.gz', 'wb')
+            fdout.write(fdin.read())
+            fdout.close()
+        tools.filter.ds_filter('unittest_dataset_filtered/gz', 'unittest_dataset_filtered', keep_time=True)
+        tools.filter.clean_file('unittest_dataset/S0001312.txt', 'unittest_dataset_filtered/plain', True, None)
+        with open('unittest_dataset_filtered/plain') as fdplain:
+            with open('unittest_dataset_filtered/S0001312.txt') as fdgz:
+                self.assertEqual(fdgz.read(), fdplain.read())
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_channels_match_single_channel(self):
+        """
+        Test that filtering several channels in one pass gives, for each channel, the same file as
+        filtering that channel alone with its own cutoff limits.
+    """
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        input_file = 'unittest_dataset/caso23,IMSP.TxSP3'
+        channels = [(1, 'unittest_dataset_filtered/col1', [50, 250]), (3, 'unittest_dataset_filtered/col3', None)]
+        for keep_time in (False, True):
+            tools.filter.clean_file_channels(input_file, channels, keep_time, chunk_lines=1000)
+            for hrf_col, dest_file, cutoff_limits in channels:
+                tools.filter.clean_file(input_file, 'unittest_dataset_filtered/single', keep_time, cutoff_limits,
+                                        hrf_col=hrf_col)
+                with open('unittest_dataset_filtered/single') as fdsingle:
+                    with open(dest_file) as fdchannel:
+                        self.assertEqual(fdchannel.read(), fdsingle.read())
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_channel_cutoff_limits(self):
+        """
+        Test that the limits of a channel override the common limits only for that channel.
+    """
+        self.assertEqual(tools.filter.channel_cutoff_limits([1, 3, 4], [50, 250], [[4, 0, 127]]),
+                         {1: [50, 250], 3: [50, 250], 4: [0, 127]})
+
 
 if __name__ == '__main__':
     unittest.main(exit=False)
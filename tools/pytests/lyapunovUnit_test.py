@@ -0,0 +1,94 @@
+import os
+import shutil
+import unittest
+
+import numpy
+
+from tools import lyapunov
+import tools.filter
+
+
+def reference_neighbours(em, T):
+    """N x N nearest neighbour search of pyeeg.LLE (the lowest index among equal distances)"""
+    M = len(em)
+    D = numpy.sqrt(((em[:, None, :] - em[None, :, :]) ** 2).sum(axis=2))
+    D[numpy.abs(numpy.arange(M)[:, None] - numpy.arange(M)[None, :]) <= T] = numpy.inf
+    return D.argmin(axis=0)
+
+
+def rosenstein_reference(x, tau, n, T, fs):
+    """N x N implementation of the Rosenstein algorithm (pyeeg.LLE) used as reference"""
+    em = lyapunov.embed_seq(numpy.asarray(x, dtype=float), tau, n)
+    M = len(em)
+    neighbours = reference_neighbours(em, T)
+    mean_d = []
+    for i in range(M):
+        valid = [j for j in range(M) if j + i <= M - 1 and neighbours[j] + i <= M - 1]
+        if not valid:
+            break
+        dists = numpy.array([numpy.sqrt(((em[j + i] - em[neighbours[j] + i]) ** 2).sum()) for j in valid])
+        dists[dists == 0] = 1
+        mean_d.append(numpy.log(dists).sum() / len(valid))
+    return fs * numpy.polyfit(numpy.arange(len(mean_d)), mean_d, 1)[0]
+
+
+class TestLyapunovModule(unittest.TestCase):
+    """
+    Tests for the lyapunov module
+
+    All the test use a predetermined file adulterado in the unittest_dataset_filtered
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_neighbour_searches_agree(self):
+        """
+        The k-d tree and the blocked search must find the same neighbours outside the Theiler window
+        """
+        em = lyapunov.embed_seq(numpy.random.RandomState(0).randn(300), 1, 3)
+        kdtree = lyapunov.theiler_nearest_neighbours(em, 5)
+        blocked = lyapunov.blocked_nearest_neighbours(em, 5, block_size=37)
+        self.assertTrue((kdtree == blocked).all())
+        self.assertTrue((numpy.abs(kdtree - numpy.arange(len(em))) > 5).all())
+
+    def test_repeated_values(self):
+        """
+        Among neighbours at the same distance the lowest index is taken, as pyeeg.LLE does
+        """
+        x = numpy.random.RandomState(2).randint(0, 3, 400).astype(float)
+        em = lyapunov.embed_seq(x, 1, 2)
+        for T in (0, 5, 20):
+            expected = reference_neighbours(em, T)
+            self.assertTrue((lyapunov.theiler_nearest_neighbours(em, T) == expected).all())
+            self.assertTrue((lyapunov.blocked_nearest_neighbours(em, T, block_size=37) == expected).all())
+        self.assertAlmostEqual(lyapunov.largest_lyapunov_exponent(x, 1, 2, 5, 4),
+                               rosenstein_reference(x, 1, 2, 5, 4))
+
+    def test_matches_reference(self):
+        """
+        Test the exponent against the N x N implementation of the algorithm
+        """
+        x = numpy.random.RandomState(1).randn(150).cumsum()
+        self.assertAlmostEqual(lyapunov.largest_lyapunov_exponent(x, 2, 3, 4, 4),
+                               rosenstein_reference(x, 2, 3, 4, 4))
+
+    def test_file_entry_point(self):
+        """
+        Test the entry function on the filtered file
+        """
+        result = lyapunov.lyapunov('unittest_dataset_filtered/adulterado.txt', 1, 2, 10, 4, max_steps=50)
+        self.assertEqual(list(result.keys()), ['adulterado.txt'])
+        self.assertEqual(result['adulterado.txt'].points, 5960)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
@@ -1,8 +1,12 @@
 import os
+import numpy
 import shutil
+import tempfile
 import unittest
 
 from tools import multiscale
+import tools.compress
+import tools.utility_functions as util
 import tools.filter
 
 
@@ -24,7 +28,153 @@ class TestMultiscaleModule(unittest.TestCase):
     def tearDownClass(cls):
         shutil.rmtree('unittest_dataset_filtered')
 
-    # TODO: add unit-tests similar to "compressUnit_test.py"
+    def test_scales_in_memory(self):
+        """
+        The scales built in memory are the text of the scale files, and compress the same.
+        """
+        scales_dir = 'unittest_dataset_filtered_Scales'
+        multiscale.create_scales('unittest_dataset_filtered', scales_dir, 1, 4, 1, -1, False)
+        try:
+            compression_table = multiscale.multiscale_compression('unittest_dataset_filtered', 1, 4, 1, 'gzip', 9,
+                                                                  False, False)
+            for scale in range(1, 4):
+                scale_file = os.path.join(scales_dir, "Scale %d" % scale, 'adulterado.txt')
+                with open(scale_file) as fdin:
+                    series = util.load_series('unittest_dataset_filtered/adulterado.txt', col_index=-1)
+                    self.assertEqual(fdin.read().splitlines(),
+                                     multiscale.scale_lines(multiscale.coarse_grain(series, [scale])[0], False))
+                file_results = tools.compress.compress(scale_file, 'gzip', 9)['adulterado.txt']
+                self.assertEqual(compression_table['adulterado.txt'][2 * (scale - 1):2 * scale],
+                                 [file_results.original, file_results.compressed])
+        finally:
+            shutil.rmtree(scales_dir)
+
+    def test_coarse_grain(self):
+        """
+        Every scale is the mean of each window, as numpy.mean gives it, for integer valued series
+        (cumulative sum) and any other series alike.
+        """
+        random_state = numpy.random.RandomState(0)
+        for series in (random_state.randint(300, 1500, 1001).astype(float), random_state.rand(1001) * 200 - 50):
+            for mul_order, round_to_int in ((-1, False), (3, False), (-1, True), (7, True)):
+                pyramid = multiscale.coarse_grain(series, range(1, 21), mul_order, round_to_int)
+                for scale, scaled in zip(range(1, 21), pyramid):
+                    expected = []
+                    for index in range(0, len(series) - scale + 1, scale):
+                        value = numpy.mean(series[index:index + scale])
+                        if mul_order != -1:
+                            value *= mul_order
+                        expected.append(round(value) if round_to_int else value)
+                    self.assertEqual(scaled.tolist(), expected)
+
+    def test_offset_scales(self):
+        series = numpy.arange(10, dtype=float)
+        self.assertEqual([scaled.tolist() for scaled in multiscale.offset_scales(series, 3)],
+                         [[1.0, 4.0, 7.0], [2.0, 5.0, 8.0], [3.0, 6.0]])
+
+    def test_composite_scale_one(self):
+        """
+        At scale 1 there is a single coarse-grained series, so every variant gives the same entropy
+        """
+        rows = [multiscale.multiscale_entropy('unittest_dataset_filtered', 1, 3, 1, 'sampen', 2, 0.15,
+                                              mse_variant=variant)['adulterado.txt']
+                for variant in multiscale.MSE_VARIANTS]
+        self.assertEqual(rows[0][0], rows[1][0])
+        self.assertEqual(rows[0][0], rows[2][0])
+
+    def test_schedule_scale_tasks(self):
+        """
+        The tasks are sorted by their cost, the scale 1 of sampen (quadratic) costing 400 times the scale 20
+        """
+        series_files = [multiscale.SeriesFile('adulterado.txt', 'adulterado.npy', 5960, None)]
+        tasks = multiscale.schedule_scale_tasks(series_files, range(1, 21),
+                                                lambda points, scale: multiscale.entropy_cost('sampen', points,
+                                                                                              scale, 2))
+        self.assertEqual([task.scale for task in tasks], list(range(1, 21)))
+        self.assertEqual(tasks[0].cost, 5960 ** 2)
+        self.assertEqual(tasks[-1].cost, (5960 // 20) ** 2)
+
+    def test_jobs(self):
+        """
+        The scheduled tasks give the same tables as the files computed in order
+        """
+        for jobs in (1, 2):
+            compression_table = multiscale.multiscale_compression('unittest_dataset_filtered', 1, 6, 2, 'gzip', 9,
+                                                                  False, True, jobs=jobs)
+            entropy_table = multiscale.multiscale_entropy('unittest_dataset_filtered', 1, 6, 2, 'sampen', 2, 0.15,
+                                                          mse_variant='rcmse', jobs=jobs)
+            mse_table = multiscale.multiscale_entropy('unittest_dataset_filtered', 1, 6, 2, 'apen', 2, 0.15,
+                                                      jobs=jobs)
+            if jobs == 1:
+                expected = compression_table, entropy_table, mse_table
+        self.assertEqual((compression_table, entropy_table, mse_table), expected)
+
+    def test_series_file_task(self):
+        """
+        Each file is parsed once into a .npy file the tasks load, with the tolerance of the file
+        """
+        series_dir = tempfile.mkdtemp()
+        try:
+            file_path = 'unittest_dataset_filtered/adulterado.txt'
+            series_file = multiscale.series_file_task(('adulterado.txt', file_path,
+                                                       os.path.join(series_dir, '0.npy'), (1, 0.15, True, -1, False)))
+            series = util.load_series(file_path)
+            self.assertEqual(series_file.points, len(series))
+            self.assertEqual(numpy.load(series_file.series_file, mmap_mode='r').tolist(), series.tolist())
+            self.assertEqual(series_file.tolerance, multiscale.tolerance_of_file(series, 1, 0.15, True, -1, False))
+        finally:
+            shutil.rmtree(series_dir)
+
+    def test_entropy_slopes(self):
+        """
+        The slopes file holds the slopes of the entropies of each file against the scales
+        """
+        results_name = 'unittest_dataset_filtered_multiscale_sampen.csv'
+        entropy_table = multiscale.multiscale_entropy('unittest_dataset_filtered', 1, 6, 2, 'sampen', 2, 0.15)
+        with open(results_name, 'w') as fdout:
+            fdout.write('Filename;Scale_1_Entropy;Scale_3_Entropy;Scale_5_Entropy\n')
+            fdout.write('adulterado.txt;%s\n' % ';'.join(repr(value) for value in entropy_table['adulterado.txt']))
+        try:
+            slopes_name = multiscale.entropy_slopes(results_name, [1, 3, 5], ';', round_digits=6)
+            with open(slopes_name) as fdin:
+                header, row = fdin.read().splitlines()
+            self.assertEqual(header, 'Filename;Slope_1:3;Slope_1:5')
+            entropies = entropy_table['adulterado.txt']
+            self.assertEqual(row.split(';')[0], 'adulterado.txt')
+            self.assertEqual(float(row.split(';')[1]), round((entropies[1] - entropies[0]) / 2, 6))
+            self.assertAlmostEqual(float(row.split(';')[2]), (entropies[2] - entropies[0]) / 4, places=6)
+            os.remove(slopes_name)
+        finally:
+            os.remove(results_name)
+
+    def test_scales_manifest(self):
+        """
+        Complete scales are reused; scales of other parameters or with missing files are rebuilt
+        """
+        scales_dir = 'unittest_dataset_filtered_Scales'
+        try:
+            multiscale.create_scales('unittest_dataset_filtered', scales_dir, 1, 3, 1, -1, False)
+            scale_file = os.path.join(scales_dir, 'Scale 1', 'adulterado.txt')
+            os.utime(scale_file, (1000, 1000))
+            multiscale.create_scales('unittest_dataset_filtered', scales_dir, 1, 4, 1, -1, False)
+            self.assertEqual(os.stat(scale_file).st_mtime, 1000)
+            self.assertEqual(multiscale.read_scales_manifest(scales_dir)['scales'], [1, 2, 3])
+
+            os.remove(os.path.join(scales_dir, 'Scale 2', 'adulterado.txt'))
+            multiscale.create_scales('unittest_dataset_filtered', scales_dir, 1, 4, 1, -1, False)
+            self.assertTrue(os.path.exists(os.path.join(scales_dir, 'Scale 2', 'adulterado.txt')))
+
+            multiscale.create_scales('unittest_dataset_filtered', scales_dir, 1, 2, 1, 10, True)
+            self.assertNotEqual(os.stat(scale_file).st_mtime, 1000)
+            self.assertEqual(multiscale.read_scales_manifest(scales_dir)['scales'], [1])
+        finally:
+            shutil.rmtree(scales_dir)
+
+    def test_short_series(self):
+        pyramid = multiscale.coarse_grain([1.0, 2.0, 4.0], [2, 4], 10, True)
+        self.assertEqual(multiscale.scale_lines(pyramid[0], True), ['15'])
+        self.assertEqual(multiscale.scale_lines(pyramid[1], True), [])
+        self.assertEqual(multiscale.scale_lines(multiscale.coarse_grain([1.0, 2.0, 4.0], [2])[0], False), ['1.500'])
 
 if __name__ == '__main__':
     unittest.main(exit=False, verbosity=2)
@@ -1,5 +1,6 @@
 import os
 import shutil
+import tempfile
 import unittest
 
 from tools import partition
@@ -24,7 +25,90 @@ class TestPartitionModule(unittest.TestCase):
     def tearDownClass(cls):
         shutil.rmtree('unittest_dataset_filtered')
 
-    # TODO: add unit-tests similar to "compressUnit_test.py"
+    def assertSameBlocks(self, lines, starting_point, section, gap, cumulative, time_stamp):
+        searched = partition.time_block_bounds(lines, starting_point, section, gap, False, cumulative, time_stamp)
+        walked = partition.walked_time_block_bounds(lines, starting_point, section, gap, False, cumulative,
+                                                    time_stamp)
+        self.assertEqual([block[:3] for block in searched], [block[:3] for block in walked])
+        for searched_block, walked_block in zip(searched, walked):
+            self.assertAlmostEqual(searched_block.real_start, walked_block.real_start, places=3)
+            self.assertAlmostEqual(searched_block.real_end, walked_block.real_end, places=3)
+
+    def test_time_block_bounds_cumulative(self):
+        """
+        The searched limits of the blocks of a file with cumulative timestamps are those of the walk
+        """
+        lines = []
+        time = 0.0
+        for position in range(2000):
+            time += (0.25, 0.5, 1.3)[position % 3]
+            lines.append("%.2f %d\n" % (time, 100 + position % 7))
+        cumulative, time_stamp = partition.sniffer(lines[:partition.SAMPLE_SIZE])
+        self.assertTrue(cumulative)
+        for starting_point, section, gap in ((0, 300, 300), (0, 120, 60), (30, 60, 200), (0, 60, 0)):
+            self.assertSameBlocks(lines, starting_point, section, gap, cumulative, time_stamp)
+        # the first block starts after the end of the file
+        self.assertRaises(IndexError, partition.time_block_bounds, lines, 5000, 1, 1, False, cumulative, time_stamp)
+
+    def test_time_block_bounds_periodic(self):
+        """
+        The searched limits of the blocks of a file with periodic timestamps are those of the walk
+        """
+        lines = ["%d %d\n" % ((250, 250, 500)[position % 3], 100) for position in range(2000)]
+        cumulative, time_stamp = partition.sniffer(lines[:partition.SAMPLE_SIZE])
+        self.assertFalse(cumulative)
+        for starting_point, section, gap in ((0, 300, 300), (0, 120, 60), (30, 60, 200)):
+            self.assertSameBlocks(lines, starting_point, section, gap, cumulative, time_stamp)
+
+    def test_tail_block(self):
+        """
+        The block cut from the end of a file, reading only its end, spans the lines of the file the
+        first block of the partition from its end spans
+        """
+        lines = []
+        time = 0.0
+        for position in range(2000):
+            time += (0.25, 0.5, 1.3)[position % 3]
+            lines.append("%.2f %d\n" % (time, 100 + position % 7))
+        file_path = os.path.join(tempfile.mkdtemp(), 'tail.txt')
+        try:
+            with open(file_path, 'w') as fdout:
+                fdout.write("".join(lines))
+            cumulative, time_stamp = partition.sniffer(lines[-partition.SAMPLE_SIZE:], True)
+            for starting_point, section in ((0, 60), (30, 300), (0, 1000)):
+                tail_lines, block = partition.tail_block(file_path, starting_point, section, chunk_size=256)
+                if section < 1000:
+                    self.assertLess(len(tail_lines), len(lines))
+                p_init, p_end = partition.initial_indexes_time(lines, starting_point, section, True, cumulative,
+                                                               time_stamp)
+                self.assertEqual(tail_lines[block.start:block.end], lines[p_init:p_end])
+            tail_lines, block = partition.tail_block(file_path, 10, 100, lines=True, chunk_size=256)
+            self.assertEqual(tail_lines[block.start:block.end], lines[-101:-11])
+        finally:
+            shutil.rmtree(os.path.dirname(file_path))
+
+    def test_tail_block_periodic_real_times(self):
+        """
+        The real times of a block cut from the end of a file with periodic timestamps are both measured
+        back from the end of the file
+        """
+        lines = ["%d %d\n" % ((250, 250, 500)[position % 3], 100) for position in range(2000)]
+        file_path = os.path.join(tempfile.mkdtemp(), 'tail.txt')
+        try:
+            with open(file_path, 'w') as fdout:
+                fdout.write("".join(lines))
+            for starting_point, section, by_lines in ((0, 60, False), (30, 300, False), (10, 100, True)):
+                tail_lines, block = partition.tail_block(file_path, starting_point, section, by_lines,
+                                                         chunk_size=256)
+                times = [float(line.split()[0]) for line in tail_lines]
+                self.assertEqual(block.real_start, -sum(times[block.start:]))
+                self.assertEqual(block.real_end, -sum(times[block.end:]))
+                self.assertLess(block.real_start, block.real_end)
+                self.assertLessEqual(block.real_end, 0)
+                self.assertEqual(block.real_end - block.real_start, sum(times[block.start:block.end]))
+        finally:
+            shutil.rmtree(os.path.dirname(file_path))
+
 
 if __name__ == '__main__':
     unittest.main(exit=False, verbosity=2)
@@ -0,0 +1,74 @@
+import tools.results
+import unittest
+import os
+import csv
+import shutil
+
+
+class TestResultsModule(unittest.TestCase):
+    """Test functions in results module"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_results'):
+            os.mkdir('unittest_results')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_results')
+
+    def read_rows(self, outfile):
+        with open(outfile) as fdin:
+            return list(csv.reader(fdin, delimiter=';'))
+
+    def test_rows_available_while_open(self):
+        """
+        Test that the rows written are in the file before the results are closed.
+    """
+        results_file = tools.results.open_results('unittest_results/open.csv', ['Filename', 'Entropy'], ';')
+        tools.results.write_rows(results_file, [['b.txt', 0.5]])
+        self.assertEqual(self.read_rows('unittest_results/open.csv'), [['Filename', 'Entropy'], ['b.txt', '0.5']])
+        tools.results.write_rows(results_file, [['a.txt', 0.25]])
+        self.assertTrue(tools.results.close_results(results_file))
+        self.assertEqual(self.read_rows('unittest_results/open.csv'),
+                         [['Filename', 'Entropy'], ['b.txt', '0.5'], ['a.txt', '0.25']])
+
+    def test_sorted_results(self):
+        """
+        Test that the sort-merge over several runs sorts block numbers numerically and file names
+        as text, keeping the order of rows with the same key.
+    """
+        for rows, numeric_key, expected in (([[10, 'x'], [2, 'y'], [1, 'z'], [2, 'w']], True,
+                                             [['1', 'z'], ['2', 'y'], ['2', 'w'], ['10', 'x']]),
+                                            ([['c.txt', 1], ['a.txt', 2], ['b.txt', 3]], False,
+                                             [['a.txt', '2'], ['b.txt', '3'], ['c.txt', '1']]),
+                                            ([['2', 1], ['10', 2], ['1', 3]], False,
+                                             [['1', '3'], ['10', '2'], ['2', '1']])):
+            results_file = tools.results.open_results('unittest_results/sorted.csv', ['Key', 'Value'], ';')
+            tools.results.write_rows(results_file, rows)
+            results_file.fdout.close()
+            tools.results.sort_results('unittest_results/sorted.csv', ';', run_rows=2, numeric_key=numeric_key)
+            self.assertEqual(self.read_rows('unittest_results/sorted.csv'), [['Key', 'Value']] + expected)
+
+    def test_sorted_results_mode(self):
+        """
+        Test that the sorted file keeps the permissions of the streamed one.
+    """
+        results_file = tools.results.open_results('unittest_results/mode.csv', ['Filename', 'Entropy'], ';')
+        tools.results.write_rows(results_file, [['b.txt', 1], ['a.txt', 2]])
+        mode = os.stat('unittest_results/mode.csv').st_mode
+        self.assertTrue(tools.results.close_results(results_file, sort_rows=True))
+        self.assertEqual(os.stat('unittest_results/mode.csv').st_mode, mode)
+        self.assertEqual(self.read_rows('unittest_results/mode.csv')[1][0], 'a.txt')
+
+    def test_empty_results_removed(self):
+        """
+        Test that results without rows leave no file behind.
+    """
+        results_file = tools.results.open_results('unittest_results/empty.csv', ['Filename', 'Entropy'])
+        self.assertFalse(tools.results.close_results(results_file, sort_rows=True))
+        self.assertFalse(os.path.exists('unittest_results/empty.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,112 @@
+import tools.results
+import tools.results_db
+import unittest
+import os
+import shutil
+
+
+class TestResultsDBModule(unittest.TestCase):
+    """Test functions in results_db module"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_results'):
+            os.mkdir('unittest_results')
+        for dataset in ('unittest_results/a/data', 'unittest_results/b/data'):
+            os.makedirs(dataset)
+            for filename in ('a.txt', 'b.txt'):
+                with open(os.path.join(dataset, filename), 'w') as fdout:
+                    fdout.write('1\n2\n3\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_results')
+
+    def read_file(self, filename):
+        with open(filename) as fdin:
+            return fdin.read()
+
+    def test_stored_files_are_replayed(self):
+        """
+        Test that the rows of a run are stored, its files are reported as completed and a second run
+        with the same parameters writes the same csv file from the store alone.
+    """
+        connection = tools.results_db.open_results_db('unittest_results/replay.db')
+        options = {"scale_start": 1, "scale_stop": 2, "log_level": "INFO"}
+        header = ["Filename", "Scale_1_Entropy", "Scale_2_Entropy"]
+        store = tools.results_db.results_store(connection, "unittest_results/a/data", "multiscale_entropy", "sampen",
+                                               options)
+        results_file = tools.results.open_results('unittest_results/first.csv', header, ';', '\n', store)
+        tools.results.write_rows(results_file, [["b.txt", 0.5, float("nan")]])
+        tools.results.write_rows(results_file, [["a.txt", 0.25, 1]])
+        tools.results.close_results(results_file, sort_rows=True)
+        self.assertEqual(tools.results_db.completed_files(store), set(["a.txt", "b.txt"]))
+
+        # options that do not change the results (e.g. the log level) share the stored results
+        options["log_level"] = "DEBUG"
+        store = tools.results_db.results_store(connection, "unittest_results/a/data", "multiscale_entropy", "sampen",
+                                               options)
+        self.assertEqual(tools.results_db.completed_files(store), set(["a.txt", "b.txt"]))
+        results_file = tools.results.open_results('unittest_results/second.csv', header, ';', '\n', store)
+        tools.results.close_results(results_file, sort_rows=True)
+        self.assertEqual(self.read_file('unittest_results/second.csv'), self.read_file('unittest_results/first.csv'))
+
+        options["scale_stop"] = 3
+        store = tools.results_db.results_store(connection, "unittest_results/a/data", "multiscale_entropy", "sampen",
+                                               options)
+        self.assertEqual(tools.results_db.completed_files(store), set())
+        connection.close()
+
+        values = tools.results_db.query_results('unittest_results/replay.db', file="a.txt", scale=2)
+        self.assertEqual(len(values), 1)
+        self.assertEqual((values[0]["name"], values[0]["value"], values[0]["block"]), ("Entropy", 1, None))
+        self.assertEqual(values[0]["parameters"]["scale_stop"], 2)
+
+    def test_blocks_completed_on_close(self):
+        """
+        Test that the blocks of a file are only completed when its results are closed, and that
+        partial blocks are discarded by the next run.
+    """
+        connection = tools.results_db.open_results_db('unittest_results/blocks.db')
+        store = tools.results_db.results_store(connection, "unittest_results/a/data", "blocks_rqa", None,
+                                               {"section": 300}, filename="a",
+                                               file_path="unittest_results/a/data/a.txt")
+        header = ["Block", "RR", "DET", "LAM"]
+        results_file = tools.results.open_results('unittest_results/blocks.csv', header, ';', '\n', store)
+        tools.results.write_rows(results_file, [[2, 0.1, 0.2, 0.3]])
+        self.assertFalse(tools.results_db.is_completed(store))
+        results_file.fdout.close()
+
+        results_file = tools.results.open_results('unittest_results/blocks.csv', header, ';', '\n', store)
+        self.assertEqual(tools.results_db.stored_rows(store), [])
+        tools.results.write_rows(results_file, [[2, 0.1, 0.2, 0.3], [1, 0.4, 0.5, 0.6]])
+        tools.results.close_results(results_file, sort_rows=True)
+        self.assertTrue(tools.results_db.is_completed(store))
+        self.assertEqual(tools.results_db.stored_rows(store), [[1, 0.4, 0.5, 0.6], [2, 0.1, 0.2, 0.3]])
+        connection.close()
+
+    def test_changed_files_computed_again(self):
+        """
+        Test that the results of a dataset are not shared with another dataset of the same name and
+        that a file changed since its results were stored is no longer completed.
+    """
+        connection = tools.results_db.open_results_db('unittest_results/changed.db')
+        header = ["Filename", "Entropy"]
+        store = tools.results_db.results_store(connection, "unittest_results/a/data", "entropy", "sampen", {})
+        results_file = tools.results.open_results('unittest_results/changed.csv', header, ';', '\n', store)
+        tools.results.write_rows(results_file, [["a.txt", 0.5], ["b.txt", 0.25]])
+        tools.results.close_results(results_file)
+        self.assertEqual(tools.results_db.completed_files(store), set(["a.txt", "b.txt"]))
+
+        other_store = tools.results_db.results_store(connection, "unittest_results/b/data", "entropy", "sampen", {})
+        self.assertEqual(tools.results_db.completed_files(other_store), set())
+
+        with open('unittest_results/a/data/b.txt', 'a') as fdout:
+            fdout.write('4\n')
+        self.assertEqual(tools.results_db.completed_files(store), set(["a.txt"]))
+        self.assertEqual(tools.results_db.stored_rows(store), [["a.txt", 0.5]])
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import unittest
+
+import numpy
+
+from tools import rqa
+import tools.filter
+
+
+def rqa_reference(x, dimension, tau, tolerance, min_line):
+    """Dense N x N implementation of RR, DET and LAM used as reference"""
+    em = rqa.embed_seq(numpy.asarray(x, dtype=float), tau, dimension)
+    m = len(em)
+    r = (numpy.abs(em[:, None, :] - em[None, :, :]).max(axis=2) <= tolerance)
+    numpy.fill_diagonal(r, False)
+
+    def lines(sequences):
+        counted = 0
+        for seq in sequences:
+            length = 0
+            for value in list(seq) + [False]:
+                if value:
+                    length += 1
+                else:
+                    if length >= min_line:
+                        counted += length
+                    length = 0
+        return counted
+
+    total = float(r.sum())
+    diagonals = [numpy.diagonal(r, k) for k in range(-m + 1, m)]
+    return total / (m * (m - 1)), lines(diagonals) / total, lines(r.T) / total
+
+
+class TestRQAModule(unittest.TestCase):
+    """
+    Tests for the rqa module
+
+    All the test use a predetermined file adulterado in the unittest_dataset_filtered
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_matches_dense_reference(self):
+        """
+        The tiled computation must match the dense recurrence matrix, whatever the size of the tiles
+        """
+        x = numpy.random.RandomState(0).randint(0, 6, 203).astype(float)
+        em = rqa.embed_seq(x, 1, 2)
+        for tile_rows in (1, 2, 17, 202, 1024):
+            for tolerance, min_line in ((1, 2), (0, 3), (2, 2)):
+                measures = rqa.rqa_measures(em, tolerance, min_line, tile_rows=tile_rows)
+                for value, expected in zip(measures, rqa_reference(x, 2, 1, tolerance, min_line)):
+                    self.assertAlmostEqual(value, expected)
+
+    def test_file_entry_point(self):
+        """
+        Test the entry function on the filtered file
+        """
+        result = rqa.rqa('unittest_dataset_filtered/adulterado.txt', 2, 1, {'adulterado.txt': 1.0})
+        self.assertEqual(result['adulterado.txt'].points, 5960)
+        self.assertTrue(0 < result['adulterado.txt'].recurrence_rate < 1)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import unittest
+
+import numpy
+
+from tools import similarity
+import tools.filter
+
+
+def ibs_reference(x, y, n):
+    """Word-list implementation of the information based similarity (as in pyeeg)"""
+    words = sorted(set(tuple((k >> (n - 1 - b)) & 1 for b in range(n)) for k in range(2 ** n)))
+    counts = []
+    for series in (x, y):
+        symbols = [1 if d > 0 else 0 for d in numpy.diff(series)]
+        series_words = [tuple(symbols[i:i + n]) for i in range(len(symbols) - n + 1)]
+        counts.append([series_words.count(w) for w in words])
+    entropy = [[(c / float(sum(cnt))) * numpy.log2(c / float(sum(cnt))) if c else 0 for c in cnt] for cnt in counts]
+    ranks = []
+    for cnt in counts:
+        ordered = sorted(cnt, reverse=True)
+        rank = []
+        for c in cnt:
+            rank.append(ordered.index(c))
+            ordered[ordered.index(c)] = -1
+        ranks.append(rank)
+    ibs, z, missing = 0, 0, 0
+    for k in range(len(words)):
+        if counts[0][k] and counts[1][k]:
+            f = -entropy[0][k] - entropy[1][k]
+            ibs += abs(ranks[0][k] - ranks[1][k]) * f
+            z += f
+        else:
+            missing += 1
+    return ibs / z / (len(words) - missing)
+
+
+class TestSimilarityModule(unittest.TestCase):
+    """
+    Tests for the similarity module
+
+    All the test use the predetermined files in the unittest_dataset_filtered
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+        tools.filter.ds_filter('unittest_dataset/S0001312.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_matches_reference(self):
+        """
+        The hashed word counts must give the same IBS as the word-list implementation
+        """
+        rand = numpy.random.RandomState(0)
+        x, y = rand.randn(400), rand.randint(0, 5, 400)
+        for n in (1, 3, 5):
+            self.assertAlmostEqual(similarity.information_based_similarity(x, y, n), ibs_reference(x, y, n))
+
+    def test_pairwise_matrix(self):
+        """
+        The dataset matrix must be symmetric with a null diagonal
+        """
+        names, ibs = similarity.similarity('unittest_dataset_filtered', 4)
+        self.assertEqual(names, ['S0001312.txt', 'adulterado.txt'])
+        self.assertTrue((ibs == ibs.T).all())
+        self.assertTrue((numpy.diag(ibs) == 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import unittest
+
+import numpy
+
+from tools import spectral_embedding
+from tools import pyeeg
+import tools.filter
+
+
+class TestSpectralEmbeddingModule(unittest.TestCase):
+    """
+    Tests for the spectral_embedding module
+
+    All the test use a predetermined file adulterado in the unittest_dataset_filtered
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists('unittest_dataset_filtered'):
+            os.mkdir('unittest_dataset_filtered')
+        tools.filter.ds_filter('unittest_dataset/adulterado.txt', 'unittest_dataset_filtered', cutoff_limits=[50, 250])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('unittest_dataset_filtered')
+
+    def test_svd_entropy_matches_pyeeg(self):
+        """
+        The SVD entropy from the Gram matrix must match pyeeg's full SVD
+        """
+        x = numpy.random.RandomState(0).randn(500)
+        svd_ent, _ = spectral_embedding.spectral_features([x], 2, 6)[0]
+        self.assertAlmostEqual(svd_ent, pyeeg.svd_entropy(x, 2, 6))
+
+    def test_batch_matches_single(self):
+        """
+        Batching series of different lengths must give the same features as one call per series
+        """
+        rand = numpy.random.RandomState(1)
+        series = [rand.randn(200), rand.randn(300), rand.randn(200)]
+        batch = spectral_embedding.spectral_features(series, 1, 4)
+        for x, features in zip(series, batch):
+            self.assertEqual(spectral_embedding.spectral_features([x], 1, 4)[0], features)
+
+    def test_file_entry_point(self):
+        """
+        Test the entry function on the filtered file
+        """
+        result = spectral_embedding.spectral_embedding('unittest_dataset_filtered/adulterado.txt', 1, 4)
+        self.assertEqual(result['adulterado.txt'].points, 5960)
+        self.assertGreater(result['adulterado.txt'].svd_entropy, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(exit=False, verbosity=2)
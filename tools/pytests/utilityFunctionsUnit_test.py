@@ -1,7 +1,12 @@
 import os
 import shutil
+import tempfile
 import unittest
 
+import numpy
+import pandas
+import scipy.stats
+
 from tools import utility_functions
 import tools.filter
 
@@ -26,5 +31,152 @@ class TestUtilityFunctionsModule(unittest.TestCase):
 
     # TODO: add unit-tests for all (most of) the functions created
 
+    def test_load_series_last_column(self):
+        """
+        load_series reads the last column as readlines_with_col_index did
+        """
+        data = utility_functions.load_series('unittest_dataset_filtered/adulterado.txt')
+        with open('unittest_dataset_filtered/adulterado.txt') as fdin:
+            expected = [float(line.split()[-1]) for line in fdin]
+        self.assertEqual(data.dtype, numpy.float64)
+        self.assertEqual(data.tolist(), expected)
+        self.assertEqual(utility_functions.readlines_with_col_index('unittest_dataset_filtered/adulterado.txt'),
+                         expected)
+
+    def test_load_series_header_and_columns(self):
+        """
+        Header lines are skipped and the first column is used if col_index does not exist
+        """
+        data = utility_functions.load_series('unittest_dataset/S0001312.txt', col_index=0, dtype=numpy.float32)
+        self.assertEqual(data.dtype, numpy.float32)
+        self.assertAlmostEqual(data[0], 0.001)
+        self.assertEqual(utility_functions.load_series('unittest_dataset/S0001312.txt', col_index=5)[1], 0.501)
+        self.assertEqual(utility_functions.load_series('unittest_dataset/S0001312.txt')[0], 164)
+
+    def test_load_series_ragged(self):
+        """
+        Files whose lines have different numbers of columns are read as readlines_with_col_index did
+        """
+        data_dir = tempfile.mkdtemp()
+        try:
+            for text, expected in (("1\n2 3\n4\n", [1, 3, 4]), ("1 2\n3\n5 6\n", [2, 3, 6])):
+                file_path = os.path.join(data_dir, 'ragged.txt')
+                with open(file_path, 'w') as fdout:
+                    fdout.write(text)
+                self.assertEqual(utility_functions.load_series(file_path).tolist(), expected)
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_load_series_compressed(self):
+        """
+        gzip and bzip2 compressed files give the same series as the uncompressed one
+        """
+        import bz2
+        import gzip
+        with open('unittest_dataset/S0001312.txt', 'rb') as fdin:
+            text = fdin.read()
+        expected = utility_functions.load_series('unittest_dataset/S0001312.txt').tolist()
+        for compressed_file, opener in (('unittest_dataset_filtered/S0001312.txt.gz', gzip.open),
+                                        ('unittest_dataset_filtered/S0001312.txt.bz2', bz2.BZ2File)):
+            fdout = opener(compressed_file, 'wb')
+            fdout.write(text)
+            fdout.close()
+            self.assertEqual(utility_functions.load_series(compressed_file).tolist(), expected)
+            self.assertEqual(utility_functions.readlines_with_col_index(compressed_file, col_index=0)[:2],
+                             [0.001, 0.501])
+            os.remove(compressed_file)
+
+    def test_load_series_cache(self):
+        """
+        Cached series are memory mapped while the file is unchanged, and replaced when it changes
+        """
+        cache_dir = tempfile.mkdtemp()
+        series_file = os.path.join(cache_dir, 'series.txt')
+        shutil.copy('unittest_dataset_filtered/adulterado.txt', series_file)
+        utility_functions.set_series_cache_dir(os.path.join(cache_dir, 'cache'))
+        try:
+            parsed = utility_functions.load_series(series_file)
+            cached = utility_functions.load_series(series_file)
+            self.assertIsInstance(cached, numpy.memmap)
+            self.assertEqual(parsed.tolist(), cached.tolist())
+
+            with open(series_file, 'a') as fdout:
+                fdout.write('1.000 123.000\n')
+            changed = utility_functions.load_series(series_file)
+            self.assertEqual(len(changed), len(parsed) + 1)
+            self.assertEqual(len(os.listdir(os.path.join(cache_dir, 'cache'))), 1)
+        finally:
+            utility_functions.set_series_cache_dir(None)
+            shutil.rmtree(cache_dir)
+
+    def test_iter_glob(self):
+        """
+        iter_glob matches wildcards in any component and '**' across directories, skipping hidden entries
+        """
+        base_dir = tempfile.mkdtemp()
+        try:
+            for path in ['a.txt', 'b.csv', '.hidden.txt', 'sub/c.txt', 'sub/deep/d.txt', 'sub/deep/e.csv',
+                         'with space/f.txt']:
+                if not os.path.exists(os.path.dirname(os.path.join(base_dir, path))):
+                    os.makedirs(os.path.dirname(os.path.join(base_dir, path)))
+                open(os.path.join(base_dir, path), 'w').close()
+
+            def matches(pattern):
+                return sorted(os.path.relpath(path, base_dir)
+                              for path in utility_functions.iter_glob(os.path.join(base_dir, pattern)))
+            self.assertEqual(matches('*.txt'), ['a.txt'])
+            self.assertEqual(matches('*/*.txt'), ['sub/c.txt', 'with space/f.txt'])
+            self.assertEqual(matches('**/*.txt'), ['a.txt', 'sub/c.txt', 'sub/deep/d.txt', 'with space/f.txt'])
+            self.assertEqual(matches('sub/**/*.csv'), ['sub/deep/e.csv'])
+            self.assertEqual(matches('.h*'), ['.hidden.txt'])
+            self.assertEqual(matches('missing/*.txt'), [])
+        finally:
+            shutil.rmtree(base_dir)
+
+    def test_iter_input_paths(self):
+        """
+        Arguments come first (a single argument is split by spaces unless it exists), then the manifest lines
+        """
+        base_dir = tempfile.mkdtemp()
+        try:
+            spaced_file = os.path.join(base_dir, 'with space.txt')
+            open(spaced_file, 'w').close()
+            manifest = os.path.join(base_dir, 'manifest.txt')
+            with open(manifest, 'w') as fdout:
+                fdout.write('# comment\n%s\n\nother file.txt\n' % spaced_file)
+
+            self.assertEqual(list(utility_functions.iter_input_paths(['a.txt b.txt'])), ['a.txt', 'b.txt'])
+            self.assertEqual(list(utility_functions.iter_input_paths([spaced_file])), [spaced_file])
+            self.assertEqual(list(utility_functions.iter_input_paths(['a.txt'], manifest)),
+                             ['a.txt', spaced_file, 'other file.txt'])
+        finally:
+            shutil.rmtree(base_dir)
+
+    def test_multiscale_least_squares(self):
+        """
+        The slopes of every prefix of every row are those of scipy.stats.linregress (NaN where a value is NaN)
+        """
+        values = numpy.random.RandomState(0).rand(4, 6) * 3
+        values[1, 3] = numpy.nan
+        data_frame = pandas.DataFrame(values, columns=["Scale_%d_Entropy" % scale for scale in range(1, 12, 2)])
+        data_frame.insert(0, "Filename", ["f%d" % row for row in range(4)])
+
+        result = utility_functions.multiscale_least_squares("ds_multiscale_start_1_end_11_step_2_sampen.csv",
+                                                            data_frame)
+        self.assertEqual(list(result.columns[7:]), ["Slope_1:%d" % last for last in range(3, 12, 2)])
+        for row in range(4):
+            for prefix in range(2, 7):
+                expected = scipy.stats.linregress(range(1, 12, 2)[:prefix], values[row, :prefix])[0]
+                slope = result.loc[row, "Slope_1:%d" % (2 * prefix - 1)]
+                if numpy.isnan(expected):
+                    self.assertTrue(numpy.isnan(slope))
+                else:
+                    self.assertAlmostEqual(slope, expected, places=12)
+
+        rounded = utility_functions.multiscale_least_squares("ds_multiscale_start_1_end_11_step_2_sampen.csv",
+                                                             data_frame, round_digits=2)
+        self.assertEqual(rounded.loc[0, "Slope_1:11"], round(result.loc[0, "Slope_1:11"], 2))
+        self.assertRaises(Warning, utility_functions.multiscale_least_squares, "ds_sampen.csv", data_frame)
+
 if __name__ == '__main__':
     unittest.main(exit=False, verbosity=2)
@@ -0,0 +1,203 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the streaming writer of the interfaces' result files.
+
+The csv file is created (with its header) before the computations start and the
+rows of each file are appended and flushed as soon as that file is done, so a
+long run that is interrupted keeps every result computed so far and the partial
+results can be read while it is still running.
+
+Rows are written in the order the files finish. When the results are closed
+they are optionally sorted by their first column (as text, e.g. file names,
+as they always were, or numerically for block numbers) with an external sort-merge:
+runs of SORT_RUN_ROWS rows are sorted in memory, written to temporary files and
+merged, so sorting never holds the whole table in memory. The sorted file
+(with the permissions of the streamed one) replaces it atomically.
+
+Optionally the rows are also kept in a results store (see results_db): the rows
+already stored for the run are copied to the csv file when it is opened, and
+every row written is stored as well.
+
+ENTRY POINT: open_results(outfile, header, separator, line_terminator, store)
+             write_rows(results_file, rows)
+             close_results(results_file, sort_rows, numeric_key)
+"""
+
+import os
+import csv
+import stat
+import heapq
+import logging
+import tempfile
+import itertools
+from collections import namedtuple
+
+try:
+    import results_db
+except ImportError:
+    import tools.results_db as results_db
+
+module_logger = logging.getLogger('tsanalyse.results')
+
+# number of rows sorted in memory at once by sort_results
+SORT_RUN_ROWS = 100000
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for open_results; it contains the name
+of the csv file, its file descriptor and csv writer, the csv dialect used, the position where
+the rows start (right after the header), the header and the results store (or None)"""
+ResultsFile = namedtuple('ResultsFile', 'name fdout writer separator line_terminator data_start header store')
+
+
+# ENTRY POINT FUNCTIONS
+def open_results(outfile, header, separator=",", line_terminator="\n", store=None):
+    """
+    (str, list, str, str, results_db.ResultsStore) -> ResultsFile
+
+    Create the csv file outfile and write its header. If a results store is given, the rows
+    it already holds for the run are written right after the header (for a blocks store whose
+    file is not completed, its partial rows are discarded instead).
+    """
+    fdout = open(outfile, "w")
+    writer = csv.writer(fdout, delimiter=separator, lineterminator=line_terminator)
+    writer.writerow(header)
+    fdout.flush()
+    results_file = ResultsFile(outfile, fdout, writer, separator, line_terminator, fdout.tell(), header, store)
+    if store is not None:
+        if store.filename is None or results_db.is_completed(store):
+            writer.writerows(results_db.stored_rows(store))
+            fdout.flush()
+        else:
+            results_db.clear_file(store)
+    return results_file
+
+
+def write_rows(results_file, rows):
+    """
+    (ResultsFile, list of lists) -> NoneType
+
+    Append the rows (usually those of a single file) to the results and flush them to disk.
+    """
+    results_file.writer.writerows(rows)
+    results_file.fdout.flush()
+    if results_file.store is not None:
+        results_db.store_rows(results_file.store, results_file.header, rows)
+
+
+def close_results(results_file, sort_rows=False, numeric_key=False):
+    """
+    (ResultsFile, bool, bool) -> bool
+
+    Close the results, sorting the rows by their first column if sort_rows is set
+    (numerically if numeric_key is set, see row_sort_key).
+    If no row was written the file is removed. The file of a blocks store with rows is
+    marked as completed.
+
+    :return True if the file holds at least one row
+    """
+    has_rows = results_file.fdout.tell() > results_file.data_start
+    results_file.fdout.close()
+    if has_rows and results_file.store is not None and results_file.store.filename is not None:
+        results_db.complete_file(results_file.store)
+    if not has_rows:
+        os.remove(results_file.name)
+    elif sort_rows:
+        sort_results(results_file.name, results_file.separator, results_file.line_terminator,
+                     numeric_key=numeric_key)
+    return has_rows
+
+
+# IMPLEMENTATION
+def sort_results(outfile, separator=",", line_terminator="\n", run_rows=SORT_RUN_ROWS, numeric_key=False):
+    """
+    (str, str, str, int, bool) -> NoneType
+
+    Sort the rows of the csv file outfile (the header is kept first) by row_sort_key, with a
+    sort-merge over runs of run_rows rows. Rows with the same key keep the order they had.
+    """
+    out_dir = os.path.dirname(os.path.abspath(outfile))
+    run_files = []
+    try:
+        with open(outfile, "r") as fdin:
+            reader = csv.reader(fdin, delimiter=separator)
+            header = next(reader)
+            position = itertools.count()
+            while True:
+                run = [(row_sort_key(row, numeric_key), next(position), row) for row in itertools.islice(reader, run_rows)]
+                if not run:
+                    break
+                run.sort()
+                fdrun = tempfile.TemporaryFile(dir=out_dir)
+                csv.writer(fdrun, delimiter=separator, lineterminator="\n").writerows(
+                    [[order] + row for _, order, row in run])
+                fdrun.seek(0)
+                run_files.append(fdrun)
+
+        runs = [((row_sort_key(row[1:], numeric_key), int(row[0]), row[1:]) for row in csv.reader(fdrun, delimiter=separator))
+                for fdrun in run_files]
+        fd_sorted, sorted_file = tempfile.mkstemp(dir=out_dir, suffix=".csv")
+        with os.fdopen(fd_sorted, "w") as fdout:
+            writer = csv.writer(fdout, delimiter=separator, lineterminator=line_terminator)
+            writer.writerow(header)
+            writer.writerows(row for _, _, row in heapq.merge(*runs))
+        # mkstemp creates the file readable by its owner only
+        os.chmod(sorted_file, stat.S_IMODE(os.stat(outfile).st_mode))
+        os.rename(sorted_file, outfile)
+    finally:
+        for fdrun in run_files:
+            fdrun.close()
+    module_logger.debug("Sorted results in '%s'" % outfile)
+
+
+def row_sort_key(row, numeric_key=False):
+    """
+    (list of str, bool) -> tuple
+
+    Sort key of a csv row: its first column, as text, or as a number if numeric_key is set and
+    it is one (numbers come first).
+    """
+    if numeric_key:
+        try:
+            return 0, float(row[0]), ""
+        except (ValueError, IndexError):
+            pass
+    return 1, 0, row[0] if row else ""
+
+
+# AUXILIARY FUNCTIONS
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument("-nosort", "--no-sort-results", dest="sort_results", action="store_false", default=True,
+                        help="Leave the rows of the result files in the order the files finish, instead of "
+                             "sorting them once every file is done: by file name (as text) or, for the results "
+                             "of blocks, by block number (rows are always written as soon as each file is "
+                             "done).")
+    parser.add_argument("-db", "--results-db", dest="results_db", action="store", metavar="DB_FILE", default=None,
+                        help="Also keep the results in the SQLite file DB_FILE (created if it does not exist). "
+                             "Files whose results with the same parameters are already in DB_FILE are not "
+                             "computed again: their stored results are written instead.")
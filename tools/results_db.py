@@ -0,0 +1,305 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the optional results store: a SQLite file where the
+interfaces keep every value they write to their csv files, indexed by the
+parameters of the run instead of encoding them in the csv file name.
+
+Every value is a row of the 'results' table:
+
+    dataset     absolute path of the dataset (directory, container or file)
+    file        file of the dataset
+    metric      command of the interface (compress, entropy, lle, rqa,
+                multiscale_compress, multiscale_entropy, ...)
+    algorithm   compressor or entropy algorithm ('' if not applicable)
+    parameters  every other option of the run, as JSON with sorted keys
+    scale       scale of the value (NULL if not a multiscale result)
+    block       block of the file (NULL if not a file blocks result)
+    position    column of the value in the csv row
+    name        name of the value (e.g. Entropy, Compressed, RR)
+    value       the value, with the type it was written (NaN is stored as NULL)
+
+The 'completed' table lists the (dataset, file, metric, algorithm, parameters)
+whose results are complete, with the signature (size and modification time, see
+file_signature) the file had when they were computed; later runs with the same
+parameters skip those files, while their signature is unchanged, and copy their
+stored values to the csv file instead. A file that changed is computed again.
+Other tools (e.g. the dashboards) may query the file directly, or through
+query_results.
+
+ENTRY POINT: open_results_db(db_file)
+             results_store(connection, dataset_path, metric, algorithm, options, filename, file_path)
+             query_results(db_file, **filters)
+"""
+
+import os
+import re
+import json
+import sqlite3
+import logging
+from collections import namedtuple
+
+module_logger = logging.getLogger('tsanalyse.results_db')
+
+# options that do not change the results of a run (input, output and logging)
+IGNORED_OPTIONS = ("input_path", "output_path", "override_output", "read_separator", "write_separator",
+                   "line_terminator", "log_file", "log_level", "cache_dir", "results_db", "sort_results",
+                   "command", "algorithm", "compressor", "keep_scales", "keep_blocks", "jobs", "manifest",
+                   "glob_pattern", "with_slopes")
+
+# csv columns of the multiscale interface: Scale_<SCALE>_<NAME>
+SCALE_COLUMN = re.compile(r"^Scale_(\d+)_(.+)$")
+
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (dataset TEXT NOT NULL, file TEXT NOT NULL, metric TEXT NOT NULL,
+                                    algorithm TEXT NOT NULL, parameters TEXT NOT NULL, scale INTEGER,
+                                    block INTEGER, position INTEGER NOT NULL, name TEXT NOT NULL, value);
+CREATE INDEX IF NOT EXISTS results_run ON results (dataset, metric, algorithm, parameters, file, block);
+CREATE INDEX IF NOT EXISTS results_file ON results (file);
+CREATE INDEX IF NOT EXISTS results_scale ON results (scale);
+CREATE INDEX IF NOT EXISTS results_block ON results (block);
+CREATE TABLE IF NOT EXISTS completed (dataset TEXT NOT NULL, file TEXT NOT NULL, metric TEXT NOT NULL,
+                                      algorithm TEXT NOT NULL, parameters TEXT NOT NULL, signature TEXT,
+                                      PRIMARY KEY (dataset, metric, algorithm, parameters, file));
+"""
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for results_store; it contains the
+connection to the results file and the key of a run. If filename is set the results are the
+blocks of that file (the first column of each row is the block number) and file_path is the
+path of the file, otherwise the first column of each row is the file name"""
+ResultsStore = namedtuple('ResultsStore', 'connection dataset metric algorithm parameters filename file_path')
+
+
+# ENTRY POINT FUNCTIONS
+def open_results_db(db_file):
+    """
+    (str) -> sqlite3.Connection
+
+    Open (creating it if needed) the results file db_file.
+    """
+    connection = sqlite3.connect(db_file)
+    # rows are committed as each file (or block) is done: WAL avoids syncing the file on every commit
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(RESULTS_SCHEMA)
+    if "signature" not in [column[1] for column in connection.execute("PRAGMA table_info(completed)")]:
+        # results files of older versions: their completed files have no signature and are computed again
+        with connection:
+            connection.execute("ALTER TABLE completed ADD COLUMN signature TEXT")
+    return connection
+
+
+def results_store(connection, dataset_path, metric, algorithm, options, filename=None, file_path=None):
+    """
+    (sqlite3.Connection, str, str, str, dict, str, str) -> ResultsStore
+
+    Key of a run in the results file: the options that change its results (see run_parameters)
+    identify it along with the absolute path of the dataset, metric and algorithm. None if
+    connection is None. For a blocks store (filename set), file_path is the path of the file.
+    """
+    if connection is None:
+        return None
+    return ResultsStore(connection, os.path.abspath(dataset_path), metric, algorithm or "", run_parameters(options),
+                        filename, file_path)
+
+
+def query_results(db_file, **filters):
+    """
+    (str, ...) -> list of dict
+
+    Values of a results file, optionally filtered by any column of the results table
+    (e.g. query_results(db_file, dataset="/data/unittest_dataset", metric="entropy", scale=2)).
+    The parameters are returned decoded.
+    """
+    columns = ["dataset", "file", "metric", "algorithm", "parameters", "scale", "block", "position", "name", "value"]
+    unknown = set(filters) - set(columns)
+    if unknown:
+        raise ValueError("Unknown columns: %s" % ", ".join(sorted(unknown)))
+    connection = open_results_db(db_file)
+    try:
+        query = "SELECT %s FROM results" % ", ".join(columns)
+        if filters:
+            query += " WHERE " + " AND ".join("%s IS ?" % column for column in sorted(filters))
+        query += " ORDER BY dataset, metric, algorithm, parameters, file, block, position"
+        rows = connection.execute(query, [filters[column] for column in sorted(filters)]).fetchall()
+    finally:
+        connection.close()
+    results = []
+    for row in rows:
+        result = dict(zip(columns, row))
+        result["parameters"] = json.loads(result["parameters"])
+        if result["value"] is None:
+            result["value"] = float("nan")
+        results.append(result)
+    return results
+
+
+# IMPLEMENTATION
+def run_parameters(options):
+    """
+    (dict) -> str
+
+    JSON (sorted keys) of the options of a run, without the IGNORED_OPTIONS.
+    """
+    return json.dumps(dict((key, value) for key, value in options.items() if key not in IGNORED_OPTIONS),
+                      sort_keys=True)
+
+
+def run_key(store):
+    return store.dataset, store.metric, store.algorithm, store.parameters
+
+
+def file_signature(store, file_name):
+    """
+    (ResultsStore, str) -> str
+
+    Signature of a file of the dataset of a run: its size and modification time (those of the
+    container, for the entries of a dataset container). None if the file cannot be found.
+    """
+    if store.filename is not None:
+        file_path = store.file_path
+    elif os.path.isdir(store.dataset):
+        file_path = os.path.join(store.dataset, file_name)
+    else:
+        file_path = store.dataset
+    try:
+        file_stat = os.stat(file_path)
+    except (OSError, TypeError):
+        return None
+    return "%d:%r" % (file_stat.st_size, file_stat.st_mtime)
+
+
+def completed_files(store):
+    """
+    (ResultsStore) -> set of str
+
+    Files whose results of this run are complete and that did not change since (their signature
+    is the stored one); none if store is None.
+    """
+    if store is None:
+        return set()
+    return set(file_name for file_name, signature in store.connection.execute(
+        "SELECT file, signature FROM completed WHERE dataset = ? AND metric = ? AND algorithm = ? AND "
+        "parameters = ?", run_key(store))
+        if signature is not None and signature == file_signature(store, file_name))
+
+
+def is_completed(store):
+    """
+    (ResultsStore) -> bool
+
+    True if the results of the file of a blocks store are complete.
+    """
+    return store.filename in completed_files(store)
+
+
+def split_column(column):
+    """
+    (str) -> (int, str)
+
+    Scale and name of a csv column (the scale is None if the column is not Scale_<SCALE>_<NAME>).
+    """
+    match = SCALE_COLUMN.match(column)
+    if match:
+        return int(match.group(1)), match.group(2)
+    return None, column
+
+
+def store_rows(store, header, rows):
+    """
+    (ResultsStore, list of str, list of lists) -> NoneType
+
+    Store the csv rows of a run, replacing the values already stored for the same file (or block).
+    Files (not blocks) are marked as completed in the same transaction.
+    """
+    columns = [split_column(column) for column in header[1:]]
+    with store.connection:
+        for row in rows:
+            if store.filename is None:
+                file_name, block = row[0], None
+            else:
+                file_name, block = store.filename, int(row[0])
+            store.connection.execute("DELETE FROM results WHERE dataset = ? AND metric = ? AND algorithm = ? AND "
+                                     "parameters = ? AND file = ? AND block IS ?",
+                                     run_key(store) + (file_name, block))
+            store.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(store.dataset, file_name, store.metric, store.algorithm, store.parameters, scale, block,
+                  position, name, value) for position, ((scale, name), value) in enumerate(zip(columns, row[1:]))])
+            if store.filename is None:
+                store.connection.execute("INSERT OR REPLACE INTO completed VALUES (?, ?, ?, ?, ?, ?)",
+                                         (store.dataset, file_name, store.metric, store.algorithm, store.parameters,
+                                          file_signature(store, file_name)))
+
+
+def complete_file(store):
+    """
+    (ResultsStore) -> NoneType
+
+    Mark the results of the file of a blocks store as completed.
+    """
+    with store.connection:
+        store.connection.execute("INSERT OR REPLACE INTO completed VALUES (?, ?, ?, ?, ?, ?)",
+                                 (store.dataset, store.filename, store.metric, store.algorithm, store.parameters,
+                                  file_signature(store, store.filename)))
+
+
+def clear_file(store):
+    """
+    (ResultsStore) -> NoneType
+
+    Remove the (possibly partial) results of the file of a blocks store.
+    """
+    with store.connection:
+        store.connection.execute("DELETE FROM results WHERE dataset = ? AND metric = ? AND algorithm = ? AND "
+                                 "parameters = ? AND file = ?", run_key(store) + (store.filename,))
+
+
+def stored_rows(store):
+    """
+    (ResultsStore) -> list of lists
+
+    csv rows of the completed results of a run (of the blocks of its file, for a blocks store),
+    leaving out the files that changed since (see completed_files).
+    """
+    query = "SELECT r.file, r.block, r.value FROM results AS r JOIN completed AS c ON " \
+            "r.dataset = c.dataset AND r.metric = c.metric AND r.algorithm = c.algorithm AND " \
+            "r.parameters = c.parameters AND r.file = c.file WHERE r.dataset = ? AND r.metric = ? AND " \
+            "r.algorithm = ? AND r.parameters = ?"
+    arguments = run_key(store)
+    if store.filename is not None:
+        query += " AND r.file = ?"
+        arguments += (store.filename,)
+    query += " ORDER BY r.file, r.block, r.position"
+
+    completed = completed_files(store)
+    rows = []
+    last_key = None
+    for file_name, block, value in store.connection.execute(query, arguments):
+        if file_name not in completed:
+            continue
+        key = (file_name, block)
+        if key != last_key:
+            rows.append([file_name if store.filename is None else block])
+            last_key = key
+        rows[-1].append(float("nan") if value is None else value)
+    return rows
@@ -0,0 +1,329 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements Recurrence Quantification Analysis (RQA): recurrence
+rate, determinism and laminarity.
+
+The series is embedded with pyeeg's embed_seq and two embedded points i and j
+recur if their Chebyshev distance (max of the absolute differences of their
+components) is no greater than the tolerance, the same matching rule used by
+sampen and apen in the entropy module. The line of identity (i == j) is
+excluded.
+
+A N x N recurrence matrix is never built, not even bit-packed: it is computed
+a tile of rows at a time (TILE_ROWS rows, fewer for long series, so that a tile
+holds at most TILE_ELEMENTS points) and each tile is swept for lines as soon as
+it is computed, then dropped. The only state kept between tiles is the length
+of the line still open on each column (vertical) and on each diagonal, so the
+memory used grows linearly with the length of the series.
+
+The lines of a tile are counted with run-length encoding of the positions of
+its recurrent points (a run starts at every point that does not follow the
+previous one on the same column). As the matrix is symmetric, a tile of rows
+is built as the tile of the same columns, so the points of each column are
+contiguous. The diagonals are counted the same way after skewing the tile so
+that each diagonal is a line.
+
+    RR  = recurrent points / (M * (M - 1))
+    DET = points in diagonal lines of length >= min_line / recurrent points
+    LAM = points in vertical lines of length >= min_line / recurrent points
+
+BIBLIOGRAPHICAL REFERENCE:
+Marwan N, Romano MC, Thiel M, Kurths J: Recurrence plots for the analysis of
+complex systems. Physics Reports 2007, 438: 237-329
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: rqa(input_name, dimension, tau, tolerances, min_line, round_digits, on_result, skip_files)
+"""
+
+import os
+import numpy
+import logging
+from collections import namedtuple
+
+try:
+    from tools.pyeeg import embed_seq
+except ImportError:
+    from pyeeg import embed_seq
+
+try:
+    import utility_functions as util
+except ImportError:
+    import tools.utility_functions as util
+
+module_logger = logging.getLogger('tsanalyse.rqa')
+
+# maximum number of rows of the recurrence matrix computed at once
+TILE_ROWS = 1024
+# maximum number of points of the recurrence matrix computed at once
+TILE_ELEMENTS = 2 ** 24
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for rqa; it contains the number of
+points in the file, and the file's recurrence rate, determinism and laminarity"""
+RQAData = namedtuple('RQAData', 'points recurrence_rate determinism laminarity')
+
+
+# ENTRY POINT FUNCTION
+def rqa(input_name, dimension, tau, tolerances, min_line=2, round_digits=None, on_result=None, skip_files=None):
+    """
+    (str, int, int, dict of str: float, int, int) -> dict of str: RQAData
+
+    Given a file or directory named input_name, calculate the RQA measures of all the files.
+    As in the entropy module, tolerances holds the tolerance to use for each file.
+
+    :param input_name: string containing the name of the dataset to read
+    :param dimension: integer containing the embedding dimension
+    :param tau: integer containing the embedding lag
+    :param tolerances: dictionary with the tolerance of each file
+    :param min_line: integer containing the minimum length of diagonal and vertical lines
+    :param round_digits: integer containing the number of digits to round to
+    :param on_result: function called with (filename, RQAData) as soon as each file is done
+    :param skip_files: names of the files not to compute (e.g. those whose results are already stored)
+    :return dictionary of 'string:RQAData'
+    """
+    rqa_dict = {}
+
+    if util.is_dataset_dir(input_name):
+        filelist = util.listdir_no_hidden(input_name)
+        for filename in filelist:
+            if skip_files and filename.strip() in skip_files:
+                continue
+            try:
+                rqa_data = rqa_file(os.path.join(input_name, filename.strip()), dimension, tau,
+                                    tolerances[filename], min_line, round_digits)
+            except KeyError as ke:
+                module_logger.error("Key %s does not exist in tolerances' list. Skipping file..." % ke)
+            except ValueError as voe:
+                module_logger.critical("%s. Skipping file..." % voe)
+            else:
+                rqa_dict[filename.strip()] = rqa_data
+                if on_result is not None:
+                    on_result(filename.strip(), rqa_data)
+    else:
+        filename = os.path.basename(input_name)
+        if skip_files and filename in skip_files:
+            return rqa_dict
+        try:
+            tolerance = tolerances[list(tolerances.keys())[0]]
+        except IndexError as ixe:
+            module_logger.error("%s on Tolerance's list." % ixe)
+        else:
+            try:
+                rqa_data = rqa_file(input_name.strip(), dimension, tau, tolerance, min_line, round_digits)
+            except ValueError as voe:
+                module_logger.critical("%s. Skipping file..." % voe)
+            else:
+                rqa_dict[filename] = rqa_data
+                if on_result is not None:
+                    on_result(filename, rqa_data)
+    return rqa_dict
+
+
+# IMPLEMENTATION
+def rqa_file(filename, dimension, tau, tolerance, min_line=2, round_digits=None):
+    """
+    (str, int, int, float, int, int) -> RQAData
+
+    Given a filename, calculate the recurrence rate, determinism and laminarity.
+    """
+    if util.is_empty_file(filename):
+        raise ValueError("File %s is empty" % filename)
+
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    file_data = util.load_series(filename, col_index=-1)
+
+    module_logger.info("Computing RQA for file '%s'" % util.remove_project_path_from_file(filename))
+    return rqa_series(file_data, dimension, tau, tolerance, min_line, round_digits, "File %s" % filename)
+
+
+def rqa_series(file_data, dimension, tau, tolerance, min_line=2, round_digits=None, name="Series"):
+    """
+    (array, int, int, float, int, int, str) -> RQAData
+
+    Calculate the recurrence rate, determinism and laminarity of a series held in memory (e.g. a
+    block of a file, see the block_views module), with the same results rqa_file gives for a file
+    holding the series. name is used in the error raised when the series is too short.
+    """
+    embedded = embed_seq(numpy.ascontiguousarray(file_data), tau, dimension)
+    if len(embedded) < 2:
+        raise ValueError("%s is too short to be embedded" % name)
+
+    recurrence_rate, determinism, laminarity = rqa_measures(embedded, tolerance, min_line)
+    module_logger.debug("RR: %s, DET: %s, LAM: %s" % (recurrence_rate, determinism, laminarity))
+
+    return RQAData(len(file_data), util.my_round(recurrence_rate, round_digits),
+                   util.my_round(determinism, round_digits), util.my_round(laminarity, round_digits))
+
+
+def recurrence_tiles(embedded, tolerance, tile_rows=TILE_ROWS):
+    """
+    (array, float, int) -> iterator of (int, array of bool)
+
+    The recurrence matrix of the embedded points, a tile of rows at a time: (first row, tile)
+    where tile[j, r] holds chebyshev(embedded[first row + r], embedded[j]) <= tolerance, with
+    the line of identity set to False. The matrix is symmetric, so the tile of rows is built as
+    the tile of the same columns: the points of each column of the rows are contiguous. A tile
+    has at most tile_rows rows and TILE_ELEMENTS points.
+    """
+    num_points = len(embedded)
+    tile_rows = max(1, min(tile_rows, TILE_ELEMENTS // num_points))
+    for tile_start in range(0, num_points, tile_rows):
+        tile_end = min(tile_start + tile_rows, num_points)
+        tile = numpy.ones((num_points, tile_end - tile_start), dtype=bool)
+        for k in range(embedded.shape[1]):
+            tile &= numpy.abs(embedded[:, k][:, None] - embedded[tile_start:tile_end, k][None, :]) <= tolerance
+        rows = numpy.arange(tile_start, tile_end)
+        tile[rows, rows - tile_start] = False
+        yield tile_start, tile
+
+
+def line_histograms(embedded, tolerance, tile_rows=TILE_ROWS):
+    """
+    (array, float, int) -> (array, array)
+
+    Histograms of the lengths of the diagonal and vertical lines of the recurrence matrix of
+    the embedded points (index l holds the number of lines of length l).
+
+    Each tile (see recurrence_tiles) is swept as soon as it is computed, keeping the length of
+    the line still open on each column (vertical) and on each of the 2M - 1 diagonals (diagonal
+    d = j - i + M - 1). A line is counted when it is interrupted or at the end of the sweep.
+    """
+    num_points = len(embedded)
+    diagonal_hist = numpy.zeros(num_points + 1, dtype=numpy.int64)
+    vertical_hist = numpy.zeros(num_points + 1, dtype=numpy.int64)
+    diagonal_runs = numpy.zeros(2 * num_points - 1, dtype=numpy.int64)
+    vertical_runs = numpy.zeros(num_points, dtype=numpy.int64)
+
+    for tile_start, tile in recurrence_tiles(embedded, tolerance, tile_rows):
+        finished, vertical_runs[:] = line_runs(tile, vertical_runs)
+        vertical_hist += numpy.bincount(finished, minlength=num_points + 1)
+
+        # line c of the skewed tile is diagonal c + first_diagonal (the lines out of the matrix
+        # are empty)
+        skewed = skew_lines(tile)
+        first_diagonal = num_points - tile.shape[1] - tile_start
+        low, high = max(0, -first_diagonal), min(len(skewed), 2 * num_points - 1 - first_diagonal)
+        diagonals = diagonal_runs[low + first_diagonal:high + first_diagonal]
+        finished, diagonals[:] = line_runs(skewed[low:high], diagonals)
+        diagonal_hist += numpy.bincount(finished, minlength=num_points + 1)
+
+    diagonal_hist += numpy.bincount(diagonal_runs[diagonal_runs > 0], minlength=num_points + 1)
+    vertical_hist += numpy.bincount(vertical_runs[vertical_runs > 0], minlength=num_points + 1)
+    return diagonal_hist, vertical_hist
+
+
+def line_runs(lines, open_runs):
+    """
+    (array of bool, array) -> (array, array)
+
+    Run-length encoding of the lines (rows) of a tile, given the length of the run left open
+    on each line by the tiles before it. Returns the lengths of the runs that end within the
+    tile and the length of the run left open on each line by the tile.
+
+    The runs are read from the positions of the recurrent points of the tile, in order: a run
+    starts at every point that does not follow the previous one on the same line.
+    """
+    num_lines, length = lines.shape
+    positions = numpy.flatnonzero(lines)
+    point_lines, points = numpy.divmod(positions, length)
+    run_start = numpy.ones(len(positions), dtype=bool)
+    run_start[1:] = numpy.logical_or(positions[1:] != positions[:-1] + 1, point_lines[1:] != point_lines[:-1])
+    starts = numpy.flatnonzero(run_start)
+    lengths = numpy.diff(numpy.append(starts, len(positions)))
+    start_lines, start_points = point_lines[starts], points[starts]
+    open_ended = start_points + lengths == length
+    continued = start_points == 0
+    lengths[continued] += open_runs[start_lines[continued]]
+
+    still_open = numpy.zeros(num_lines, dtype=open_runs.dtype)
+    still_open[start_lines[open_ended]] = lengths[open_ended]
+    # the runs open before the tile that its first point interrupts
+    interrupted = open_runs[numpy.logical_and(open_runs > 0, ~lines[:, 0])]
+    return numpy.concatenate((interrupted, lengths[~open_ended])), still_open
+
+
+def skew_lines(tile):
+    """
+    (array of bool) -> array of bool
+
+    The diagonals of a tile (see recurrence_tiles) as lines: line c holds tile[c + r - (R - 1), r]
+    on each point r (False out of the tile), R being the number of rows of the tile. It is read
+    from the tile padded with R - 1 empty lines above it and R below it, through a strided view
+    (line c starts at padded line c, each point one line further down).
+    """
+    num_points, num_rows = tile.shape
+    padded = numpy.zeros((num_points + 2 * num_rows - 1, num_rows), dtype=bool)
+    padded[num_rows - 1:num_rows - 1 + num_points] = tile
+    skewed = numpy.lib.stride_tricks.as_strided(padded, shape=(num_points + num_rows, num_rows),
+                                                strides=(num_rows, num_rows + 1))
+    return numpy.ascontiguousarray(skewed)
+
+
+def rqa_measures(embedded, tolerance, min_line=2, tile_rows=TILE_ROWS):
+    """
+    (array, float, int, int) -> (float, float, float)
+
+    Recurrence rate, determinism and laminarity of the recurrence matrix of the embedded points.
+    """
+    num_points = len(embedded)
+    diagonal_hist, vertical_hist = line_histograms(embedded, tolerance, tile_rows)
+    lengths = numpy.arange(num_points + 1)
+    recurrent_points = float((lengths * diagonal_hist).sum())
+    recurrence_rate = recurrent_points / (num_points * (num_points - 1))
+    if recurrent_points == 0:
+        return recurrence_rate, numpy.nan, numpy.nan
+    determinism = (lengths * diagonal_hist)[min_line:].sum() / recurrent_points
+    laminarity = (lengths * vertical_hist)[min_line:].sum() / recurrent_points
+    return recurrence_rate, determinism, laminarity
+
+
+# AUXILIARY FUNCTIONS
+def is_rqa_table_empty(rqa_table):
+    return all(map(lambda x: len(rqa_table[x]) < 1, rqa_table))
+
+
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument('-d', '--dimension', dest="dimension", type=int, action="store", metavar="DIMENSION",
+                        help="Embedding dimension. [default:%(default)s]", default=2)
+    parser.add_argument('-tau', '--lag', dest="lag", type=int, action="store", metavar="LAG",
+                        help="Embedding lag. [default:%(default)s]", default=1)
+    parser.add_argument('-sdt', '--sd-tolerance', dest="sd_tolerance", type=float, action="store", metavar="TOLERANCE",
+                        help="Tolerance level (TOLERANCE x Standard Deviation) used to decide whether two "
+                             "points recur. [default:%(default)s]",
+                        default=0.15)
+    parser.add_argument('-ut', '--unique-tolerance', dest="unique_tolerance", type=float, action="store",
+                        metavar="TOLERANCE",
+                        help="Tolerance level to be used directly (without being multiplied by the Standard Deviation)"
+                             " to decide whether two points recur.",
+                        default=None)
+    parser.add_argument('-lmin', '--min-line', dest="min_line", type=int, action="store", metavar="LENGTH",
+                        help="Minimum length of the diagonal and vertical lines used in determinism and "
+                             "laminarity. [default:%(default)s]", default=2)
@@ -0,0 +1,201 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module implements the information based similarity (IBS) of Yang et al.
+between every pair of files of a dataset.
+
+pyeeg.information_based_similarity builds every binary word as a list and counts
+them with list.count, which is O(2^n * N) per series, and ranks them with
+repeated list.index calls. Here the symbolic sequence (1 if the series increases,
+0 otherwise) is encoded into integer words with a rolling bit shift, the words
+are counted with numpy.bincount and ranked with a stable argsort. The word
+histogram of each file is computed once and cached, and the IBS of every pair is
+derived from the histograms.
+
+BIBLIOGRAPHICAL REFERENCE:
+Yang AC, Hseu SS, Yien HW, Goldberger AL, Peng CK: Linguistic analysis of
+the human heartbeat using frequency and rank order statistics. Phys Rev
+Lett 2003, 90: 108103
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: similarity(input_name, word_order, round_digits)
+"""
+
+import os
+import numpy
+import logging
+
+try:
+    import utility_functions as util
+except ImportError:
+    import tools.utility_functions as util
+
+module_logger = logging.getLogger('tsanalyse.similarity')
+
+# word histograms already computed, keyed by (file path, modification time, word order)
+HISTOGRAM_CACHE = {}
+
+
+# ENTRY POINT FUNCTION
+def similarity(input_name, word_order, round_digits=None):
+    """
+    (str, int, int) -> (list of str, array)
+
+    Given a file or directory named input_name, calculate the information based similarity
+    between every pair of files.
+
+    :param input_name: string containing the name of the dataset to read
+    :param word_order: integer containing the number of symbols in each word
+    :param round_digits: integer containing the number of digits to round to
+    :return the list of file names and the matrix with the IBS of each pair of files (in the same order)
+    """
+    if util.is_dataset_dir(input_name):
+        file_paths = [(filename.strip(), os.path.join(input_name, filename.strip()))
+                      for filename in util.listdir_no_hidden(input_name)]
+    else:
+        file_paths = [(os.path.basename(input_name), input_name.strip())]
+
+    names = []
+    histograms = []
+    for filename, file_path in sorted(file_paths):
+        try:
+            histograms.append(file_word_histogram(file_path, word_order))
+        except ValueError as voe:
+            module_logger.critical("%s. Skipping file..." % voe)
+        else:
+            names.append(filename)
+
+    module_logger.info("Computing information based similarity between %d file(s)" % len(names))
+    ibs = ibs_matrix(numpy.array(histograms).reshape(len(names), 2 ** word_order))
+    if round_digits:
+        ibs = numpy.round(ibs, round_digits)
+    return names, ibs
+
+
+# IMPLEMENTATION
+def file_word_histogram(filename, word_order):
+    """
+    (str, int) -> array
+
+    Word histogram of a file. Histograms are cached, so each file is only read once
+    per word order (or again if it is modified).
+    """
+    if util.is_empty_file(filename):
+        raise ValueError("File %s is empty" % filename)
+
+    cache_key = (os.path.abspath(filename), util.modification_time(filename), word_order)
+    if cache_key not in HISTOGRAM_CACHE:
+        # -1 to read the last available column (non numeric values raise a ValueError)
+        file_data = util.load_series(filename, col_index=-1)
+        if len(file_data) <= word_order:
+            raise ValueError("File %s is too short for words of order %d" % (filename, word_order))
+        HISTOGRAM_CACHE[cache_key] = word_histogram(file_data, word_order)
+    return HISTOGRAM_CACHE[cache_key]
+
+
+def encode_words(x, word_order):
+    """
+    (array, int) -> array of int
+
+    Encode the symbolic sequence of x (1 where x increases, 0 otherwise) into the integer
+    value of each word of word_order consecutive symbols, the first symbol being the most
+    significant bit. Word k is thus the k-th word of pyeeg's sorted word list.
+    """
+    symbols = (numpy.diff(numpy.asarray(x, dtype=numpy.float64)) > 0).astype(numpy.int64)
+    num_words = len(symbols) - word_order + 1
+    words = numpy.zeros(max(num_words, 0), dtype=numpy.int64)
+    for position in range(word_order):
+        words = (words << 1) | symbols[position:position + num_words]
+    return words
+
+
+def word_histogram(x, word_order):
+    """
+    (array, int) -> array of int
+
+    Number of occurrences of each of the 2^word_order words in the series x.
+    """
+    return numpy.bincount(encode_words(x, word_order), minlength=2 ** word_order)
+
+
+def word_statistics(histograms):
+    """
+    (array) -> (array, array)
+
+    Rank and weighted entropy term (p * log2(p)) of each word, for each histogram (row).
+    The most frequent word has rank 0; ties keep the word order, as in pyeeg.
+    """
+    histograms = numpy.atleast_2d(histograms)
+    totals = histograms.sum(axis=1)[:, None].astype(numpy.float64)
+    probabilities = histograms / numpy.where(totals > 0, totals, 1)
+    entropy_terms = numpy.where(probabilities > 0,
+                                probabilities * numpy.log2(numpy.where(probabilities > 0, probabilities, 1)), 0)
+    order = numpy.argsort(-histograms, axis=1, kind='mergesort')
+    ranks = numpy.empty_like(order)
+    rows = numpy.arange(histograms.shape[0])[:, None]
+    ranks[rows, order] = numpy.arange(histograms.shape[1])[None, :]
+    return ranks, entropy_terms
+
+
+def ibs_matrix(histograms):
+    """
+    (array) -> array
+
+    Information based similarity between every pair of word histograms (rows). Only the
+    words present in both series contribute, weighted by F(k) = -p0*log2(p0) - p1*log2(p1).
+    """
+    num_series = histograms.shape[0]
+    ranks, entropy_terms = word_statistics(histograms)
+    present = histograms > 0
+    ibs = numpy.zeros((num_series, num_series))
+    for row in range(num_series):
+        shared = numpy.logical_and(present[row][None, :], present[row:])
+        weights = numpy.where(shared, -(entropy_terms[row][None, :] + entropy_terms[row:]), 0)
+        num_shared = shared.sum(axis=1)
+        weighted_distance = (numpy.abs(ranks[row][None, :] - ranks[row:]) * weights).sum(axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ibs[row, row:] = weighted_distance / weights.sum(axis=1) / num_shared
+        ibs[row:, row] = ibs[row, row:]
+    return ibs
+
+
+def information_based_similarity(x, y, word_order):
+    """
+    (array, array, int) -> float
+
+    Information based similarity of two time series, as pyeeg.information_based_similarity.
+    """
+    return ibs_matrix(numpy.vstack([word_histogram(x, word_order), word_histogram(y, word_order)]))[0, 1]
+
+
+# AUXILIARY FUNCTIONS
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument('-n', '--word-order', dest="word_order", type=int, action="store", metavar="ORDER",
+                        help="Number of symbols in each word. [default:%(default)s]", default=8)
@@ -0,0 +1,205 @@
+"""
+Copyright (C) 2018 Marcelo Santos
+
+This file is part of TSAnalyse.
+
+    TSAnalyse is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published
+    by the Free Software Foundation, either version 3 of the License,
+    or (at your option) any later version.
+
+    TSAnalyse is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with TSAnalyse.  If not, see
+    <http://www.gnu.org/licenses/>.
+
+_______________________________________________________________________________
+
+This module provides the features derived from the singular spectrum of the
+embedding matrix of a series: SVD entropy and Fisher information.
+
+pyeeg's svd_entropy and fisher_info each build the (N - (DE - 1) * Tau) x DE
+embedding matrix and run a full SVD on it. Here the singular values are
+obtained once, from the eigenvalues of the DE x DE Gram matrix (Y^T Y), and both
+features are derived from them. The Gram matrices of many series (e.g. the
+blocks of a file) are computed in batch, grouping the series by length.
+
+The singular values are the square roots of the Gram eigenvalues; very small
+singular values (relative to the largest) lose precision this way, which does
+not affect the features since they are normalized by the sum of the spectrum.
+
+MODULE EXTERNAL DEPENDENCIES:
+numpy(http://numpy.scipy.org/)
+
+ENTRY POINT: spectral_embedding(input_name, tau, dimension, round_digits)
+"""
+
+import os
+import numpy
+import logging
+from collections import namedtuple
+
+try:
+    import utility_functions as util
+except ImportError:
+    import tools.utility_functions as util
+
+module_logger = logging.getLogger('tsanalyse.spectral_embedding')
+
+# DATA TYPE DEFINITIONS
+"""This is a data type defined to be used as a return for spectral_embedding; it
+contains the number of points in the file, the file's SVD entropy and the file's Fisher information"""
+SpectralData = namedtuple('SpectralData', 'points svd_entropy fisher_info')
+
+
+# ENTRY POINT FUNCTION
+def spectral_embedding(input_name, tau, dimension, round_digits=None):
+    """
+    (str, int, int, int) -> dict of str: SpectralData
+
+    Given a file or directory named input_name, calculate the SVD entropy and the Fisher
+    information of all the files. The files of a directory are processed in batch.
+
+    :param input_name: string containing the name of the dataset to read
+    :param tau: integer containing the embedding lag
+    :param dimension: integer containing the embedding dimension
+    :param round_digits: integer containing the number of digits to round to
+    :return dictionary of 'string:SpectralData'
+    """
+    if util.is_dataset_dir(input_name):
+        file_paths = dict((filename.strip(), os.path.join(input_name, filename.strip()))
+                          for filename in util.listdir_no_hidden(input_name))
+    else:
+        file_paths = {os.path.basename(input_name): input_name.strip()}
+
+    series = {}
+    for filename in sorted(file_paths):
+        try:
+            series[filename] = read_series(file_paths[filename])
+        except ValueError as voe:
+            module_logger.critical("%s. Skipping file..." % voe)
+
+    module_logger.info("Computing singular spectrum of %d file(s)" % len(series))
+    names = [filename for filename in sorted(series) if len(series[filename]) > (dimension - 1) * tau]
+    for filename in set(series) - set(names):
+        module_logger.critical("File '%s' is too short to be embedded. Skipping file..." % filename)
+
+    features = spectral_features([series[filename] for filename in names], tau, dimension)
+    spectral_dict = {}
+    for filename, (svd_ent, fisher) in zip(names, features):
+        spectral_dict[filename] = SpectralData(len(series[filename]),
+                                               util.my_round(svd_ent, round_digits),
+                                               util.my_round(fisher, round_digits))
+    return spectral_dict
+
+
+# IMPLEMENTATION
+def read_series(filename):
+    """
+    (str) -> array
+
+    Read the last column of a file into an array.
+    """
+    if util.is_empty_file(filename):
+        raise ValueError("File %s is empty" % filename)
+    # -1 to read the last available column (non numeric values raise a ValueError)
+    return util.load_series(filename, col_index=-1)
+
+
+def embedding_gram(x, tau, dimension):
+    """
+    (array, int, int) -> array
+
+    Gram matrix (Y^T Y, DE x DE) of the embedding matrix Y = pyeeg.embed_seq(x, tau, dimension).
+    A 2-D x is taken as a batch of equally sized series, returning one Gram matrix per row.
+    """
+    x = numpy.ascontiguousarray(x, dtype=numpy.float64)
+    batch = x.reshape(-1, x.shape[-1])
+    num_rows = batch.shape[1] - (dimension - 1) * tau
+    embedded = numpy.lib.stride_tricks.as_strided(
+        batch, shape=(batch.shape[0], num_rows, dimension),
+        strides=(batch.strides[0], batch.itemsize, tau * batch.itemsize))
+    gram = numpy.einsum('bij,bik->bjk', embedded, embedded)
+    return gram if x.ndim > 1 else gram[0]
+
+
+def singular_spectrum(gram):
+    """
+    (array) -> array
+
+    Normalized singular values (W in pyeeg), in descending order, from one Gram matrix
+    or a stack of them.
+    """
+    eigenvalues = numpy.linalg.eigvalsh(gram)[..., ::-1]
+    singular_values = numpy.sqrt(numpy.clip(eigenvalues, 0, None))
+    return singular_values / singular_values.sum(axis=-1)[..., None]
+
+
+def svd_entropy_from_spectrum(spectrum):
+    """
+    (array) -> float or array
+
+    SVD entropy, -sum(W * log(W)), of normalized singular values (last axis). 0 * log(0) counts as 0.
+    """
+    safe_spectrum = numpy.where(spectrum > 0, spectrum, 1)
+    return -numpy.sum(spectrum * numpy.log(safe_spectrum), axis=-1)
+
+
+def fisher_info_from_spectrum(spectrum):
+    """
+    (array) -> float or array
+
+    Fisher information, sum((W[i+1] - W[i])^2 / W[i]), of normalized singular values (last axis).
+    Terms where W[i] is 0 (and so are all the following singular values) count as 0.
+
+    NOTE: pyeeg.fisher_info currently returns the SVD entropy; this is the original PyEEG formula.
+    """
+    previous = spectrum[..., :-1]
+    safe_previous = numpy.where(previous > 0, previous, 1)
+    terms = numpy.where(previous > 0, numpy.diff(spectrum, axis=-1) ** 2 / safe_previous, 0)
+    return numpy.sum(terms, axis=-1)
+
+
+def spectral_features(series_list, tau, dimension):
+    """
+    (list of arrays, int, int) -> list of (float, float)
+
+    SVD entropy and Fisher information of every series in series_list. Series with the
+    same length are stacked so their Gram matrices and eigenvalues are computed in one call.
+    """
+    features = [None] * len(series_list)
+    by_length = {}
+    for position, series in enumerate(series_list):
+        by_length.setdefault(len(series), []).append(position)
+
+    for length in by_length:
+        positions = by_length[length]
+        batch = numpy.vstack([numpy.asarray(series_list[position], dtype=numpy.float64) for position in positions])
+        spectrum = singular_spectrum(embedding_gram(batch, tau, dimension))
+        for position, svd_ent, fisher in zip(positions, svd_entropy_from_spectrum(spectrum),
+                                             fisher_info_from_spectrum(spectrum)):
+            features[position] = (float(svd_ent), float(fisher))
+    return features
+
+
+# AUXILIARY FUNCTIONS
+def is_spectral_table_empty(spectral_table):
+    return len(spectral_table) < 1
+
+
+def add_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the entry function in this module
+
+    """
+    parser.add_argument('-d', '--dimension', dest="dimension", type=int, action="store", metavar="DIMENSION",
+                        help="Embedding dimension. [default:%(default)s]", default=2)
+    parser.add_argument('-tau', '--lag', dest="lag", type=int, action="store", metavar="LAG",
+                        help="Embedding lag. [default:%(default)s]", default=1)
@@ -46,7 +46,6 @@ IMPLEMENTATION NOTES:
 
 import os
 import sys
-import glob
 import pandas
 import logging
 import numpy as np
@@ -337,7 +336,8 @@ def compute_stv_metric_of_file(input_file_name, algorithm_name, sampling_frequen
 
     module_logger.debug(" Running file: %s" % os.path.basename(input_file_name))
     try:
-        dataframe = pandas.read_csv(input_file_name)
+        with util.open_text(input_file_name) as fdin:
+            dataframe = pandas.read_csv(fdin)
     except ValueError as ve:
         module_logger.critical("%s. File: %s" % (ve, input_file_name))
     else:
@@ -367,7 +367,8 @@ def compute_stv_metric_of_directory(input_path, algorithm_name, sampling_frequen
     else:
         if algorithm_name in AVAILABLE_ALGORITHMS:
             module_logger.debug("Running algorithm %s" % algorithm_name)
-            files_list = map(os.path.abspath, glob.glob("%s%s*" % (util.remove_slash_from_path(input_path), os.sep)))
+            files_list = [os.path.abspath(os.path.join(input_path, filename))
+                          for filename in util.iter_dir_no_hidden(input_path)]
             result_list = map(lambda filename: compute_stv_metric_of_file(filename, algorithm_name, sampling_frequency,
                                                                           round_digits, consider_nans), files_list)
             # generate the header based on the longest list
@@ -27,12 +27,18 @@ MODULE EXTERNAL DEPENDENCIES:
 numpy (http://numpy.scipy.org/),
 pandas (http://pandas.pydata.org/)
 scipy (https://www.scipy.org/)
+scandir (https://github.com/benhoyt/scandir), optional on python 2
 
 
 """
 # TODO: fix debug flags, adjust debug to comprise levels used in argument parser
 
 import os
+import sys
+import bz2
+import gzip
+import errno
+import fnmatch
 import numpy as np
 import pandas as pd
 import logging as log
@@ -44,17 +50,51 @@ try:
 except Exception:
     import tools.constants as constants
 
+try:
+    import dataset
+except ImportError:
+    import tools.dataset as dataset
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # python 2 backport (https://github.com/benhoyt/scandir); directories are read with os.listdir without it
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+try:
+    import lzma
+
+    xz_available = True
+except ImportError:
+    try:
+        from backports import lzma
+
+        xz_available = True
+    except ImportError:
+        xz_available = False
+
 TSA_HOME = constants.TSA_HOME
 TMP_DIR = constants.TMP_DIR
 RUN_ISOLATED_FILES_PATH = constants.RUN_ISOLATED_FILES_PATH
 BLOCK_ANALYSIS_OUTPUT_PATH = constants.BLOCK_ANALYSIS_OUTPUT_PATH
 FILE_BLOCKS_STORAGE_PATH = constants.FILE_BLOCKS_STORAGE_PATH
 STV_ANALYSIS_STORAGE_PATH = constants.STV_ANALYSIS_STORAGE_PATH
+SERIES_CACHE_PATH = constants.SERIES_CACHE_PATH
 
 DEFAULT_LOG_LEVEL = constants.DEFAULT_LOG_LEVEL
 
 module_logger = log.getLogger("tsanalyse.util")
 
+# maximum number of leading (header) lines found by sniff_series_layout, which parse_series and its line by line
+# fallback (parse_series_lines) both skip
+HEADER_SNIFF_LINES = 10
+
+# extensions of the compressed inputs read by open_text (decompressed while reading)
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".xz")
+
 
 def setup_environment():
     """
@@ -207,11 +247,230 @@ def initialize_logger(logger_name='tsanalyse', log_file=None, log_level=DEFAULT_
 
 
 def is_empty_file(file_to_eval):
+    container_file, name = dataset.split_entry_path(file_to_eval)
+    if container_file is not None:
+        return len(dataset.read_entry(container_file, name)) <= 0
     return os.path.getsize(file_to_eval) <= 0
 
 
+def open_text(filename):
+    """
+    (str) -> file
+
+    Open a text file for reading. Files compressed with gzip, bzip2 or xz (by their extension,
+    see COMPRESSED_EXTENSIONS) are decompressed as they are read, without an uncompressed copy.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".gz":
+        return gzip.open(filename, "rb")
+    if extension == ".bz2":
+        return bz2.BZ2File(filename, "r")
+    if extension == ".xz":
+        if not xz_available:
+            raise IOError(errno.EINVAL, "Reading xz files requires the lzma module (backports.lzma on python 2)")
+        return lzma.open(filename, "rb")
+    return open(filename, "rU")
+
+
+def remove_compression_extension(file_name):
+    """
+    removes the compression extension (see COMPRESSED_EXTENSIONS) of a file name, if it has one
+    :param file_name: name/file path to be processed
+    :return: the name/path of the file without the compression extension
+    """
+    if os.path.splitext(file_name)[1].lower() in COMPRESSED_EXTENSIONS:
+        return os.path.splitext(file_name)[0]
+    return file_name
+
+
+def is_dataset_dir(path):
+    """
+    (str) -> bool
+
+    True if path holds several series: a directory or a dataset container (see the dataset module).
+    """
+    return os.path.isdir(path) or dataset.is_container(path)
+
+
+def modification_time(path):
+    """
+    (str) -> float
+
+    Modification time of a file, or of the container of a series inside a container.
+    """
+    container_file, name = dataset.split_entry_path(path)
+    return os.path.getmtime(path if container_file is None else container_file)
+
+
+def set_series_cache_dir(cache_dir):
+    """
+    (str) -> NoneType
+
+    Set the directory of the parsed series cache used by load_series (None disables it).
+    """
+    global SERIES_CACHE_PATH
+    SERIES_CACHE_PATH = cache_dir
+    if cache_dir is not None:
+        module_logger.debug("Parsed series cache at '%s'" % os.path.abspath(cache_dir))
+
+
+def series_cache_file(filename, col_index, dtype):
+    """
+    (str, int, numpy.dtype) -> (str, str)
+
+    Prefix shared by every cache entry of filename and the name of the cache entry for its
+    current contents: the entry is keyed on the path, modification time, size, column and dtype
+    of the file, so any change to the file invalidates it.
+    """
+    import hashlib
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    prefix = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    key = "%r_%d_%d_%s" % (stat.st_mtime, stat.st_size, col_index, np.dtype(dtype).str)
+    return prefix, "%s_%s.npy" % (prefix, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+
+def load_series(filename, col_index=-1, dtype=np.float64):
+    """
+    (str, int, numpy.dtype) -> numpy.ndarray
+
+    Read the column col_index (by default the last one) of a whitespace separated file
+    into a numpy array.
+
+    A series inside a dataset container ('CONTAINER/NAME') is returned as a memory mapped
+    slice of the container; col_index 0 returns its timestamps.
+
+    If the parsed series cache is enabled (see set_series_cache_dir) the array is stored
+    as a .npy file and, while the file is unchanged, read back memory mapped (read only)
+    instead of parsing the text again.
+    """
+    container_file, name = dataset.split_entry_path(filename)
+    if container_file is not None:
+        data = dataset.read_entry(container_file, name, timestamps=(col_index == 0))
+        return data if data.dtype == dtype else data.astype(dtype)
+
+    if SERIES_CACHE_PATH is None:
+        return parse_series(filename, col_index, dtype)
+
+    prefix, cache_name = series_cache_file(filename, col_index, dtype)
+    cache_file = os.path.join(SERIES_CACHE_PATH, cache_name)
+    if os.path.exists(cache_file):
+        return np.load(cache_file, mmap_mode="r")
+
+    data = parse_series(filename, col_index, dtype)
+    if len(data) > 0:
+        store_series_cache(data, prefix, cache_file)
+    return data
+
+
+def store_series_cache(data, prefix, cache_file):
+    """
+    (numpy.ndarray, str, str) -> NoneType
+
+    Atomically write a cache entry and remove the stale entries of the same file.
+    A cache that cannot be written is only logged.
+    """
+    import tempfile
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fdout:
+            np.save(fdout, data)
+        os.rename(tmp_name, cache_file)
+        for stale_name in os.listdir(cache_dir):
+            if stale_name.startswith(prefix) and stale_name != os.path.basename(cache_file):
+                os.remove(os.path.join(cache_dir, stale_name))
+    except (OSError, IOError) as err:
+        module_logger.warning("Unable to write parsed series cache '%s': %s" % (cache_file, err))
+
+
+def parse_series(filename, col_index=-1, dtype=np.float64):
+    """
+    (str, int, numpy.dtype) -> numpy.ndarray
+
+    Parse the column col_index (by default the last one) of a whitespace separated file
+    straight into a numpy array, using the pandas C parser.
+
+    Leading lines whose column is not numeric (headers) are skipped. As in
+    readlines_with_col_index, the first column is used if col_index does not exist.
+    Non numeric values after the header raise a ValueError. Compressed files are read
+    through open_text.
+
+    Every column is parsed, so that ragged files (lines with another number of columns
+    than the first one) are detected, and those are parsed line by line (see
+    parse_series_lines).
+    """
+    skip_lines, num_columns = sniff_series_layout(filename)
+    if num_columns is None:
+        return np.array([], dtype=dtype)
+    try:
+        column = range(num_columns)[col_index]
+    except IndexError as ie:
+        module_logger.warning("%s. Falling back to the first column" % ie)
+        column = 0
+
+    try:
+        with open_text(filename) as fdin:
+            data_frame = pd.read_csv(fdin, delim_whitespace=True, header=None, skiprows=skip_lines,
+                                     dtype={column: dtype}, engine="c",
+                                     # same values as float() (the default C converter may be off by one ulp)
+                                     float_precision="high")
+    except pd.errors.ParserError as pe:
+        # lines with more columns than the first one
+        module_logger.debug("%s. Parsing file '%s' line by line" % (pe, filename))
+        return parse_series_lines(filename, skip_lines, col_index, dtype)
+    if data_frame.shape[1] != num_columns or data_frame.isnull().values.any():
+        # lines with fewer columns than the first one (their missing columns are NaN)
+        module_logger.debug("File '%s' has lines with fewer columns. Parsing it line by line" % filename)
+        return parse_series_lines(filename, skip_lines, col_index, dtype)
+    return data_frame.iloc[:, column].values
+
+
+def parse_series_lines(filename, skip_lines, col_index=-1, dtype=np.float64):
+    """
+    (str, int, int, numpy.dtype) -> numpy.ndarray
+
+    Parse the column col_index of each line of a file after its skip_lines header lines,
+    as readlines_with_col_index did (the first column of the lines where col_index does
+    not exist).
+    """
+    with open_text(filename) as fdin:
+        rows = [line.split() for line in fdin.readlines()[skip_lines:]]
+    return np.array([fields[col_index] if -len(fields) <= col_index < len(fields) else fields[0]
+                     for fields in rows if fields], dtype=dtype)
+
+
+def sniff_series_layout(filename, max_header_lines=HEADER_SNIFF_LINES):
+    """
+    (str, int) -> (int, int)
+
+    Number of header lines (leading lines with a non numeric last column, at most
+    max_header_lines) and number of columns of the first data line of a file.
+    The number of columns is None if the file has no data lines.
+    """
+    with open_text(filename) as fdin:
+        for line_number, line in enumerate(fdin):
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                float(fields[-1])
+            except ValueError:
+                if line_number < max_header_lines:
+                    continue
+            return line_number, len(fields)
+    return 0, None
+
+
 def readlines_with_col_index(filename, col_index=-1, as_type=float):
-    with open(filename, "rU") as fdin:
+    if as_type is float:
+        try:
+            return load_series(filename, col_index).tolist()
+        except ValueError as ve:
+            module_logger.debug("%s. Parsing file '%s' line by line" % (ve, filename))
+    with open_text(filename) as fdin:
         file_data = fdin.readlines()
     try:
         new_list = map(lambda line_entry: line_entry.split()[col_index], file_data)
@@ -483,14 +742,134 @@ def remove_slash_from_path(path):
 def listdir_no_hidden(path):
     """
     List files inside directory omitting the hidden files (starting with '.')
-    :param path: path of the directory to list the files from
+    or the series inside a dataset container
+    :param path: path of the directory (or container) to list the files from
     :return: the list of files inside the directory
     """
-    dir_list = []
-    for fl in os.listdir(path):
-        if not fl.startswith('.'):
-            dir_list.append(fl)
-    return dir_list
+    return list(iter_dir_no_hidden(path))
+
+
+def iter_dir_no_hidden(path):
+    """
+    Iterate over the files inside a directory omitting the hidden files (starting with '.'),
+    or over the series inside a dataset container. The directory is read lazily (scandir).
+    :param path: path of the directory (or container) to list the files from
+    :return: generator of the names of the files inside the directory
+    """
+    if dataset.is_container(path):
+        for name in dataset.list_entries(path):
+            yield name
+        return
+    names = os.listdir(path) if scandir is None else (entry.name for entry in scandir(path))
+    for name in names:
+        if not name.startswith('.'):
+            yield name
+
+
+def iter_dir_entries(path, follow_symlinks=True):
+    """
+    Iterate over the (name, is_dir) of the entries of a directory, read lazily (scandir).
+    A directory that cannot be read has no entries.
+    :param path: path of the directory
+    :param follow_symlinks: whether a symbolic link to a directory counts as a directory
+    :return: generator of (name, is_dir)
+    """
+    try:
+        if scandir is None:
+            for name in os.listdir(path):
+                entry_path = os.path.join(path, name)
+                yield name, os.path.isdir(entry_path) and (follow_symlinks or not os.path.islink(entry_path))
+        else:
+            for entry in scandir(path):
+                yield entry.name, entry.is_dir(follow_symlinks=follow_symlinks)
+    except OSError as ose:
+        module_logger.debug("%s. Skipping directory..." % ose)
+
+
+def iter_glob(pattern):
+    """
+    Iterate lazily over the paths matching a glob pattern. Any component of the pattern may hold
+    fnmatch wildcards, and a '**' component matches any number of directories (none included).
+    As in glob, hidden entries only match components starting with '.'.
+    :param pattern: the glob pattern ('~' is expanded)
+    :return: generator of the matching paths
+    """
+    pattern = os.path.expanduser(pattern)
+    components = [component for component in pattern.split(os.sep) if component]
+    return glob_components(os.sep if os.path.isabs(pattern) else "", components)
+
+
+def glob_components(directory, components):
+    """
+    Iterate over the paths under directory ('' for the current directory) matching the pattern components.
+    """
+    if not components:
+        if directory:
+            yield directory
+        return
+    component, remaining = components[0], components[1:]
+    if component == "**":
+        for path in glob_components(directory, remaining):
+            yield path
+        # symbolic links are not followed, so a link to a parent directory does not recurse forever
+        for name, is_dir in iter_dir_entries(directory or os.curdir, follow_symlinks=False):
+            if is_dir and not name.startswith('.'):
+                for path in glob_components(os.path.join(directory, name), components):
+                    yield path
+    elif not any(char in component for char in "*?["):
+        path = os.path.join(directory, component)
+        if os.path.isdir(path) if remaining else os.path.lexists(path):
+            for path in glob_components(path, remaining):
+                yield path
+    else:
+        for name, is_dir in iter_dir_entries(directory or os.curdir):
+            if (is_dir or not remaining) and fnmatch.fnmatch(name, component) and \
+                    (component.startswith('.') or not name.startswith('.')):
+                for path in glob_components(os.path.join(directory, name), remaining):
+                    yield path
+
+
+def iter_manifest(manifest_file):
+    """
+    Iterate lazily over the paths listed in a manifest file: one path per line (spaces are part of
+    the path), blank lines and lines starting with '#' are ignored.
+    :param manifest_file: name of the manifest file ('-' for the standard input)
+    :return: generator of the listed paths
+    """
+    fdin = sys.stdin if manifest_file == "-" else open(os.path.expanduser(manifest_file), "r")
+    try:
+        for line in fdin:
+            path = line.rstrip("\r\n")
+            if path.strip() and not path.lstrip().startswith("#"):
+                yield path
+    finally:
+        if fdin is not sys.stdin:
+            fdin.close()
+
+
+def iter_input_paths(input_paths, manifest_file=None, pattern=None):
+    """
+    Iterate over the inputs of an interface: the input paths given as arguments, then the paths listed
+    in the manifest file and the paths matching the glob pattern. The manifest and the pattern are read
+    lazily, so the first inputs are processed before the enumeration is over.
+
+    A single argument holding several space separated paths (as sent by other interfaces) is split,
+    unless it is an existing path.
+    :param input_paths: list of the input path arguments
+    :param manifest_file: name of a manifest file (see iter_manifest), or None
+    :param pattern: glob pattern (see iter_glob), or None
+    :return: generator of the input paths
+    """
+    if len(input_paths) == 1 and not os.path.exists(os.path.expanduser(input_paths[0].strip())):
+        input_paths = input_paths[0].split(" ")
+    for input_path in input_paths:
+        yield input_path
+    if manifest_file is not None:
+        for input_path in iter_manifest(manifest_file):
+            yield input_path
+    if pattern is not None:
+        for input_path in iter_glob(pattern):
+            yield input_path
 
 
 def generate_header_from_list_with_string(base_list, string_for_header):
@@ -667,38 +1046,61 @@ def multiscale_least_squares(df_name, data_frame, round_digits=None):
     :param round_digits: number of decimals to use when rounding the values [Default: None]
     :return: the resulting data set if successfully evaluated
     """
-    # TODO: adjust the iteration cycle to use a specific stop point to compute the slope [currently: len(all_y_values)]
-    # TODO: validate inputs (dataset, etc)
-    
     if is_multiscale(df_name):
         start, end, step = parse_ms_params(df_name)
-        data_frame_slopes = list()  # store the slope array of each row
-        all_x_values = range(start, end+1, step)
-        slopes_df_header = list()
-        for df_line in data_frame.iterrows():
-            slopes_per_row = list()  # store the slopes for one row
-            slopes_df_header = list()  # header of the data frame to concatenate with the original
-            row_values = np.array(df_line[1].ix[1:])  # all the values of each row
-            module_logger.debug("Header, Slope, x[i], y[i]")
-            for i in range(2, len(all_x_values)+1):  # iterate over the number os slopes to compute
-                y_array = list(row_values[0:i])
-                x_array = all_x_values[0:i]
-                iter_to_header = "Slope_%d:%d" % (start, all_x_values[i-1])
-                slope = compute_least_squares(x_array=x_array, y_array=y_array, round_digits=round_digits)
-                slopes_per_row.append(slope)
-                module_logger.debug("%s, %.4f, %s, %s" % (iter_to_header, slope, x_array, y_array))
-                slopes_df_header.append(iter_to_header)
-            # gather every slopes_per_row in a nested list (of lists)
-            data_frame_slopes.append(slopes_per_row)
-        # create new data frame
-        slopes_data_frame = pd.DataFrame(data_frame_slopes, index=None, columns=slopes_df_header)
+        slopes_data_frame = multiscale_slopes(data_frame, range(start, end+1, step), round_digits)
         # merge all data frames
-        result_df = pd.concat([data_frame, slopes_data_frame], axis=1)
-        return result_df
+        return pd.concat([data_frame, slopes_data_frame], axis=1)
     else:
         raise Warning("Dataset is not in multiscale format")
 
 
+def multiscale_slopes(data_frame, x_values, round_digits=None):
+    """
+    Data frame with the columns Slope_<FIRST>:<LAST>: the slope of the least squares line of the
+    first values of each row (the first column, the file name, is left out) against x_values[0..LAST],
+    for every prefix of two or more of the x_values.
+    :param data_frame: data frame to evaluate (one value per x value after the first column)
+    :param x_values: x values (e.g. the scales)
+    :param round_digits: number of decimals to round to [Default: None]
+    :return: the data frame of slopes, with the index of data_frame
+    """
+    x_values = list(x_values)
+    y_values = np.asarray(data_frame.iloc[:, 1:len(x_values) + 1].values, dtype=np.float64)
+    if y_values.shape[1] < len(x_values):
+        raise ValueError("Data frame has %d values per row, %d expected" % (y_values.shape[1], len(x_values)))
+    slopes = prefix_slopes(x_values, y_values)
+    if round_digits is not None:
+        slopes = [[round(slope, round_digits) for slope in row] for row in slopes]
+    header = ["Slope_%d:%d" % (x_values[0], last) for last in x_values[1:]]
+    return pd.DataFrame(slopes, index=data_frame.index, columns=header)
+
+
+def prefix_slopes(x_values, y_values):
+    """
+    Slopes of the least squares lines of every prefix (of two or more points) of every row of
+    y_values against x_values, from the cumulative sums of x, y, x*y and x^2:
+
+        slope(k) = (Sxy - Sx * Sy / k) / (Sxx - Sx^2 / k)
+
+    where the sums run over the first k points; column k - 2 of the result holds slope(k).
+    This is the slope scipy.stats.linregress gives for each prefix (a NaN value makes the slopes
+    of the prefixes that hold it NaN).
+    :param x_values: x values (at least two of them must differ in every prefix)
+    :param y_values: 2D array, a row of len(x_values) y values per line
+    :return: 2D array of slopes, len(x_values) - 1 per line
+    """
+    x = np.asarray(x_values, dtype=np.float64)
+    y = np.atleast_2d(np.asarray(y_values, dtype=np.float64))
+    # prefixes of a single point have no slope
+    points = np.arange(2, len(x) + 1, dtype=np.float64)
+    sum_x = np.cumsum(x)[1:]
+    sum_xx = np.cumsum(x * x)[1:]
+    sum_y = np.cumsum(y, axis=1)[:, 1:]
+    sum_xy = np.cumsum(y * x, axis=1)[:, 1:]
+    return (sum_xy - sum_x * sum_y / points) / (sum_xx - sum_x * sum_x / points)
+
+
 def compute_least_squares(x_array, y_array, round_digits=None):
     """
     Uses least squares regression to compute the slope of the input data
@@ -775,6 +1177,60 @@ def add_numbers_parser_options(parser):
                         help="Specifies number of digits to use when rounding values; [default: %(default)s]")
 
 
+def add_cache_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the invoked modules
+    """
+    parser.add_argument("--cache-dir",
+                        dest="cache_dir",
+                        action="store",
+                        metavar="DIRECTORY",
+                        default=SERIES_CACHE_PATH,
+                        help="Keep the parsed series in DIRECTORY (.npy files) so they are not parsed again "
+                             "while the files are unchanged. Also set by the TSA_CACHE_DIR environment variable; "
+                             "[default: %(default)s]")
+
+
+def add_input_parser_options(parser):
+    """
+    (argparse.ArgumentParser) -> NoneType
+
+    !!!Auxiliary function!!!  These are arguments for an argparse parser or subparser,
+    and are the optional arguments for the invoked modules (see iter_input_paths)
+    """
+    parser.add_argument("--manifest",
+                        dest="manifest",
+                        action="store",
+                        metavar="FILE",
+                        default=None,
+                        help="Also use the paths listed in FILE as inputs: one path per line (spaces are part of "
+                             "the path), '#' starts a comment line and '-' reads the list from the standard input.")
+    parser.add_argument("--glob",
+                        dest="glob_pattern",
+                        action="store",
+                        metavar="PATTERN",
+                        default=None,
+                        help="Also use the paths matching PATTERN as inputs ('**' matches any number of "
+                             "directories). Quote PATTERN so it is not expanded by the shell.")
+
+
+def input_path_nargs(argv=None):
+    """
+    (list of str) -> str
+
+    nargs of the input path argument of an interface: optional ('*') if the inputs are also given by
+    --manifest or --glob, required ('+') otherwise. An optional positional argument is not matched
+    when optional arguments follow it, so the input paths may only be placed anywhere when required.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if any(arg.split("=")[0] in ("--manifest", "--glob") for arg in argv):
+        return "*"
+    return "+"
+
+
 def add_logger_parser_options(parser):
     parser.add_argument("--logfile", action="store", metavar="LOGFILE", default=None, dest="log_file",
                         help="Use LOGFILE to save logs.")